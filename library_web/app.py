@@ -1,31 +1,105 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from library_db import (
-    get_all_books, add_book, get_book_by_id, update_book, delete_book, search_books,
-    get_all_members, add_member, get_member_by_id, update_member, delete_member, search_members,
-    borrow_book, return_book, get_borrowings, get_overdue_books,
-    get_dashboard_stats, get_categories, check_isbn_exists
+    get_books_page, iter_books, add_book, get_book_by_id, update_book, search_books, autocomplete_books,
+    get_book_copies, add_copies, withdraw_copy, CopyError,
+    get_members_page, iter_members, add_member, get_member_by_id, update_member, search_members,
+    borrow_book, return_book, borrow_books, return_books, lookup_available_books, lookup_members, BorrowingError, get_active_borrowings, get_borrowing_history, get_recent_borrowings, get_overdue_books,
+    get_overdue_page, get_overdue_summary, parse_overdue_cursor, get_loans_by_category_month, get_top_borrowers, get_top_books, report_range,
+    get_dashboard_stats, get_categories, check_isbn_exists,
+    BOOK_DETAIL_COLUMNS, MEMBER_DETAIL_COLUMNS, LOOKUP_LIMIT, LOOKUP_CACHE_TTL
 )
+import db_config
+import cache
+import metrics
+import http_cache
+from http_cache import conditional
+import bulk_import
+import exports
+import jobs
+import records
+import startup
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Serialise library_db Records as JSON objects"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, records.Record):
+            return o._asdict()
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
+app.json = RecordJSONProvider(app)
 app.secret_key = 'your_secret_key_here'  # Change this to a random secret key
+db_config.init_app(app)
+# Registered before http_cache, so its after_request hook sees the compressed response
+metrics.init_app(app)
+http_cache.init_app(app)
+jobs.init_app(app)
+
+def create_app():
+    """The app for a server process, once the schema version checks out (see startup.py and wsgi.py)"""
+    startup.check_schema()
+    return app
+
+def page_args():
+    """Read the keyset pagination parameters (?after=&limit=) from the query string"""
+    return request.args.get('after', type=int), request.args.get('limit', type=int)
+
+def ndjson_response(rows):
+    """Stream rows as newline-delimited JSON without materialising the full result"""
+    def generate():
+        for row in rows:
+            yield app.json.dumps(row) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def batch_summary(results, done_status):
+    """Flash one message for a batch: how many items succeeded plus each failure"""
+    done = sum(1 for result in results if result['status'] == done_status)
+    failures = [result['error'] for result in results if result['status'] != done_status]
+    if done:
+        flash(f'{done} of {len(results)} books {done_status} successfully!', 'success')
+    for error in failures:
+        flash(error, 'error')
+
+def job_accepted(job_id):
+    """202 Accepted, pointing at the status endpoint of the job doing the work"""
+    url = url_for('api_job', job_id=job_id)
+    response = jsonify({'job_id': job_id, 'status': jobs.QUEUED, 'url': url})
+    response.status_code = 202
+    response.headers['Location'] = url
+    return response
+
+def paged_json_response(rows, next_cursor):
+    response = jsonify(rows)
+    if next_cursor is not None:
+        next_url = url_for(request.endpoint, after=next_cursor, limit=request.args.get('limit', type=int))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
 
 # Dashboard Route
 @app.route('/')
+@conditional('books', 'members', 'borrowings', daily=True)
 def dashboard():
     stats = get_dashboard_stats()
-    recent_borrowings = get_borrowings()[:5]  # Get 5 most recent borrowings
-    overdue_books = get_overdue_books()
+    recent_borrowings = get_recent_borrowings(5)
+    overdue_books = get_overdue_books(limit=5)
     return render_template('dashboard.html', stats=stats, recent_borrowings=recent_borrowings, overdue_books=overdue_books)
 
 # Book Routes
 @app.route('/books')
+@conditional('books', 'members', 'borrowings')
 def books():
     search_query = request.args.get('search', '')
+    next_cursor = None
     if search_query:
         books = search_books(search_query)
     else:
-        books = get_all_books()
-    return render_template('books.html', books=books, search_query=search_query)
+        after, limit = page_args()
+        books, next_cursor = get_books_page(after, limit)
+    return render_template('books.html', books=books, search_query=search_query, next_cursor=next_cursor)
 
 @app.route('/books/add', methods=['GET', 'POST'])
 def add_book_route():
@@ -49,13 +123,33 @@ def add_book_route():
             request.form['year'],
             isbn,
             request.form['category'],
-            request.form['description']
+            request.form['description'],
+            max(0, request.form.get('copies', 1, type=int) or 0)
         )
         flash('Book added successfully!', 'success')
         return redirect(url_for('books'))
     categories = get_categories()
     return render_template('add_book.html', categories=categories)
 
+def enqueue_import(upload):
+    """Save an uploaded catalogue file and queue its import; returns the job id"""
+    return jobs.enqueue('import_books', {'path': jobs.save_upload(upload),
+                                         'fmt': bulk_import.detect_format(upload.filename)})
+
+@app.route('/books/import', methods=['GET', 'POST'])
+def import_books_route():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSONL file to import!', 'error')
+            return render_template('import_books.html')
+        job_id = enqueue_import(upload)
+        flash(f'Import queued as job #{job_id}; this page shows the report once it has run.', 'info')
+        return redirect(url_for('import_books_route', job=job_id))
+    job = jobs.get_job(request.args.get('job', type=int)) if request.args.get('job') else None
+    report = job['result'] if job and job['status'] == jobs.SUCCEEDED else None
+    return render_template('import_books.html', job=job, report=report)
+
 @app.route('/books/update/<int:book_id>', methods=['GET', 'POST'])
 def update_book_route(book_id):
     book = get_book_by_id(book_id)
@@ -89,24 +183,48 @@ def update_book_route(book_id):
 
 @app.route('/books/delete/<int:book_id>')
 def delete_book_route(book_id):
-    delete_book(book_id)
-    flash('Book deleted successfully!', 'success')
+    # Deleting cascades through the book's loans, so it runs as a background job
+    job_id = jobs.enqueue('delete_book', {'book_id': book_id})
+    flash(f'Book queued for deletion (job #{job_id}).', 'info')
     return redirect(url_for('books'))
 
 @app.route('/books/view/<int:book_id>')
 def view_book(book_id):
     book = get_book_by_id(book_id)
-    return render_template('view_book.html', book=book)
+    copies = get_book_copies(book_id)
+    return render_template('view_book.html', book=book, copies=copies)
+
+@app.route('/books/<int:book_id>/copies', methods=['POST'])
+def add_copies_route(book_id):
+    try:
+        barcodes = add_copies(book_id, request.form.get('count', 1, type=int))
+        flash(f'Added {len(barcodes)} copies: {", ".join(barcodes)}', 'success')
+    except CopyError as e:
+        flash(str(e), 'error')
+    return redirect(url_for('view_book', book_id=book_id))
+
+@app.route('/copies/<int:copy_id>/withdraw', methods=['POST'])
+def withdraw_copy_route(copy_id):
+    book_id = request.form.get('book_id', type=int)
+    try:
+        book_id = withdraw_copy(copy_id)
+        flash('Copy withdrawn from circulation!', 'success')
+    except CopyError as e:
+        flash(str(e), 'error')
+    return redirect(url_for('view_book', book_id=book_id) if book_id else url_for('books'))
 
 # Member Routes
 @app.route('/members')
+@conditional('members', 'borrowings')
 def members():
     search_query = request.args.get('search', '')
+    next_cursor = None
     if search_query:
         members = search_members(search_query)
     else:
-        members = get_all_members()
-    return render_template('members.html', members=members, search_query=search_query)
+        after, limit = page_args()
+        members, next_cursor = get_members_page(after, limit)
+    return render_template('members.html', members=members, search_query=search_query, next_cursor=next_cursor)
 
 @app.route('/members/add', methods=['GET', 'POST'])
 def add_member_route():
@@ -138,8 +256,8 @@ def update_member_route(member_id):
 
 @app.route('/members/delete/<int:member_id>')
 def delete_member_route(member_id):
-    delete_member(member_id)
-    flash('Member deleted successfully!', 'success')
+    job_id = jobs.enqueue('delete_member', {'member_id': member_id})
+    flash(f'Member queued for deletion (job #{job_id}).', 'info')
     return redirect(url_for('members'))
 
 @app.route('/members/view/<int:member_id>')
@@ -150,44 +268,264 @@ def view_member(member_id):
 # Borrowing Routes
 @app.route('/borrowings')
 def borrowings():
-    borrowings = get_borrowings()
-    return render_template('borrowings.html', borrowings=borrowings)
+    view = request.args.get('view', 'active')
+    if view == 'history':
+        borrowings, next_cursor = get_borrowing_history(*page_args())
+    else:
+        borrowings, next_cursor = get_active_borrowings(), None
+    return render_template('borrowings.html', borrowings=borrowings, view=view, next_cursor=next_cursor)
 
 @app.route('/borrow', methods=['GET', 'POST'])
 def borrow():
     if request.method == 'POST':
-        book_id = request.form['book_id']
-        member_id = request.form['member_id']
-        days = int(request.form.get('days', 14))
-        borrow_book(book_id, member_id, days)
+        book_ids = request.form.getlist('book_id')
+        member_id = request.form.get('member_id')
+        days = request.form.get('days', 14, type=int)
+        if not book_ids or not member_id:
+            flash('Choose at least one book and a member.', 'warning')
+            return redirect(url_for('borrow'))
+        if days < 1:
+            flash('A loan must last at least one day.', 'warning')
+            return redirect(url_for('borrow'))
+        if len(book_ids) > 1:
+            try:
+                batch_summary(borrow_books([(book_id, member_id) for book_id in book_ids], days), 'borrowed')
+            except (BorrowingError, ValueError) as e:
+                flash(f'Could not borrow books: {e}', 'error')
+            return redirect(url_for('borrowings'))
+        try:
+            borrow_book(book_ids[0], member_id, days)
+        except BorrowingError as e:
+            flash(f'Could not borrow book: {e}', 'error')
+            return redirect(url_for('borrow'))
         flash('Book borrowed successfully!', 'success')
         return redirect(url_for('borrowings'))
     
-    books = [book for book in get_all_books() if book['status'] == 'Available']
-    members = get_all_members()
-    return render_template('borrow_book.html', books=books, members=members)
+    # The pickers look books and members up as the librarian types; links from a book or member page preselect it
+    book_id = request.args.get('book_id', type=int)
+    member_id = request.args.get('member_id', type=int)
+    book = get_book_by_id(book_id) if book_id else None
+    member = get_member_by_id(member_id) if member_id else None
+    return render_template('borrow_book.html', stats=get_dashboard_stats(), book=book, member=member,
+                           lookup_limit=LOOKUP_LIMIT)
 
 @app.route('/return/<int:book_id>/<int:member_id>')
 def return_book_route(book_id, member_id):
-    return_book(book_id, member_id)
-    flash('Book returned successfully!', 'success')
+    if return_book(book_id, member_id):
+        flash('Book returned successfully!', 'success')
+    else:
+        flash('No open loan found for this book and member.', 'warning')
     return redirect(url_for('borrowings'))
 
+@app.route('/return/batch', methods=['POST'])
+def return_books_route():
+    # Each checkbox value is "<book_id>:<member_id>"
+    items = [value.split(':', 1) for value in request.form.getlist('loan')]
+    if not items:
+        flash('Select at least one borrowing to return.', 'warning')
+    else:
+        try:
+            batch_summary(return_books(items), 'returned')
+        except (BorrowingError, ValueError) as e:
+            flash(f'Could not return books: {e}', 'error')
+    return redirect(url_for('borrowings'))
+
+def overdue_cursor():
+    """The ?after= cursor of an overdue page; raises ValueError when it is malformed"""
+    after = request.args.get('after')
+    if after:
+        parse_overdue_cursor(after)
+    return after
+
 @app.route('/overdue')
 def overdue():
-    overdue_books = get_overdue_books()
-    return render_template('overdue.html', overdue_books=overdue_books)
+    try:
+        after = overdue_cursor()
+    except ValueError:
+        # Like an unreadable ?after= on the other listings, start from the first page
+        after = None
+    overdue_books, next_cursor = get_overdue_page(after, request.args.get('limit', type=int))
+    return render_template('overdue.html', overdue_books=overdue_books, next_cursor=next_cursor,
+                           summary=get_overdue_summary())
+
+# Reports and Exports
+def report_args():
+    """The from/to dates of a report or export; raises ExportError for a malformed date"""
+    return report_range(exports.parse_date(request.args.get('from'), 'from'),
+                        exports.parse_date(request.args.get('to'), 'to'))
+
+def get_reports(start, end):
+    return {'from': start.isoformat(), 'to': end.isoformat(),
+            'loans_by_category_month': get_loans_by_category_month(start, end),
+            'top_borrowers': get_top_borrowers(start, end),
+            'top_books': get_top_books(start, end)}
+
+@app.route('/reports')
+def reports():
+    try:
+        start, end = report_args()
+    except exports.ExportError as e:
+        flash(str(e), 'error')
+        start, end = report_range()
+    return render_template('reports.html', **get_reports(start, end))
+
+@app.route('/export/<table>.<fmt>')
+def export(table, fmt):
+    try:
+        chunks = exports.stream(table, fmt, request.args)
+    except exports.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(chunks), mimetype=exports.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'})
+
+@app.route('/api/reports')
+def api_reports():
+    try:
+        start, end = report_args()
+    except exports.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(get_reports(start, end))
 
 # API Routes for AJAX
 @app.route('/api/books')
+@conditional('books', 'members', 'borrowings', html=False)
 def api_books():
-    books = get_all_books()
-    return jsonify(books)
+    after, limit = page_args()
+    if request.args.get('stream'):
+        return ndjson_response(iter_books(after, columns=BOOK_DETAIL_COLUMNS))
+    books, next_cursor = get_books_page(after, limit, BOOK_DETAIL_COLUMNS)
+    return paged_json_response(books, next_cursor)
+
+@app.route('/api/books/autocomplete')
+def api_books_autocomplete():
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(autocomplete_books(query, limit) if query else [])
+
+def lookup_response(lookup):
+    """JSON rows for a type-ahead lookup on ?q=, which browsers may reuse for as long as the server caches it"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', LOOKUP_LIMIT, type=int), LOOKUP_LIMIT))
+    response = jsonify(lookup(query, limit) if query else [])
+    response.headers['Cache-Control'] = f'private, max-age={int(LOOKUP_CACHE_TTL)}'
+    return response
+
+@app.route('/api/books/lookup')
+def api_books_lookup():
+    return lookup_response(lookup_available_books)
+
+@app.route('/api/members/lookup')
+def api_members_lookup():
+    return lookup_response(lookup_members)
+
+@app.route('/api/overdue')
+def api_overdue():
+    try:
+        after = overdue_cursor()
+    except ValueError:
+        return jsonify({'error': 'Expected ?after=<due_date>:<borrowing_id> from X-Next-Cursor'}), 400
+    overdue_books, next_cursor = get_overdue_page(after, request.args.get('limit', type=int))
+    return paged_json_response(overdue_books, next_cursor)
 
 @app.route('/api/members')
+@conditional('members', 'borrowings', html=False)
 def api_members():
-    members = get_all_members()
-    return jsonify(members)
+    after, limit = page_args()
+    if request.args.get('stream'):
+        return ndjson_response(iter_members(after, columns=MEMBER_DETAIL_COLUMNS))
+    members, next_cursor = get_members_page(after, limit, MEMBER_DETAIL_COLUMNS)
+    return paged_json_response(members, next_cursor)
+
+def batch_items():
+    """Read {"items": [{"book_id": .., "member_id": ..}, ...]} from the JSON body"""
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('items')
+    if not isinstance(items, list):
+        return payload, None
+    try:
+        return payload, [(item['book_id'], item['member_id']) for item in items]
+    except (KeyError, TypeError):
+        return payload, None
+
+def batch_json_response(results, done_status):
+    done = sum(1 for result in results if result['status'] == done_status)
+    return jsonify({done_status: done, 'failed': len(results) - done, 'results': results})
+
+@app.route('/api/borrowings/borrow', methods=['POST'])
+def api_borrow_books():
+    payload, items = batch_items()
+    if items is None:
+        return jsonify({'error': 'Expected {"items": [{"book_id": ..., "member_id": ...}]}'}), 400
+    try:
+        results = borrow_books(items, int(payload.get('days', 14)))
+    except (BorrowingError, ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return batch_json_response(results, 'borrowed')
+
+@app.route('/api/borrowings/return', methods=['POST'])
+def api_return_books():
+    _, items = batch_items()
+    if items is None:
+        return jsonify({'error': 'Expected {"items": [{"book_id": ..., "member_id": ...}]}'}), 400
+    try:
+        results = return_books(items)
+    except (BorrowingError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return batch_json_response(results, 'returned')
+
+@app.route('/api/books/<int:book_id>', methods=['DELETE'])
+def api_delete_book(book_id):
+    return job_accepted(jobs.enqueue('delete_book', {'book_id': book_id}))
+
+@app.route('/api/members/<int:member_id>', methods=['DELETE'])
+def api_delete_member(member_id):
+    return job_accepted(jobs.enqueue('delete_member', {'member_id': member_id}))
+
+@app.route('/api/books/import', methods=['POST'])
+def api_import_books():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'Expected a CSV or JSONL file in the "file" field'}), 400
+    return job_accepted(enqueue_import(upload))
+
+@app.route('/api/jobs')
+def api_jobs():
+    status = request.args.get('status')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'counts': jobs.queue_stats(), 'jobs': jobs.recent_jobs(status, limit)})
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} does not exist'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<int:job_id>/retry', methods=['POST'])
+def api_retry_job(job_id):
+    try:
+        jobs.retry(job_id)
+    except jobs.JobError as e:
+        return jsonify({'error': str(e)}), 409
+    return job_accepted(job_id)
+
+# Health Routes for load balancers and orchestrators
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    ready, details = startup.readiness()
+    return jsonify(dict(details, status='ready' if ready else 'not ready')), 200 if ready else 503
+
+@app.route('/api/pool')
+def api_pool():
+    return jsonify(db_config.pool_stats())
+
+@app.route('/api/cache')
+def api_cache():
+    return jsonify(cache.stats())
 
 # Legacy routes for backward compatibility
 @app.route('/add', methods=['GET', 'POST'])
@@ -203,4 +541,5 @@ def delete(book_id):
     return redirect(url_for('delete_book_route', book_id=book_id))
 
 if __name__ == '__main__':
+    startup.warm(create_app())
     app.run(debug=True)
@@ -0,0 +1,93 @@
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from db_config import get_db
+import versions
+
+# Returned loans older than the retention window move from borrowings to
+# borrowings_archive, so the hot table holds open loans plus recent history.
+# Rows are moved in small id-ordered batches, each its own short transaction,
+# with a pause in between to leave room for circulation traffic.
+
+# Load archival settings
+RETENTION_DAYS = int(os.getenv('BORROWINGS_RETENTION_DAYS', '365'))
+BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+PAUSE_SECONDS = float(os.getenv('ARCHIVE_PAUSE_SECONDS', '0.1'))
+
+COLUMNS = 'id, book_id, copy_id, member_id, borrow_date, due_date, returned_date, created_at, updated_at'
+
+def cutoff_date(retention_days=RETENTION_DAYS, today=None):
+    return (today or date.today()) - timedelta(days=retention_days)
+
+def archive_batch(conn, cutoff, batch_size=BATCH_SIZE):
+    """Move one batch of loans returned before `cutoff`; returns the number of rows moved"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM borrowings
+        WHERE returned_date < %s
+        ORDER BY returned_date LIMIT %s
+        FOR UPDATE
+    """, (cutoff, batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        conn.rollback()
+        return 0
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+        INSERT INTO borrowings_archive ({COLUMNS})
+        SELECT {COLUMNS} FROM borrowings WHERE id IN ({placeholders})
+    """, ids)
+    cursor.execute(f"DELETE FROM borrowings WHERE id IN ({placeholders})", ids)
+    versions.bump(cursor, 'borrowings')
+    conn.commit()
+    return len(ids)
+
+def pending(conn, cutoff):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM borrowings WHERE returned_date < %s", (cutoff,))
+    return cursor.fetchone()[0]
+
+def archive(retention_days=RETENTION_DAYS, batch_size=BATCH_SIZE, pause=PAUSE_SECONDS, max_batches=None, progress=None):
+    """Archive every loan returned before the retention window; returns the number of rows moved"""
+    cutoff = cutoff_date(retention_days)
+    conn = get_db()
+    moved = 0
+    batches = 0
+    started = time.perf_counter()
+    try:
+        while max_batches is None or batches < max_batches:
+            count = archive_batch(conn, cutoff, batch_size)
+            if not count:
+                break
+            moved += count
+            batches += 1
+            if progress:
+                progress(moved, time.perf_counter() - started)
+            time.sleep(pause)
+    finally:
+        conn.close()
+    return moved
+
+def print_progress(moved, elapsed):
+    print(f"  🗄️  {moved} loans archived ({moved / max(elapsed, 1e-9):.0f} rows/s)", end='\r')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old returned loans into borrowings_archive")
+    parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=PAUSE_SECONDS, help="seconds to sleep between batches")
+    parser.add_argument('--max-batches', type=int, help="stop after this many batches")
+    parser.add_argument('--dry-run', action='store_true', help="only count the loans that would move")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        conn = get_db()
+        try:
+            cutoff = cutoff_date(args.retention_days)
+            print(f"🗄️  {pending(conn, cutoff)} loans returned before {cutoff} would be archived")
+        finally:
+            conn.close()
+    else:
+        moved = archive(args.retention_days, args.batch_size, args.pause, args.max_batches, print_progress)
+        print(f"\n✅ Archived {moved} loans returned more than {args.retention_days} days ago")
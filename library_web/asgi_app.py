@@ -0,0 +1,154 @@
+import asyncio
+import functools
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, Response, make_response, render_template, request, jsonify, session
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+import http_cache
+import library_db_async as db
+import versions
+from app import app as flask_app
+
+# Read-heavy pages are served natively on asyncio; every other route
+# (forms, writes, imports) falls through to the Flask app. MySQL only, see
+# library_db_async.py; the pages carry the same ETag/Last-Modified validators
+# as their Flask counterparts but skip the HTTP_FRAGMENT_CACHE page cache.
+quart_app = Quart(__name__)
+quart_app.secret_key = flask_app.secret_key
+wsgi_fallback = WsgiToAsgi(flask_app)
+
+def build_flask_url(error, endpoint, values):
+    """Let templates url_for() endpoints that only exist on the Flask app"""
+    values = {key: value for key, value in values.items() if not key.startswith('_')}
+    return flask_app.url_map.bind('').build(endpoint, values)
+
+quart_app.url_build_error_handlers.append(build_flask_url)
+
+@quart_app.before_serving
+async def open_pool():
+    await db.init_pool()
+
+@quart_app.after_serving
+async def close_pool():
+    await db.close_pool()
+
+def page_args():
+    return request.args.get('after', type=int), request.args.get('limit', type=int)
+
+def conditional(*tables, daily=False, html=True):
+    """Async counterpart of http_cache.conditional: 304 from the table versions, validators on fresh responses"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            if request.method != 'GET' or (html and session.get('_flashes')):
+                return await view(*args, **kwargs)
+            current = await asyncio.to_thread(versions.current)
+            etag, last_modified = http_cache.validators(tables, daily, request.full_path, current)
+            if http_cache._not_modified(etag, last_modified, request):
+                response = Response('', status=304)
+            else:
+                response = await make_response(await view(*args, **kwargs))
+            return http_cache._tag(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+# Dashboard Route
+@quart_app.route('/')
+@conditional('books', 'members', 'borrowings', daily=True)
+async def dashboard():
+    # The three dashboard queries are independent, so run them concurrently
+    stats, recent_borrowings, overdue_books = await asyncio.gather(
+        db.get_dashboard_stats(),
+        db.get_recent_borrowings(5),
+        db.get_overdue_books(limit=5)
+    )
+    return await render_template('dashboard.html', stats=stats, recent_borrowings=recent_borrowings, overdue_books=overdue_books)
+
+# Book Routes
+@quart_app.route('/books')
+@conditional('books', 'members', 'borrowings')
+async def books():
+    search_query = request.args.get('search', '')
+    next_cursor = None
+    if search_query:
+        books = await db.search_books(search_query)
+    else:
+        after, limit = page_args()
+        books, next_cursor = await db.get_books_page(after, limit)
+    return await render_template('books.html', books=books, search_query=search_query, next_cursor=next_cursor)
+
+@quart_app.route('/books/view/<int:book_id>')
+async def view_book(book_id):
+    book, copies = await asyncio.gather(db.get_book_by_id(book_id), db.get_book_copies(book_id))
+    return await render_template('view_book.html', book=book, copies=copies)
+
+# Member Routes
+@quart_app.route('/members')
+@conditional('members', 'borrowings')
+async def members():
+    search_query = request.args.get('search', '')
+    next_cursor = None
+    if search_query:
+        members = await db.search_members(search_query)
+    else:
+        after, limit = page_args()
+        members, next_cursor = await db.get_members_page(after, limit)
+    return await render_template('members.html', members=members, search_query=search_query, next_cursor=next_cursor)
+
+@quart_app.route('/members/view/<int:member_id>')
+async def view_member(member_id):
+    member = await db.get_member_by_id(member_id)
+    return await render_template('view_member.html', member=member)
+
+# Borrowing Routes
+@quart_app.route('/borrowings')
+async def borrowings():
+    view = request.args.get('view', 'active')
+    if view == 'history':
+        borrowings, next_cursor = await db.get_borrowing_history(*page_args())
+    else:
+        borrowings, next_cursor = await db.get_active_borrowings(), None
+    return await render_template('borrowings.html', borrowings=borrowings, view=view, next_cursor=next_cursor)
+
+@quart_app.route('/overdue')
+async def overdue():
+    after = request.args.get('after')
+    try:
+        if after:
+            db.parse_overdue_cursor(after)
+    except ValueError:
+        after = None
+    overdue_books, next_cursor = await db.get_overdue_page(after, request.args.get('limit', type=int))
+    return await render_template('overdue.html', overdue_books=overdue_books, next_cursor=next_cursor,
+                                 summary=await db.get_overdue_summary())
+
+# API Routes
+@quart_app.route('/api/books')
+@conditional('books', 'members', 'borrowings', html=False)
+async def api_books():
+    after, limit = page_args()
+    books, next_cursor = await db.get_books_page(after, limit, db.BOOK_DETAIL_COLUMNS)
+    response = jsonify(books)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+@quart_app.route('/api/members')
+@conditional('members', 'borrowings', html=False)
+async def api_members():
+    after, limit = page_args()
+    members, next_cursor = await db.get_members_page(after, limit, db.MEMBER_DETAIL_COLUMNS)
+    response = jsonify(members)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+_routes = quart_app.url_map.bind('')
+
+async def application(scope, receive, send):
+    """ASGI entry point: hypercorn asgi_app:application"""
+    if scope['type'] == 'http':
+        try:
+            _routes.match(scope['path'], scope['method'])
+        except (NotFound, MethodNotAllowed):
+            return await wsgi_fallback(scope, receive, send)
+    return await quart_app(scope, receive, send)
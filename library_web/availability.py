@@ -0,0 +1,154 @@
+import sys
+from db_config import get_db
+import versions
+
+# active_loans holds one row per open loan, maintained by the borrow/return paths
+# in library_db, so listings join the handful of open loans instead of the whole
+# loan history. Each title's physical items live in book_copies, and
+# books.total_copies/available_copies count them so listings and the /borrow
+# picker read one row per title. borrowings stays the source of truth; this
+# module checks and rebuilds the derived state from it.
+
+# Copy states: 'available' copies can be lent, 'on_loan' ones have an open loan,
+# 'withdrawn' ones stay for the loan history but no longer count
+ACTIVATE_SQL = """
+    INSERT INTO active_loans (borrowing_id, book_id, copy_id, member_id, due_date)
+    SELECT id, book_id, copy_id, member_id, due_date FROM borrowings
+    WHERE returned_date IS NULL
+"""
+
+MISSING_SQL = """
+    SELECT br.id FROM borrowings br
+    LEFT JOIN active_loans al ON al.borrowing_id = br.id
+    WHERE br.returned_date IS NULL AND al.borrowing_id IS NULL
+"""
+
+STALE_SQL = """
+    SELECT al.borrowing_id FROM active_loans al
+    LEFT JOIN borrowings br ON br.id = al.borrowing_id AND br.returned_date IS NULL
+    WHERE br.id IS NULL OR br.book_id <> al.book_id OR br.copy_id <> al.copy_id
+       OR br.member_id <> al.member_id OR br.due_date <> al.due_date
+"""
+
+# Copies whose state disagrees with the open loans
+COPY_DRIFT_SQL = """
+    SELECT c.id FROM book_copies c
+    LEFT JOIN active_loans al ON al.copy_id = c.id
+    WHERE (c.state = 'on_loan' AND al.copy_id IS NULL) OR (c.state <> 'on_loan' AND al.copy_id IS NOT NULL)
+"""
+
+COUNTER_DRIFT_SQL = """
+    SELECT b.id FROM books b
+    WHERE b.total_copies <> (SELECT COUNT(*) FROM book_copies c WHERE c.book_id = b.id AND c.state <> 'withdrawn')
+       OR b.available_copies <> (SELECT COUNT(*) FROM book_copies c WHERE c.book_id = b.id AND c.state = 'available')
+"""
+
+def barcode(book_id, number):
+    """Barcode of the number-th copy of a title, e.g. B42-3"""
+    return f"B{book_id}-{number}"
+
+def activate(cursor, copy_ids):
+    """Record the open loans just inserted for copy_ids, inside the caller's transaction"""
+    placeholders = ', '.join(['%s'] * len(copy_ids))
+    cursor.execute(ACTIVATE_SQL + f" AND copy_id IN ({placeholders})", list(copy_ids))
+
+def deactivate(cursor, borrowing_ids):
+    """Drop the rows for loans just closed, inside the caller's transaction"""
+    placeholders = ', '.join(['%s'] * len(borrowing_ids))
+    cursor.execute(f"DELETE FROM active_loans WHERE borrowing_id IN ({placeholders})", list(borrowing_ids))
+
+def _isbn_filter(isbns):
+    if isbns is None:
+        return '', []
+    return f" AND isbn IN ({', '.join(['%s'] * len(isbns))})", list(isbns)
+
+def ensure_copies(cursor, isbns=None):
+    """Give every title without copies (optionally only those with the given ISBNs) a first copy"""
+    where, params = _isbn_filter(isbns)
+    cursor.execute(f"""
+        INSERT INTO book_copies (book_id, barcode, state)
+        SELECT id, CONCAT('B', id, '-1'), 'available' FROM books
+        WHERE NOT EXISTS (SELECT 1 FROM book_copies c WHERE c.book_id = books.id){where}
+    """, params)
+    count = cursor.rowcount
+    recount(cursor, isbns)
+    return count
+
+def recount(cursor, isbns=None):
+    """Recompute the per-title copy counters from book_copies"""
+    where, params = _isbn_filter(isbns)
+    cursor.execute(f"""
+        UPDATE books SET
+            total_copies = (SELECT COUNT(*) FROM book_copies c WHERE c.book_id = books.id AND c.state <> 'withdrawn'),
+            available_copies = (SELECT COUNT(*) FROM book_copies c WHERE c.book_id = books.id AND c.state = 'available')
+        WHERE 1 = 1{where}
+    """, params)
+
+def sync_copies(cursor):
+    """Point loans without a copy at their title's first copy and derive copy states from the open loans"""
+    for table in ('borrowings', 'borrowings_archive'):
+        cursor.execute(f"""
+            UPDATE {table} SET copy_id = (SELECT MIN(c.id) FROM book_copies c WHERE c.book_id = {table}.book_id)
+            WHERE copy_id IS NULL
+        """)
+    cursor.execute("""
+        UPDATE book_copies SET state = 'available'
+        WHERE state = 'on_loan'
+          AND id NOT IN (SELECT copy_id FROM borrowings WHERE returned_date IS NULL AND copy_id IS NOT NULL)
+    """)
+    cursor.execute("""
+        UPDATE book_copies SET state = 'on_loan'
+        WHERE id IN (SELECT copy_id FROM borrowings WHERE returned_date IS NULL)
+    """)
+
+def check(conn=None):
+    """Compare the derived state with borrowings: differing borrowing ids, copy ids and book ids"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    try:
+        cursor = conn.cursor()
+        drift = {}
+        for name, sql in (('missing', MISSING_SQL), ('stale', STALE_SQL), ('copies', COPY_DRIFT_SQL),
+                          ('counters', COUNTER_DRIFT_SQL)):
+            cursor.execute(sql)
+            drift[name] = [row[0] for row in cursor.fetchall()]
+    finally:
+        if own_conn:
+            conn.close()
+    return drift
+
+def rebuild_cursor(cursor):
+    """Recreate copies, copy states, counters and active_loans inside the caller's transaction"""
+    ensure_copies(cursor)
+    sync_copies(cursor)
+    cursor.execute("DELETE FROM active_loans")
+    cursor.execute(ACTIVATE_SQL)
+    count = cursor.rowcount
+    recount(cursor)
+    return count
+
+def rebuild(conn=None):
+    """Rebuild the derived state from borrowings in one transaction and return the number of open loans"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    try:
+        cursor = conn.cursor()
+        count = rebuild_cursor(cursor)
+        versions.bump(cursor, 'books', 'borrowings')
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    return count
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    drift = check()
+    print(f"🔎 {len(drift['missing'])} open loan(s) missing from active_loans, {len(drift['stale'])} stale row(s), "
+          f"{len(drift['copies'])} copy state(s) and {len(drift['counters'])} title counter(s) out of sync")
+    if command == 'repair' and any(drift.values()):
+        print(f"🔧 Rebuilt availability with {rebuild()} open loan(s)")
+    elif command == 'rebuild':
+        print(f"🔧 Rebuilt availability with {rebuild()} open loan(s)")
+    elif any(drift.values()):
+        sys.exit(1)
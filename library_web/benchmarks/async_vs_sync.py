@@ -0,0 +1,36 @@
+# Compare the synchronous Flask app with the ASGI app on the same database.
+#
+#   gunicorn -w 4 -b 127.0.0.1:8000 app:app
+#   hypercorn -w 4 -b 127.0.0.1:8001 asgi_app:application
+#   python -m benchmarks.async_vs_sync --sync http://127.0.0.1:8000 --async http://127.0.0.1:8001
+import argparse
+import json
+from benchmarks.http_load import run_load
+
+DEFAULT_PATHS = ['/', '/books', '/members', '/api/books', '/overdue']
+
+def compare(sync_url, async_url, paths, concurrency, duration):
+    results = {}
+    for label, base_url in (('sync', sync_url), ('async', async_url)):
+        # Short warm-up so both servers have open pools and compiled templates
+        run_load(base_url, paths, concurrency=2, duration=min(2.0, duration))
+        results[label] = run_load(base_url, paths, concurrency, duration)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare req/s and p99 latency of the sync and ASGI apps")
+    parser.add_argument('--sync', dest='sync_url', default='http://127.0.0.1:8000')
+    parser.add_argument('--async', dest='async_url', default='http://127.0.0.1:8001')
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = compare(args.sync_url, args.async_url, args.paths or DEFAULT_PATHS, args.concurrency, args.duration)
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for label, result in results.items():
+        print(f"{label:<6} {result['requests_per_second']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
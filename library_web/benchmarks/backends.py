@@ -0,0 +1,49 @@
+# The micro-benchmark read workload plus a borrow/return cycle, run against
+# each storage backend in turn and printed side by side.
+#
+#   python -m benchmarks.datagen --backend mysql --books 100000 --members 10000 --loans 500000
+#   python -m benchmarks.datagen --backend sqlite --books 100000 --members 10000 --loans 500000
+#   python -m benchmarks.backends --iterations 200 [--backends mysql sqlite]
+#
+# Load both databases with the same seed so the backends answer the same queries over the same rows.
+import argparse
+import cache
+import db_config
+import library_db
+from benchmarks.micro import bench, read_workloads, sample_ids
+from benchmarks.results import save_results
+
+def write_workload(count):
+    """Borrow and return a different available book on each iteration"""
+    books = [book['id'] for book in library_db.get_available_books(limit=count)]
+    member_id = library_db.get_member_choices()[0]['id']
+    def cycle(i):
+        book_id = books[i % len(books)]
+        library_db.borrow_book(book_id, member_id)
+        library_db.return_book(book_id, member_id)
+    return ('borrow_book + return_book', cycle)
+
+def run_backend(backend, iterations, cold=False):
+    db_config.use_backend(backend)
+    cache.backend.clear()
+    results = {}
+    for name, call in read_workloads(*sample_ids()) + [write_workload(iterations)]:
+        call(0)  # warm-up: connections, statement caches, index build
+        results[name] = bench(call, iterations, cold)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare library_db latency across storage backends")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--cold', action='store_true', help="clear the read-through cache before each call")
+    parser.add_argument('--backends', nargs='+', choices=db_config.BACKENDS, default=list(db_config.BACKENDS))
+    parser.add_argument('--output', help="results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    runs = {backend: run_backend(backend, args.iterations, args.cold) for backend in args.backends}
+    print(f"{'function':<26}" + ''.join(f" {backend + ' p50 ms':>14} {backend + ' calls/s':>15}" for backend in runs))
+    for name in next(iter(runs.values())):
+        print(f"{name:<26}" + ''.join(f" {results[name]['p50_ms']:>14} {results[name]['calls_per_second']:>15}"
+                                      for results in runs.values()))
+    results = {f"{backend}: {name}": result for backend, named in runs.items() for name, result in named.items()}
+    print(f"Saved {save_results('backends', results, vars(args), args.output)}")
@@ -0,0 +1,111 @@
+# Concurrent checkout stress test for borrow_book/return_book.
+#
+#   python -m benchmarks.contention --threads 32 --books 5 --copies 2 --duration 10
+#
+# Many threads fight over the copies of a handful of books, borrowing and
+# returning them as fast as they can. Afterwards the borrowings table must not
+# contain a copy with more than one open loan, and the copy states, title
+# counters and active_loans must all match it exactly.
+import argparse
+import random
+import threading
+import time
+import availability
+import library_db
+from db_config import connect_db
+
+def pick_ids(book_count, member_count, copies):
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT b.id, b.total_copies FROM books b
+        WHERE b.available_copies > 0
+        ORDER BY b.id LIMIT %s
+    """, (book_count,))
+    rows = cursor.fetchall()
+    books = [book_id for book_id, _ in rows]
+    # Top the contested titles up to the requested number of copies
+    for book_id, total in rows:
+        if total < copies:
+            library_db.add_copies(book_id, copies - total)
+    cursor.execute("SELECT id FROM members ORDER BY id LIMIT %s", (member_count,))
+    members = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return books, members
+
+def duplicate_open_loans():
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT copy_id, COUNT(*) FROM borrowings
+        WHERE returned_date IS NULL
+        GROUP BY copy_id HAVING COUNT(*) > 1
+    """)
+    duplicates = cursor.fetchall()
+    conn.close()
+    return duplicates
+
+def run(threads, book_count, member_count, duration, copies=1, seed=42):
+    books, members = pick_ids(book_count, member_count, copies)
+    if not books or not members:
+        raise SystemExit("Need available books and members; run benchmarks.datagen first")
+    counts = {'borrowed': 0, 'conflicts': 0, 'returned': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    retries_before = library_db.transaction_stats['retries']
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        member_id = members[index % len(members)]
+        mine = []
+        while time.monotonic() < deadline:
+            # return_book closes every loan of a title, so hold one copy of each at most
+            candidates = [book for book in books if book not in mine]
+            if mine and (not candidates or rng.random() < 0.5):
+                outcome = 'returned' if library_db.return_book(mine.pop(), member_id) else 'errors'
+            else:
+                book_id = rng.choice(candidates)
+                try:
+                    library_db.borrow_book(book_id, member_id)
+                    mine.append(book_id)
+                    outcome = 'borrowed'
+                except library_db.BookUnavailableError:
+                    outcome = 'conflicts'
+                except Exception:
+                    outcome = 'errors'
+            with lock:
+                counts[outcome] += 1
+        for book_id in mine:
+            library_db.return_book(book_id, member_id)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    operations = sum(counts.values())
+    return dict(counts,
+                deadlock_retries=library_db.transaction_stats['retries'] - retries_before,
+                operations_per_second=round(operations / elapsed, 1),
+                duplicate_open_loans=duplicate_open_loans(),
+                active_loans_drift=availability.check())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hammer borrow/return on a few books from many threads")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--books', type=int, default=5)
+    parser.add_argument('--members', type=int, default=32)
+    parser.add_argument('--copies', type=int, default=1, help="copies of each contested book")
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    result = run(args.threads, args.books, args.members, args.duration, args.copies)
+    for name, value in result.items():
+        print(f"{name:<22} {value}")
+    if result['duplicate_open_loans']:
+        raise SystemExit("❌ Found copies with more than one open loan")
+    if any(result['active_loans_drift'].values()):
+        raise SystemExit("❌ Copies, counters or active_loans do not match the open loans in borrowings")
+    print("✅ No copy has more than one open loan and the derived availability is consistent")
@@ -0,0 +1,161 @@
+# Seeded synthetic catalogue generator.
+#
+#   python -m benchmarks.datagen --books 1000000 --members 100000 --loans 5000000 --seed 42 [--backend sqlite]
+#
+# Book popularity and member activity follow Zipf-like distributions, so a
+# few titles and borrowers account for most of the loan history, as in a
+# real circulation log. The same seed always produces the same data.
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+from datetime import date, timedelta
+
+CATEGORIES = [
+    ('Fiction', 30), ('Romance', 12), ('Mystery', 10), ('Science Fiction', 8), ('Fantasy', 8),
+    ('History', 7), ('Biography', 6), ('Technology', 6), ('Science', 5), ('Children', 5),
+    ('Poetry', 2), ('Travel', 1)
+]
+WORDS = (
+    'shadow river silent garden winter empire secret last house light night city stone glass '
+    'journey storm golden broken hidden forgotten island mountain ocean fire paper memory '
+    'letters kingdom voyage clock bridge forest daughter stranger promise summer machine '
+    'python data history science guide handbook theory practice modern introduction'
+).split()
+FIRST_NAMES = 'James Mary John Patricia Robert Jennifer Michael Linda David Elizabeth Aisha Wei Priya Carlos Fatima Yuki Olga Kwame Sofia Omar'.split()
+LAST_NAMES = 'Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Chen Patel Kim Nguyen Okafor Silva Novak Haddad Sato Ivanova'.split()
+
+def zipf_sampler(rng, n, s=1.1):
+    """Return a function sampling 1..n with P(k) proportional to 1/k^s"""
+    cum_weights = list(itertools.accumulate(1.0 / (k ** s) for k in range(1, n + 1)))
+    population = range(1, n + 1)
+    def sample(count):
+        return rng.choices(population, cum_weights=cum_weights, k=count)
+    return sample
+
+def isbn13(serial):
+    digits = f"978{serial:09d}"
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits))
+    return f"{digits}{(10 - total % 10) % 10}"
+
+def generate_books(rng, count):
+    categories = [name for name, _ in CATEGORIES]
+    weights = [weight for _, weight in CATEGORIES]
+    for serial in range(1, count + 1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))).title()
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 80))).capitalize() + '.'
+        year = min(2025, int(rng.gauss(1995, 25)))
+        yield (title, author, year, isbn13(serial), rng.choices(categories, weights)[0], description)
+
+def generate_members(rng, count):
+    start = date(2015, 1, 1)
+    for serial in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (f"{first} {last}", f"{first.lower()}.{last.lower()}.{serial}@example.org",
+               f"+1-555-{serial % 10000:04d}", f"{rng.randint(1, 9999)} {rng.choice(WORDS).title()} St",
+               start + timedelta(days=rng.randint(0, 3650)))
+
+def generate_loans(rng, count, book_count, member_count, today):
+    """Loan history ending at `today`; each book has at most one open loan"""
+    pick_book = zipf_sampler(rng, book_count)
+    pick_member = zipf_sampler(rng, member_count, s=0.9)
+    open_books = set()
+    horizon = 3 * 365
+    chunk = 10000
+    produced = 0
+    while produced < count:
+        size = min(chunk, count - produced)
+        for book_id, member_id in zip(pick_book(size), pick_member(size)):
+            borrow_date = today - timedelta(days=rng.randint(0, horizon))
+            due_date = borrow_date + timedelta(days=rng.choice((7, 14, 14, 21, 30)))
+            returned = borrow_date + timedelta(days=rng.randint(1, 40))
+            if returned > today:
+                if book_id in open_books:
+                    returned = today
+                else:
+                    open_books.add(book_id)
+                    returned = None
+            yield (book_id, member_id, borrow_date, due_date, returned)
+        produced += size
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+TABLES = {
+    'books': ("INSERT INTO books (title, author, year, isbn, category, description) VALUES (%s, %s, %s, %s, %s, %s)",
+              ('title', 'author', 'year', 'isbn', 'category', 'description')),
+    'members': ("INSERT INTO members (name, email, phone, address, join_date) VALUES (%s, %s, %s, %s, %s)",
+                ('name', 'email', 'phone', 'address', 'join_date')),
+    'borrowings': ("INSERT INTO borrowings (book_id, member_id, borrow_date, due_date, returned_date) VALUES (%s, %s, %s, %s, %s)",
+                   ('book_id', 'member_id', 'borrow_date', 'due_date', 'returned_date')),
+}
+
+def load_table(conn, table, rows, batch_size):
+    statement = TABLES[table][0]
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    total = 0
+    for batch in batched(rows, batch_size):
+        cursor.executemany(statement, batch)
+        conn.commit()
+        total += len(batch)
+        print(f"  {table}: {total} rows ({total / (time.perf_counter() - started):.0f} rows/s)", end='\r')
+    print()
+    return total
+
+def write_csv(directory, table, rows):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{table}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLES[table][1])
+        writer.writerows(rows)
+    return path
+
+def generate(books, members, loans, seed=42, batch_size=5000, csv_dir=None, today=None):
+    """Generate the synthetic dataset into the configured database (empty tables assumed) or CSV files"""
+    today = today or date.today()
+    rng = random.Random(seed)
+    streams = (
+        ('books', generate_books(rng, books)),
+        ('members', generate_members(rng, members)),
+        ('borrowings', generate_loans(rng, loans, books, members, today)),
+    )
+    if csv_dir:
+        for table, rows in streams:
+            print(f"  wrote {write_csv(csv_dir, table, rows)}")
+        return
+    from db_config import connect_db
+    import availability
+    import stats
+    conn = connect_db()
+    for table, rows in streams:
+        load_table(conn, table, rows, batch_size)
+    availability.rebuild(conn)
+    stats.reconcile(conn)
+    conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic library dataset")
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--members', type=int, default=10000)
+    parser.add_argument('--loans', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--csv-dir', help="write CSV files instead of loading the database")
+    parser.add_argument('--backend', help="database to load: mysql or sqlite (default: DB_BACKEND)")
+    args = parser.parse_args()
+    if args.backend:
+        import db_config
+        db_config.use_backend(args.backend)
+    generate(args.books, args.members, args.loans, args.seed, args.batch_size, args.csv_dir)
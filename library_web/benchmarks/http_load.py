@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles (in ms) for one load run"""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2)
+    }
+
+def http_fetcher(base_url, timeout=30.0):
+    """fetch(path) -> True on a 2xx/3xx response, over real HTTP"""
+    base_url = base_url.rstrip('/')
+    def fetch(path):
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+                response.read()
+            return True
+        except (urllib.error.URLError, OSError):
+            return False
+    return fetch
+
+def round_robin(paths):
+    """Request picker cycling through a fixed path list"""
+    counter = iter(range(10 ** 12))
+    lock = threading.Lock()
+    def pick(rng):
+        with lock:
+            path = paths[next(counter) % len(paths)]
+        return path, path
+    return pick
+
+def run_load(base_url, paths, concurrency=16, duration=10.0, timeout=30.0, fetch=None, seed=None):
+    """Drive load from `concurrency` threads for `duration` seconds.
+
+    `paths` is either a list (requested round-robin) or a picker
+    pick(rng) -> (label, path); results are summarized overall and per label.
+    """
+    fetch = fetch or http_fetcher(base_url, timeout)
+    pick = round_robin(paths) if isinstance(paths, (list, tuple)) else paths
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        while time.monotonic() < deadline:
+            label, path = pick(rng)
+            started = time.perf_counter()
+            ok = fetch(path)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.setdefault(label, []).append(elapsed)
+                else:
+                    errors[label] = errors.get(label, 0) + 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    result = summarize([value for values in latencies.values() for value in values], sum(errors.values()), elapsed)
+    if not isinstance(paths, (list, tuple)):
+        result['by_label'] = {label: summarize(latencies.get(label, []), errors.get(label, 0), elapsed)
+                              for label in sorted(set(latencies) | set(errors))}
+    return result
@@ -0,0 +1,79 @@
+# HTTP load driver replaying a weighted mix of dashboard, search, borrow-form
+# and JSON API traffic.
+#
+#   python -m benchmarks.load --url http://127.0.0.1:8000 --concurrency 32 --duration 60 --pid <gunicorn worker pid>
+#   python -m benchmarks.load --in-process --duration 20
+#
+# --in-process drives app.py through Flask's test client, so no HTTP server
+# is needed; the configured database (local MySQL or stand-in) is still used.
+import argparse
+import resource
+from urllib.parse import quote
+from benchmarks.http_load import run_load
+from benchmarks.results import save_results
+
+SEARCH_TERMS = ['history', 'python', 'secret garden', 'shadow', 'winter night', 'data', 'mystery', '978-0']
+
+# (label, weight, path factory)
+TRAFFIC_MIX = [
+    ('dashboard', 20, lambda rng: '/'),
+    ('books_search', 35, lambda rng: '/books?search=' + quote(rng.choice(SEARCH_TERMS))),
+    ('books_page', 10, lambda rng: f'/books?after={rng.randint(0, 100000)}'),
+    ('borrow_form', 10, lambda rng: '/borrow'),
+    ('api_books', 20, lambda rng: f'/api/books?after={rng.randint(0, 100000)}&limit=100'),
+    ('api_members', 5, lambda rng: '/api/members?limit=100'),
+]
+
+def mix_picker(mix):
+    labels = [label for label, _, _ in mix]
+    weights = [weight for _, weight, _ in mix]
+    factories = {label: factory for label, _, factory in mix}
+    def pick(rng):
+        label = rng.choices(labels, weights)[0]
+        return label, factories[label](rng)
+    return pick
+
+def in_process_fetcher():
+    from app import app
+    def fetch(path):
+        response = app.test_client().get(path)
+        response.close()
+        return response.status_code < 400
+    return fetch
+
+def rss_kib(pid):
+    """Current and peak resident set size of a local process, from /proc"""
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                key, amount = line.split(':')
+                values[key] = int(amount.split()[0])
+    return {'rss_kib': values.get('VmRSS'), 'peak_rss_kib': values.get('VmHWM')}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a weighted traffic mix against the library app")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--in-process', action='store_true', help="use Flask's test client instead of HTTP")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pid', type=int, help="server process to sample memory from")
+    parser.add_argument('--output', help="results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    fetch = in_process_fetcher() if args.in_process else None
+    result = run_load(args.url, mix_picker(TRAFFIC_MIX), args.concurrency, args.duration, fetch=fetch, seed=args.seed)
+    if args.in_process:
+        result['peak_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elif args.pid:
+        result.update(rss_kib(args.pid))
+
+    print(f"{'route':<14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, summary in list(result['by_label'].items()) + [('total', result)]:
+        print(f"{label:<14} {summary['requests_per_second']:>8} {summary['p50_ms']:>8} "
+              f"{summary['p95_ms']:>8} {summary['p99_ms']:>8} {summary['errors']:>7}")
+    if result.get('peak_rss_kib'):
+        print(f"peak RSS: {result['peak_rss_kib'] / 1024:.1f} MiB")
+    results = dict(result.pop('by_label'), total=result)
+    print(f"Saved {save_results('load', results, vars(args), args.output)}")
@@ -0,0 +1,86 @@
+# Per-request memory of book listings: SELECT b.* into dictionary-cursor rows
+# versus the projected columns and slotted Records that library_db returns.
+#
+#   python -m benchmarks.memory --rows 500            # against the configured database
+#   python -m benchmarks.memory --rows 500 --synthetic  # rows from benchmarks.datagen, no database
+#
+# Reports the tracemalloc peak while fetching and the size of the retained rows.
+import argparse
+import random
+import tracemalloc
+import library_db
+import records
+from benchmarks.datagen import generate_books
+from benchmarks.results import save_results
+
+LEGACY_LISTING_SQL = library_db.book_listing_sql('b.*')
+LEGACY_COLUMNS = ('id', 'title', 'author', 'year', 'isbn', 'category', 'description', 'created_at', 'updated_at',
+                  'total_copies', 'available_copies', 'status')
+
+def measure(fetch):
+    """(peak KiB while fetching, KiB still held by the returned rows)"""
+    tracemalloc.start()
+    rows = fetch()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return round(peak / 1024, 1), round(retained / 1024, 1)
+
+def database_fetchers(count):
+    from db_config import connect_db
+
+    def legacy():
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(LEGACY_LISTING_SQL + "ORDER BY b.id LIMIT %s", (count,))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def projected():
+        conn = connect_db()
+        cursor = conn.cursor()
+        cursor.execute(library_db.BOOK_LISTING_SQL + "ORDER BY b.id LIMIT %s", (count,))
+        rows = records.fetch_all(cursor)
+        conn.close()
+        return rows
+
+    return legacy, projected
+
+def synthetic_fetchers(count, seed=42):
+    from datetime import datetime
+
+    stamp = datetime(2024, 1, 1)
+    raw = [(book_id,) + book + (stamp, stamp, 1, 1, 'Available')
+           for book_id, book in enumerate(generate_books(random.Random(seed), count), start=1)]
+    summary_fields = ('id', 'title', 'author', 'year', 'isbn', 'category', 'description',
+                      'status', 'available_copies', 'total_copies')
+
+    def legacy():
+        return [dict(zip(LEGACY_COLUMNS, row)) for row in raw]
+
+    def projected():
+        cls = records.record_class(summary_fields)
+        preview = library_db.DESCRIPTION_PREVIEW
+        return [cls(*row[:6], row[6][:preview], row[11], row[10], row[9]) for row in raw]
+
+    return legacy, projected
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare listing memory of dict rows and projected Records")
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--synthetic', action='store_true', help="use generated rows instead of the database")
+    parser.add_argument('--output', help="results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    legacy, projected = (synthetic_fetchers if args.synthetic else database_fetchers)(args.rows)
+    legacy(), projected()  # warm-up: connections, record class, statement caches
+    results = {}
+    print(f"{'rows':<34} {'peak KiB':>10} {'retained KiB':>13}")
+    for name, fetch in (('dict rows, SELECT b.*', legacy), ('Records, projected columns', projected)):
+        peak, retained = measure(fetch)
+        results[name] = {'peak_kib': peak, 'retained_kib': retained}
+        print(f"{name:<34} {peak:>10} {retained:>13}")
+    saved = results['dict rows, SELECT b.*']['retained_kib'] - results['Records, projected columns']['retained_kib']
+    print(f"Retained per row: {saved * 1024 / args.rows:.0f} bytes less with Records")
+    print(f"Saved {save_results('memory', results, vars(args), args.output)}")
@@ -0,0 +1,94 @@
+# Micro-benchmarks for the library_db functions against the configured database.
+#
+#   python -m benchmarks.micro --iterations 200 [--cold] [--only search_books] [--backend sqlite]
+#
+# Run benchmarks.datagen first for a production-sized dataset. --cold clears
+# the read-through cache before every call so cached lookups hit MySQL.
+import argparse
+import time
+import tracemalloc
+import cache
+import db_config
+import library_db
+from benchmarks.http_load import percentile
+from benchmarks.results import save_results
+
+def sample_ids():
+    from db_config import connect_db
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM books")
+    book_range = cursor.fetchone()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM members")
+    member_range = cursor.fetchone()
+    cursor.execute("SELECT isbn FROM books WHERE isbn IS NOT NULL LIMIT 1")
+    isbn = (cursor.fetchone() or ('978-0-0000-0000-0',))[0]
+    conn.close()
+    return book_range, member_range, isbn
+
+def read_workloads(book_range, member_range, isbn):
+    """(name, callable) pairs; callables take the iteration number to vary their arguments"""
+    def book_id(i):
+        low, high = book_range
+        return low + (i * 7919) % max(1, high - low + 1)
+    def member_id(i):
+        low, high = member_range
+        return low + (i * 7919) % max(1, high - low + 1)
+    terms = ['history', 'python', 'secret garden', 'shadow', 'sc', '978-0', 'winter night']
+    return [
+        ('get_books_page', lambda i: library_db.get_books_page()),
+        ('get_books_page (deep)', lambda i: library_db.get_books_page(book_id(i))),
+        ('get_book_by_id', lambda i: library_db.get_book_by_id(book_id(i))),
+        ('search_books', lambda i: library_db.search_books(terms[i % len(terms)])),
+        ('autocomplete_books', lambda i: library_db.autocomplete_books(terms[i % len(terms)][:3])),
+        ('get_members_page', lambda i: library_db.get_members_page()),
+        ('get_member_by_id', lambda i: library_db.get_member_by_id(member_id(i))),
+        ('search_members', lambda i: library_db.search_members(['john', 'smith', 'garcia'][i % 3])),
+        ('get_recent_borrowings', lambda i: library_db.get_recent_borrowings(5)),
+        ('get_overdue_books', lambda i: library_db.get_overdue_books(limit=50)),
+        ('get_dashboard_stats', lambda i: library_db.get_dashboard_stats()),
+        ('get_categories', lambda i: library_db.get_categories()),
+        ('check_isbn_exists', lambda i: library_db.check_isbn_exists(isbn)),
+    ]
+
+def bench(call, iterations, cold=False):
+    latencies = []
+    peaks = []
+    for i in range(iterations):
+        if cold:
+            cache.backend.clear()
+        tracemalloc.start()
+        started = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        'calls': iterations,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'calls_per_second': round(iterations / sum(latencies), 1),
+        'peak_alloc_kib': round(max(peaks) / 1024, 1)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each library_db read function")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--cold', action='store_true', help="clear the read-through cache before each call")
+    parser.add_argument('--only', action='append', help="run only the named workload(s)")
+    parser.add_argument('--backend', choices=db_config.BACKENDS, default=db_config.DB_BACKEND)
+    parser.add_argument('--output', help="results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+    db_config.use_backend(args.backend)
+
+    results = {}
+    print(f"{'function':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls/s':>9} {'peak KiB':>9}")
+    for name, call in read_workloads(*sample_ids()):
+        if args.only and name not in args.only:
+            continue
+        call(0)  # warm-up: pool connection, index build, statement caches
+        result = results[name] = bench(call, args.iterations, args.cold)
+        print(f"{name:<26} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+              f"{result['calls_per_second']:>9} {result['peak_alloc_kib']:>9}")
+    print(f"Saved {save_results('micro', results, vars(args), args.output)}")
@@ -0,0 +1,74 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+RESULTS_DIR = os.getenv('BENCHMARK_RESULTS_DIR', os.path.join(os.path.dirname(__file__), 'results'))
+# Relative slowdown (or throughput loss) reported as a regression by compare()
+REGRESSION_THRESHOLD = 0.10
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(kind, results, config, path=None):
+    """Write one benchmark run as JSON, tagged with the commit and host it ran on"""
+    commit = git_commit()
+    document = {
+        'kind': kind,
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'python': sys.version.split()[0],
+        'config': config,
+        'results': results
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{kind}-{commit or 'nocommit'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, default=str)
+    return path
+
+def _direction(metric):
+    """+1 if a higher value is better, -1 if lower is better, 0 if not comparable"""
+    if metric.endswith('per_second'):
+        return 1
+    if metric.endswith('_ms') or metric.endswith('_kib') or metric.endswith('_bytes'):
+        return -1
+    return 0
+
+def compare(baseline, candidate, threshold=REGRESSION_THRESHOLD):
+    """Yield (name, metric, old, new, change, regressed) for every metric present in both runs"""
+    for name, old_metrics in baseline['results'].items():
+        new_metrics = candidate['results'].get(name)
+        if not isinstance(old_metrics, dict) or not isinstance(new_metrics, dict):
+            continue
+        for metric, old in old_metrics.items():
+            new = new_metrics.get(metric)
+            direction = _direction(metric)
+            if not direction or not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / old
+            yield name, metric, old, new, change, change * direction < -threshold
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m benchmarks.results BASELINE.json CANDIDATE.json")
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        baseline = json.load(f)
+    with open(sys.argv[2]) as f:
+        candidate = json.load(f)
+    print(f"{baseline.get('commit')} -> {candidate.get('commit')}")
+    regressions = 0
+    for name, metric, old, new, change, regressed in compare(baseline, candidate):
+        regressions += regressed
+        print(f"{'❌' if regressed else '  '} {name:<28} {metric:<20} {old:>10} -> {new:<10} {change:+.1%}")
+    print(f"\n{regressions} regression(s) beyond {REGRESSION_THRESHOLD:.0%}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,221 @@
+import argparse
+import csv
+import json
+import os
+import time
+import mysql.connector
+from db_config import get_db
+import availability
+import cache
+import search_index
+import stats
+import versions
+
+BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+MAX_REJECTS_KEPT = 1000
+
+def read_rows(stream, fmt):
+    """Yield (line_number, dict) pairs from a CSV or JSONL text stream without loading it whole"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, {'_error': f"invalid JSON: {e}"}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+def validate(row):
+    """Return (values tuple, None) for a valid row or (None, reason)"""
+    if not isinstance(row, dict):
+        # A JSONL line can be valid JSON without being an object, e.g. [1, 2] or "x"
+        return None, 'not an object'
+    if '_error' in row:
+        return None, row['_error']
+    title = str(row.get('title') or '').strip()
+    author = str(row.get('author') or '').strip()
+    isbn = str(row.get('isbn') or '').strip()
+    if not title:
+        return None, 'missing title'
+    if not author:
+        return None, 'missing author'
+    if not isbn:
+        return None, 'missing ISBN'
+    if len(isbn) > 20:
+        return None, 'ISBN longer than 20 characters'
+    year = str(row.get('year') or '').strip()
+    if year:
+        try:
+            year = int(year)
+        except ValueError:
+            return None, f"invalid year {year!r}"
+    else:
+        year = None
+    category = str(row.get('category') or '').strip() or None
+    description = str(row.get('description') or '').strip() or None
+    return (title[:255], author[:255], year, isbn, category and category[:100], description), None
+
+def existing_isbns(cursor, isbns):
+    """Set-based lookup of which ISBNs are already catalogued"""
+    if not isbns:
+        return set()
+    placeholders = ', '.join(['%s'] * len(isbns))
+    cursor.execute(f"SELECT isbn FROM books WHERE isbn IN ({placeholders})", list(isbns))
+    return {row[0] for row in cursor.fetchall()}
+
+def read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    return 0
+
+def write_checkpoint(path, line_number):
+    if not path:
+        return
+    with open(path + '.tmp', 'w') as f:
+        f.write(str(line_number))
+    os.replace(path + '.tmp', path)
+
+class ImportReport:
+    """Running totals for one import"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = []
+        self.rejected_count = 0
+        self.last_line = 0
+
+    def reject(self, line_number, reason):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REJECTS_KEPT:
+            self.rejected.append({'line': line_number, 'reason': reason})
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.read / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'read': self.read,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected_count,
+            'rejected_rows': self.rejected,
+            'last_line': self.last_line,
+            'seconds': round(time.perf_counter() - self.started, 3),
+            'rows_per_second': round(self.rows_per_second, 1)
+        }
+
+def _insert_batch(conn, batch, report):
+    """Insert one batch in a single transaction, skipping ISBNs that already exist"""
+    cursor = conn.cursor()
+    for attempt in range(2):
+        # ISBNs compare case-insensitively, like the column's collation on both backends
+        existing = {isbn.lower() for isbn in existing_isbns(cursor, {values[3] for _, values in batch})}
+        fresh = []
+        seen = set()
+        for line_number, values in batch:
+            key = values[3].lower()
+            if key in existing or key in seen:
+                continue
+            seen.add(key)
+            fresh.append(values)
+        try:
+            if fresh:
+                cursor.executemany("""
+                    INSERT INTO books (title, author, year, isbn, category, description)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, fresh)
+                # One copy per imported title
+                copies = availability.ensure_copies(cursor, [values[3] for values in fresh])
+                stats.bump(cursor, total_books=len(fresh), total_copies=copies)
+                versions.bump(cursor, 'books')
+            conn.commit()
+        except mysql.connector.IntegrityError:
+            # Another writer added one of these ISBNs since the lookup; look again once
+            conn.rollback()
+            if attempt:
+                raise
+            continue
+        report.inserted += len(fresh)
+        report.duplicates += len(batch) - len(fresh)
+        return
+
+def import_books(stream, fmt='csv', batch_size=BATCH_SIZE, checkpoint=None, progress=None):
+    """Stream, validate, dedup and insert books in batched transactions.
+
+    With a checkpoint path, the last committed line is recorded after every
+    batch and rows up to it are skipped on the next run, so a failed import
+    can be resumed.
+    """
+    report = ImportReport()
+    resume_after = read_checkpoint(checkpoint)
+    conn = get_db()
+    batch = []
+    try:
+        for line_number, row in read_rows(stream, fmt):
+            if line_number <= resume_after:
+                continue
+            report.read += 1
+            report.last_line = line_number
+            values, error = validate(row)
+            if error:
+                report.reject(line_number, error)
+            else:
+                batch.append((line_number, values))
+            if len(batch) >= batch_size:
+                _insert_batch(conn, batch, report)
+                write_checkpoint(checkpoint, line_number)
+                batch = []
+                if progress:
+                    progress(report)
+        if batch:
+            _insert_batch(conn, batch, report)
+        write_checkpoint(checkpoint, report.last_line or resume_after)
+    finally:
+        conn.close()
+        if report.inserted:
+            search_index.books.invalidate()
+            cache.invalidate('categories')
+    if progress:
+        progress(report)
+    return report
+
+def print_progress(report):
+    print(f"📥 {report.read} read, {report.inserted} inserted, {report.duplicates} duplicate, "
+          f"{report.rejected_count} rejected ({report.rows_per_second:.0f} rows/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import books from a CSV or JSONL file")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--checkpoint', help="checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint")
+    parser.add_argument('--rejects', help="write rejected rows to this JSONL file")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.path + '.checkpoint'
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    with open(args.path, newline='', encoding='utf-8') as f:
+        report = import_books(f, args.format or detect_format(args.path), args.batch_size, checkpoint, print_progress)
+    if args.rejects:
+        with open(args.rejects, 'w') as f:
+            for rejected in report.rejected:
+                f.write(json.dumps(rejected) + '\n')
+    print(f"✅ Import finished: {json.dumps({k: v for k, v in report.as_dict().items() if k != 'rejected_rows'})}")
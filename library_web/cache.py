@@ -0,0 +1,293 @@
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Load cache settings
+BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+# invalidate() only reaches the local process with the in-process cache, so its entries
+# live briefly: that is how long another web worker may serve a row edited elsewhere.
+# Run several workers with CACHE_BACKEND=redis to cache for longer.
+DEFAULT_TTL = float(os.getenv('CACHE_TTL', '300' if BACKEND == 'redis' else '10'))
+MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'library:')
+
+_MISSING = object()
+
+# Fills carry the invalidation generation seen before the read that produced them,
+# and are dropped if any invalidation happened since: a reader that queried before
+# a write commits cannot store its stale row after the writer has invalidated it.
+GENERATION_KEY = 'generation'
+
+class LRUCache:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+        self.errors = 0
+        self._generation = 0
+
+    def token(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """Return the cached value or the _MISSING sentinel"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+
+    def set(self, key, value, ttl, token=None):
+        with self._lock:
+            if token is not None and token != self._generation:
+                self.stale_fills += 1
+                return
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_fills': self.stale_fills,
+                'errors': self.errors
+            }
+
+class SharedCache:
+    """Cache kept in a Redis-compatible server so every worker sees the same entries"""
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        try:
+            payload = self.client.get(self.prefix + key)
+        except Exception:
+            # An unreachable cache must never take reads down with it
+            self._count('errors')
+            return _MISSING
+        if payload is None:
+            self._count('misses')
+            return _MISSING
+        self._count('hits')
+        return pickle.loads(payload)
+
+    def token(self):
+        try:
+            return self.client.get(self.prefix + GENERATION_KEY) or b'0'
+        except Exception:
+            self._count('errors')
+            return _MISSING
+
+    def set(self, key, value, ttl, token=None):
+        if token is _MISSING:
+            return
+        try:
+            if token is None:
+                self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+                return
+            # WATCH aborts the write if an invalidation bumps the generation in between
+            with self.client.pipeline() as pipe:
+                pipe.watch(self.prefix + GENERATION_KEY)
+                if (pipe.get(self.prefix + GENERATION_KEY) or b'0') != token:
+                    self._count('stale_fills')
+                    return
+                pipe.multi()
+                pipe.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+                pipe.execute()
+        except Exception as e:
+            self._count('stale_fills' if type(e).__name__ == 'WatchError' else 'errors')
+
+    def delete(self, *keys):
+        try:
+            # Bump first: a fill that passed its check before the bump is removed by the delete
+            self.client.incr(self.prefix + GENERATION_KEY)
+            self.client.delete(*[self.prefix + key for key in keys])
+            with self._lock:
+                self.invalidations += len(keys)
+        except Exception:
+            self._count('errors')
+
+    def clear(self):
+        try:
+            self.client.incr(self.prefix + GENERATION_KEY)
+            keys = [key for key in self.client.scan_iter(self.prefix + '*')
+                    if key not in (self.prefix + GENERATION_KEY, (self.prefix + GENERATION_KEY).encode())]
+            if keys:
+                self.client.delete(*keys)
+        except Exception:
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'shared',
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': None,
+                'invalidations': self.invalidations,
+                'stale_fills': self.stale_fills,
+                'errors': self.errors
+            }
+
+class WatchError(Exception):
+    """FakeRedis's counterpart of redis.WatchError"""
+
+class FakePipeline:
+    """WATCH/MULTI/EXEC over a FakeRedis: the queued commands run only if no watched key changed"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._watched = {}
+        self._commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, *keys):
+        with self.redis._lock:
+            self._watched = {key: self.redis._versions.get(key, 0) for key in keys}
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def multi(self):
+        self._commands = []
+
+    def set(self, key, value, ex=None):
+        self._commands.append((key, value, ex))
+
+    def execute(self):
+        with self.redis._lock:
+            if any(self.redis._versions.get(key, 0) != version for key, version in self._watched.items()):
+                raise WatchError(f"Watched keys changed: {', '.join(self._watched)}")
+            for key, value, ex in self._commands:
+                self.redis._set(key, value, ex)
+
+class FakeRedis:
+    """Local stand-in for the subset of the redis-py client that SharedCache uses"""
+
+    def __init__(self):
+        self._data = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def _set(self, key, value, ex=None):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._set(key, value, ex)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data.get(key, (b'0', None))[0]) + 1
+            self._set(key, str(value).encode())
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, pattern):
+        prefix = pattern.rstrip('*')
+        with self._lock:
+            return [key for key in self._data if key.startswith(prefix)]
+
+def create_backend(name=BACKEND):
+    if name == 'redis':
+        # Optional dependency, only needed when a shared cache is configured
+        import redis
+        return SharedCache(redis.Redis.from_url(REDIS_URL))
+    if name == 'fake':
+        return SharedCache(FakeRedis())
+    return LRUCache()
+
+backend = create_backend()
+
+def cached(key_func, ttl=DEFAULT_TTL):
+    """Read-through cache decorator; key_func builds the cache key from the call arguments"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            value = backend.get(key)
+            if value is _MISSING:
+                token = backend.token()
+                value = func(*args, **kwargs)
+                backend.set(key, value, ttl, token)
+            return value
+        return wrapper
+    return decorator
+
+def invalidate(*keys):
+    backend.delete(*keys)
+
+def stats():
+    return backend.stats()
@@ -1,16 +1,492 @@
-
+import functools
 import mysql.connector
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from flask import g, has_app_context, has_request_context, session
+import sqlite_backend
 
 # Load environment variables from .env file
 load_dotenv()
 
-def connect_db():
+# Load backend settings: 'mysql', or 'sqlite' for an embedded database file (see sqlite_backend.py)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql')
+BACKENDS = ('mysql', 'sqlite')
+
+def connect_db(host=None, port=None):
+    if DB_BACKEND == 'sqlite':
+        return sqlite_backend.connect()
+    return connect_mysql(host, port)
+
+def connect_mysql(host=None, port=None):
     return mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST', 'localhost'),
-        port=int(os.getenv('MYSQL_PORT', '3306')),
+        host=host or os.getenv('MYSQL_HOST', 'localhost'),
+        port=port or int(os.getenv('MYSQL_PORT', '3306')),
         user=os.getenv('MYSQL_USER', 'root'),
         password=os.getenv('MYSQL_PASSWORD'),
-        database=os.getenv('MYSQL_DATABASE', 'library_db')
+        database=os.getenv('MYSQL_DATABASE', 'library_db'),
+        buffered=True
     )
+
+# Query Listeners
+_query_listeners = []
+
+def add_query_listener(listener):
+    """Register listener(statement, params, seconds, connection), called after every pooled execute"""
+    _query_listeners.append(listener)
+
+def remove_query_listener(listener):
+    _query_listeners.remove(listener)
+
+# Commit Listeners
+_commit_listeners = []
+
+def add_commit_listener(listener):
+    """Register listener(), called in the committing thread after every pooled commit"""
+    _commit_listeners.append(listener)
+
+class TracedCursor:
+    """Cursor proxy that reports each statement to the registered query listeners"""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None, **kwargs):
+        started = time.perf_counter()
+        result = self._cursor.execute(operation, params, **kwargs)
+        self._notify(operation, params, time.perf_counter() - started)
+        return result
+
+    def executemany(self, operation, seq_params, **kwargs):
+        started = time.perf_counter()
+        result = self._cursor.executemany(operation, seq_params, **kwargs)
+        self._notify(operation, seq_params, time.perf_counter() - started)
+        return result
+
+    def _notify(self, operation, params, seconds):
+        for listener in list(_query_listeners):
+            listener(operation, params, seconds, self._connection)
+
+# Connection Pool
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+class PooledConnection:
+    """Wraps a raw connection so that close() hands it back to the pool"""
+
+    def __init__(self, pool, raw, request_bound=False):
+        self._pool = pool
+        self._raw = raw
+        self._request_bound = request_bound
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        return TracedCursor(cursor, self._raw) if _query_listeners else cursor
+
+    def commit(self):
+        self._raw.commit()
+        if self._pool.on_commit:
+            self._pool.on_commit()
+        for listener in list(_commit_listeners):
+            listener()
+
+    def close(self):
+        # Request-bound connections are released once, on app context teardown
+        if self._request_bound or self._raw is None:
+            return
+        self.release()
+
+    def release(self):
+        if self._raw is not None:
+            self._pool.checkin(self._raw)
+            self._raw = None
+
+class ConnectionPool:
+    """Fixed-size connection pool with overflow, recycling and checkout health checks"""
+
+    def __init__(self, connect, size=5, max_overflow=10, recycle=3600, pre_ping=True, timeout=30, on_commit=None):
+        self._connect = connect
+        self.on_commit = on_commit
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._idle = []
+        self._created_at = {}
+        self._cond = threading.Condition()
+        self._open = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._checkout_seconds = 0.0
+        self._max_checkout_seconds = 0.0
+
+    def checkout(self):
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._open >= self.size + self.max_overflow:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f"No database connection free after {self.timeout}s")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            raw = self._idle.pop() if self._idle else None
+            if raw is None:
+                self._open += 1
+            self._in_use += 1
+        try:
+            raw = self._prepare(raw)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_seconds += elapsed
+            self._max_checkout_seconds = max(self._max_checkout_seconds, elapsed)
+        return raw
+
+    def _prepare(self, raw):
+        if raw is not None:
+            expired = time.monotonic() - self._created_at.get(id(raw), 0) > self.recycle
+            if expired or (self.pre_ping and not self._is_alive(raw)):
+                self._discard(raw)
+                raw = None
+        if raw is None:
+            raw = self._connect()
+            self._created_at[id(raw)] = time.monotonic()
+        return raw
+
+    def _is_alive(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        self._created_at.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def checkin(self, raw):
+        try:
+            # End any open transaction so the next borrower gets a fresh snapshot
+            raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.size:
+                self._idle.append(raw)
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    def connection(self, request_bound=False):
+        return PooledConnection(self, self.checkout(), request_bound)
+
+    def dispose(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiters': self._waiters,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'avg_checkout_ms': round(self._checkout_seconds / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_checkout_ms': round(self._max_checkout_seconds * 1000, 3)
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _pool_options():
+    return {
+        'size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+        'recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+        'pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30'))
+    }
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(connect_db, on_commit=mark_write, **_pool_options())
+    return _pool
+
+def get_db():
+    """Return a pooled connection, reusing one per Flask app context when available"""
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = get_pool().connection(request_bound=True)
+        return g.db_conn
+    return get_pool().connection()
+
+def close_db(exception=None):
+    for name in ('db_conn', 'read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            conn.release()
+
+# Read Replicas
+# Read-only library_db queries go to a replica through get_read_db(). A replica
+# is used only while its last health check saw it connected and no more than
+# REPLICA_MAX_LAG seconds behind; otherwise reads fall back to the primary.
+# After a commit on the primary, the same session reads from the primary for
+# READ_YOUR_WRITES_SECONDS, so e.g. /books right after add_book shows the book.
+
+# Load replica settings
+REPLICA_HOSTS = [host.strip() for host in os.getenv('MYSQL_REPLICA_HOSTS', '').split(',') if host.strip()]
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
+READ_YOUR_WRITES_SECONDS = float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '5'))
+WRITE_SESSION_KEY = '_db_write_at'
+
+def replication_lag(raw):
+    """Seconds the replica is behind its source, 0 for a server without replication, None if replication is stopped"""
+    cursor = raw.cursor(dictionary=True)
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except mysql.connector.Error:
+        # MySQL before 8.0.22
+        cursor.execute("SHOW SLAVE STATUS")
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return 0.0
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+class Replica:
+    """A read replica with its own pool and a periodically refreshed health state"""
+
+    def __init__(self, name, connect, **pool_options):
+        self.name = name
+        self.pool = ConnectionPool(connect, **pool_options)
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.reads = 0
+        self._check_lock = threading.Lock()
+
+    def check(self):
+        try:
+            raw = self.pool.checkout()
+        except Exception as e:
+            return self._record(None, e)
+        try:
+            lag = replication_lag(raw)
+        except Exception as e:
+            self.pool.checkin(raw)
+            return self._record(None, e)
+        self.pool.checkin(raw)
+        return self._record(lag, None if lag is not None else 'replication stopped')
+
+    def _record(self, lag, error):
+        self.lag = lag
+        self.error = str(error) if error else None
+        self.healthy = lag is not None and lag <= REPLICA_MAX_LAG
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+    def usable(self):
+        """Health as of the last check, re-checking once the interval has passed (one thread at a time)"""
+        due = self.checked_at is None or time.monotonic() - self.checked_at >= REPLICA_CHECK_INTERVAL
+        if due and self._check_lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._check_lock.release()
+        return self.healthy
+
+    def mark_down(self, error):
+        self._record(None, error)
+
+    def stats(self):
+        return dict(self.pool.stats(), name=self.name, healthy=self.healthy, lag=self.lag,
+                    error=self.error, reads=self.reads)
+
+def _parse_host(host):
+    name, _, port = host.partition(':')
+    return name, int(port) if port else None
+
+_replicas = None
+_next_replica = 0
+routing_stats = {'replica': 0, 'primary_fallback': 0, 'read_your_writes': 0}
+
+def get_replicas():
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                hosts = REPLICA_HOSTS if DB_BACKEND == 'mysql' else []
+                _replicas = [Replica(host, functools.partial(connect_mysql, *_parse_host(host)), **_pool_options())
+                             for host in hosts]
+    return _replicas
+
+def configure_replicas(connectors):
+    """Replace the replicas with (name, connect) pairs, e.g. fake drivers in tests; [] routes every read to the primary"""
+    global _replicas
+    old, _replicas = _replicas or [], [Replica(name, connect, **_pool_options()) for name, connect in connectors]
+    for replica in old:
+        replica.pool.dispose()
+
+def mark_write():
+    """Pin this request, and the session for READ_YOUR_WRITES_SECONDS, to the primary"""
+    if not get_replicas():
+        return
+    if has_app_context():
+        g.db_wrote = True
+    if has_request_context():
+        session[WRITE_SESSION_KEY] = time.time()
+
+def _recently_wrote():
+    if has_app_context() and g.get('db_wrote'):
+        return True
+    if has_request_context():
+        wrote_at = session.get(WRITE_SESSION_KEY)
+        return wrote_at is not None and time.time() - wrote_at < READ_YOUR_WRITES_SECONDS
+    return False
+
+def _replica_connection(request_bound):
+    global _next_replica
+    replicas = get_replicas()
+    start = _next_replica = (_next_replica + 1) % len(replicas)
+    for replica in replicas[start:] + replicas[:start]:
+        if not replica.usable():
+            continue
+        try:
+            conn = replica.pool.connection(request_bound)
+        except PoolTimeoutError:
+            continue
+        except Exception as e:
+            replica.mark_down(e)
+            continue
+        replica.reads += 1
+        return conn
+    return None
+
+def get_read_db():
+    """Return a connection for read-only queries: a healthy replica when configured, otherwise the primary"""
+    if not get_replicas():
+        return get_db()
+    if _recently_wrote():
+        routing_stats['read_your_writes'] += 1
+        return get_db()
+    if has_app_context() and 'read_conn' in g:
+        routing_stats['replica'] += 1
+        return g.read_conn
+    conn = _replica_connection(has_app_context())
+    if conn is None:
+        routing_stats['primary_fallback'] += 1
+        return get_db()
+    routing_stats['replica'] += 1
+    if has_app_context():
+        g.read_conn = conn
+    return conn
+
+def get_stream_db():
+    """A connection of its own for one unbuffered result set, checked in again by close()
+
+    An unbuffered cursor ties up its connection until the last row is read, so
+    streams never share the request's connection. Like get_read_db(), they use a
+    healthy replica when one is configured.
+    """
+    if get_replicas() and not _recently_wrote():
+        conn = _replica_connection(False)
+        if conn is not None:
+            routing_stats['replica'] += 1
+            return conn
+    return get_pool().connection()
+
+def use_backend(backend):
+    """Switch to another backend, closing the idle connections of the current one"""
+    global DB_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    DB_BACKEND = backend
+    dispose()
+
+# Process Lifecycle
+def dispose():
+    """Close the idle connections of every pool; the next checkout builds the pools again"""
+    global _pool, _replicas
+    with _pool_lock:
+        pools = ([_pool] if _pool else []) + [replica.pool for replica in _replicas or []]
+        _pool, _replicas = None, None
+    for pool in pools:
+        pool.dispose()
+
+def reset_after_fork():
+    """Forget the pools inherited from the parent process without closing them
+
+    A forked child shares its parent's sockets, so closing them would end the
+    parent's sessions. The child builds pools of its own on first use.
+    """
+    global _pool, _replicas, _pool_lock
+    _pool, _replicas = None, None
+    # The parent may have held the lock while forking
+    _pool_lock = threading.Lock()
+
+def warm_pools():
+    """Open the core connections of the primary pool and every healthy replica's; returns the number opened"""
+    pools = [get_pool()] + [replica.pool for replica in get_replicas() if replica.check()]
+    opened = 0
+    for pool in pools:
+        conns = [pool.connection() for _ in range(pool.size)]
+        for conn in conns:
+            conn.close()
+        opened += len(conns)
+    return opened
+
+def pool_stats():
+    result = get_pool().stats()
+    if get_replicas():
+        result['replicas'] = [replica.stats() for replica in get_replicas()]
+        result['routing'] = dict(routing_stats)
+    return result
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
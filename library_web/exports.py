@@ -0,0 +1,184 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from db_config import get_stream_db
+
+# Streaming exports of books, members and loans as CSV or NDJSON. Rows come off
+# an unbuffered cursor on a connection of their own (db_config.get_stream_db)
+# and are encoded a batch at a time, so memory stays flat however many years
+# of history are exported. The inverse of bulk_import.py.
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+BATCH_SIZE = 1000
+# Loan status filters: open loans live only in borrowings, returned ones in borrowings or the archive
+LOAN_STATUSES = ('all', 'active', 'overdue', 'returned')
+BOOK_STATUSES = ('all', 'available', 'borrowed')
+
+class ExportError(ValueError):
+    """Raised for an unknown format or an invalid filter"""
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"{name} must be a date like 2024-01-31, not {value!r}") from None
+
+# Statements: each export is a list of (sql, params) run one after the other
+def books_statements(category=None, status='all'):
+    if status not in BOOK_STATUSES:
+        raise ExportError(f"status must be one of {', '.join(BOOK_STATUSES)}")
+    where, params = [], []
+    if category:
+        where.append("b.category = %s")
+        params.append(category)
+    if status == 'available':
+        where.append("b.available_copies > 0")
+    elif status == 'borrowed':
+        where.append("b.available_copies = 0 AND b.total_copies > 0")
+    sql = """
+        SELECT b.id, b.title, b.author, b.year, b.isbn, b.category, b.description,
+               b.total_copies, b.available_copies, b.created_at
+        FROM books b
+    """
+    if where:
+        sql += "WHERE " + " AND ".join(where) + " "
+    return [(sql + "ORDER BY b.id", params)]
+
+def members_statements(joined_from=None, joined_to=None):
+    where, params = _date_range('m.join_date', joined_from, joined_to)
+    sql = """
+        SELECT m.id, m.name, m.email, m.phone, m.address, m.join_date,
+               (SELECT COUNT(*) FROM active_loans al WHERE al.member_id = m.id) as books_borrowed
+        FROM members m
+    """
+    if where:
+        sql += "WHERE " + " AND ".join(where) + " "
+    return [(sql + "ORDER BY m.id", params)]
+
+def _date_range(column, start, end):
+    where, params = [], []
+    if start:
+        where.append(f"{column} >= %s")
+        params.append(start)
+    if end:
+        where.append(f"{column} <= %s")
+        params.append(end)
+    return where, params
+
+def borrowings_statements(borrowed_from=None, borrowed_to=None, status='all'):
+    """Archived loans first, then the hot table, each in borrow_date order off its borrow_date index"""
+    if status not in LOAN_STATUSES:
+        raise ExportError(f"status must be one of {', '.join(LOAN_STATUSES)}")
+    statements = []
+    tables = ('borrowings',) if status in ('active', 'overdue') else ('borrowings_archive', 'borrowings')
+    for table in tables:
+        where, params = _date_range('l.borrow_date', borrowed_from, borrowed_to)
+        if status == 'active':
+            where.append("l.returned_date IS NULL")
+        elif status == 'overdue':
+            where.append("l.returned_date IS NULL AND l.due_date < CURDATE()")
+        elif status == 'returned' and table == 'borrowings':
+            where.append("l.returned_date IS NOT NULL")
+        sql = f"""
+            SELECT l.id, l.book_id, b.title, c.barcode, l.member_id, m.name as member_name,
+                   l.borrow_date, l.due_date, l.returned_date,
+                   CASE WHEN l.returned_date IS NULL THEN 'Active' ELSE 'Returned' END as status,
+                   {int(table == 'borrowings_archive')} as archived
+            FROM {table} l
+            JOIN books b ON b.id = l.book_id
+            JOIN members m ON m.id = l.member_id
+            LEFT JOIN book_copies c ON c.id = l.copy_id
+        """
+        if where:
+            sql += "WHERE " + " AND ".join(where) + " "
+        statements.append((sql + "ORDER BY l.borrow_date, l.id", params))
+    return statements
+
+def statements_for(table, args):
+    """Build the statements for an export from request-style string arguments"""
+    if table == 'books':
+        return books_statements(args.get('category'), args.get('status') or 'all')
+    if table == 'members':
+        return members_statements(parse_date(args.get('from'), 'from'), parse_date(args.get('to'), 'to'))
+    if table == 'borrowings':
+        return borrowings_statements(parse_date(args.get('from'), 'from'), parse_date(args.get('to'), 'to'),
+                                     args.get('status') or 'all')
+    raise ExportError(f"Unknown export: {table}")
+
+# Streaming
+def iter_rows(statements, batch_size=BATCH_SIZE):
+    """Yield the column names, then batches of row tuples, reading each statement off an unbuffered cursor"""
+    conn = get_stream_db()
+    try:
+        columns = None
+        for sql, params in statements:
+            # mysql.connector hands rows over as the server sends them; SQLite steps through them anyway
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(sql, params)
+            if columns is None:
+                columns = [column[0] for column in cursor.description]
+                yield columns
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+    finally:
+        # A stream abandoned mid-result leaves unread rows; the pool discards that connection
+        conn.close()
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(next(chunks))
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def encode_ndjson(chunks):
+    columns = next(chunks)
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=_json_value) + '\n' for row in rows)
+
+def stream(table, fmt='csv', args=None, batch_size=BATCH_SIZE):
+    """Text chunks of one export; filters and format are checked before any query runs"""
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    statements = statements_for(table, args or {})
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    return encode(iter_rows(statements, batch_size))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream books, members or loans to stdout as CSV or NDJSON")
+    parser.add_argument('table', choices=('books', 'members', 'borrowings'))
+    parser.add_argument('--format', choices=tuple(FORMATS), default='csv')
+    parser.add_argument('--from', dest='from', help="first borrow/join date, e.g. 2024-01-01")
+    parser.add_argument('--to', help="last borrow/join date")
+    parser.add_argument('--status', help=f"books: {', '.join(BOOK_STATUSES)}; borrowings: {', '.join(LOAN_STATUSES)}")
+    parser.add_argument('--category')
+    args = parser.parse_args()
+
+    try:
+        for text in stream(args.table, args.format, vars(args)):
+            sys.stdout.write(text)
+    except ExportError as e:
+        parser.error(str(e))
@@ -0,0 +1,57 @@
+# gunicorn settings for the Flask app:
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The master preloads the app, which checks the schema version once, queues the
+# day's overdue scan if it is due, and then forks the workers. Each worker drops whatever it inherited from the master,
+# builds its own connection pools, and warms up before it takes connections.
+# On shutdown it lets its embedded job workers finish and closes its pools.
+import multiprocessing
+import os
+
+# Load gunicorn settings
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+# Requests wait on MySQL most of the time; threads let a worker overlap them (size DB_POOL_SIZE to match)
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = True
+# Warm-up runs before a worker's first heartbeat, so it has to finish within timeout
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers now and then; the jitter keeps them from restarting (and warming) all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def on_starting(server):
+    # The day's overdue scan is a write over every open loan: queue it once here
+    # rather than from every worker as they warm up at the same moment
+    import cache
+    import db_config
+    import overdue
+    if workers > 1 and cache.BACKEND == 'memory':
+        server.log.warning("CACHE_BACKEND=memory with %s workers: an edit is only invalidated in the worker "
+                           "that made it, the others serve cached rows for up to CACHE_TTL=%ss; "
+                           "set CACHE_BACKEND=redis to share the cache", workers, cache.DEFAULT_TTL)
+    overdue.ensure_fresh()
+    db_config.dispose()
+
+def post_fork(server, worker):
+    import db_config
+    db_config.reset_after_fork()
+
+def post_worker_init(worker):
+    import startup
+    result = startup.warm(worker.wsgi)
+    if result['warm']:
+        worker.log.info("Worker %s warm in %ss", worker.pid, result['warmup_seconds'])
+    elif startup.WARMUP_ENABLED:
+        worker.log.warning("Worker %s serving cold: %s", worker.pid, result['error'])
+
+def worker_exit(server, worker):
+    import db_config
+    import jobs
+    jobs.stop_embedded_workers(graceful_timeout)
+    db_config.dispose()
@@ -0,0 +1,121 @@
+import functools
+import gzip
+import hashlib
+import os
+from datetime import date
+from flask import Response, make_response, request, session
+import cache
+import versions
+
+try:
+    # Optional dependency, Brotli is offered only when the package is installed
+    import brotli
+except ImportError:
+    brotli = None
+
+# Load HTTP caching settings
+FRAGMENT_CACHE_ENABLED = os.getenv('HTTP_FRAGMENT_CACHE', '0') == '1'
+FRAGMENT_CACHE_TTL = float(os.getenv('HTTP_FRAGMENT_CACHE_TTL', '300'))
+COMPRESSION_ENABLED = os.getenv('HTTP_COMPRESSION', '1') == '1'
+COMPRESS_MIN_BYTES = int(os.getenv('HTTP_COMPRESS_MIN_BYTES', '500'))
+GZIP_LEVEL = int(os.getenv('HTTP_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('HTTP_BROTLI_QUALITY', '4'))
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript'}
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+def _deploy_salt():
+    """Changes whenever a template does, so browsers drop pages rendered by an older release"""
+    salt = os.getenv('HTTP_ETAG_SALT')
+    if salt:
+        return salt
+    mtimes = [os.path.getmtime(os.path.join(TEMPLATE_DIR, name)) for name in os.listdir(TEMPLATE_DIR)]
+    return str(int(max(mtimes, default=0)))
+
+ETAG_SALT = _deploy_salt()
+
+def validators(tables, daily=False, full_path=None, current=None):
+    """(etag, last_modified) for the current URL given the versions of the tables it reads"""
+    current = versions.current() if current is None else current
+    parts = [ETAG_SALT, request.full_path if full_path is None else full_path]
+    parts += [f"{table}={current.get(table, (0, None))[0]}" for table in tables]
+    if daily:
+        # Overdue state changes at midnight without any write
+        parts.append(date.today().isoformat())
+    etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    last_modified = max((current[table][1] for table in tables if table in current), default=None)
+    return etag, last_modified
+
+def _not_modified(etag, last_modified, req=request):
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(etag)
+    if req.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= req.if_modified_since
+    return False
+
+def _tag(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def conditional(*tables, daily=False, html=True):
+    """Serve 304 Not Modified from the table versions alone and tag fresh responses with ETag/Last-Modified.
+
+    Pass html=False for JSON views: they never show flash messages, so a pending
+    one must not keep their clients from getting a 304.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # A pending flash message is part of the next page, so it must be rendered
+            if request.method != 'GET' or (html and session.get('_flashes')):
+                return view(*args, **kwargs)
+            etag, last_modified = validators(tables, daily)
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = _render(view, etag, args, kwargs)
+            return _tag(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+def _render(view, etag, args, kwargs):
+    if FRAGMENT_CACHE_ENABLED:
+        cached = cache.backend.get(f'page:{etag}')
+        if cached is not cache._MISSING:
+            body, headers = cached
+            return Response(body, headers=headers)
+    response = make_response(view(*args, **kwargs))
+    if FRAGMENT_CACHE_ENABLED and response.status_code == 200 and not response.is_streamed:
+        cache.backend.set(f'page:{etag}', (response.get_data(), list(response.headers.items())), FRAGMENT_CACHE_TTL)
+    return response
+
+# Compression
+def _accepted_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_app(app):
+    if COMPRESSION_ENABLED:
+        app.after_request(compress_response)
@@ -0,0 +1,414 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from db_config import get_db
+import archive
+import bulk_import
+import library_db
+import overdue
+import records
+
+# Long operations (cascading deletes, imports, archival, overdue scans) are queued in the jobs
+# table and run by worker threads, so the request that asks for one answers
+# 202 Accepted straight away. Workers claim a queued job with a conditional
+# UPDATE, which works on both backends without SKIP LOCKED; a failed job is
+# queued again with exponential backoff until it runs out of attempts, and a
+# job whose worker died is queued again once its lock goes stale.
+#
+#   python jobs.py worker --threads 4              # one process, a thread per job
+#   python jobs.py worker --processes 2 --threads 4
+#   python jobs.py list
+#   python jobs.py retry 42
+
+# Load job settings
+WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', '4'))
+POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Seconds before the first retry, doubled on each further attempt
+RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', '5'))
+# A running job whose worker has not finished it within this many seconds is queued again
+STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '900'))
+# How often each worker looks for stale jobs
+REQUEUE_SECONDS = min(STALE_SECONDS, 60)
+# Worker threads each web process starts on its first request, so jobs run without a
+# separate `jobs.py worker`; set to 0 when dedicated workers serve the queue
+EMBEDDED_WORKERS = int(os.getenv('JOB_EMBEDDED_WORKERS', '1'))
+# Uploaded files wait here until their import job has run
+UPLOAD_DIR = os.getenv('JOB_UPLOAD_DIR', 'job_uploads')
+
+log = logging.getLogger('library.jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+JOB_COLUMNS = ("id, kind, payload, status, attempts, max_attempts, run_after, locked_by, result, error, "
+               "created_at, finished_at")
+
+class JobError(Exception):
+    """Raised when a job cannot be queued or changed"""
+
+# Handlers
+HANDLERS = {}
+# Most jobs of a kind running at once across every worker, enforced by claiming them
+# under a lock on the kind's job_kinds row; unlisted kinds are only bounded by the worker threads
+CONCURRENCY = {}
+
+def handler(kind, concurrency=None):
+    """Register func(**payload) as the handler for a job kind; its return value is stored as the result"""
+    def register(func):
+        HANDLERS[kind] = func
+        if concurrency:
+            CONCURRENCY[kind] = concurrency
+        return func
+    return register
+
+def _concurrency_overrides():
+    """JOB_CONCURRENCY=import_books=1,delete_member=2"""
+    for item in os.getenv('JOB_CONCURRENCY', '').split(','):
+        kind, _, limit = item.partition('=')
+        if kind.strip() and limit.strip():
+            CONCURRENCY[kind.strip()] = int(limit)
+
+@handler('delete_book')
+def delete_book(book_id):
+    library_db.delete_book(book_id)
+    return {'book_id': book_id}
+
+@handler('delete_member')
+def delete_member(member_id):
+    library_db.delete_member(member_id)
+    return {'member_id': member_id}
+
+@handler('import_books', concurrency=1)
+def import_books(path, fmt='csv'):
+    # The checkpoint lets a retry resume after the last committed batch
+    checkpoint = path + '.checkpoint'
+    with open(path, encoding='utf-8', newline='') as stream:
+        report = bulk_import.import_books(stream, fmt, checkpoint=checkpoint)
+    for leftover in (path, checkpoint):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    return report.as_dict()
+
+@handler('archive_borrowings', concurrency=1)
+def archive_borrowings(retention_days=None):
+    days = archive.RETENTION_DAYS if retention_days is None else retention_days
+    return {'archived': archive.archive(days)}
+
+@handler('overdue_scan', concurrency=1)
+def overdue_scan():
+    return {'newly_overdue': overdue.scan()}
+
+_concurrency_overrides()
+
+# Queue
+def enqueue(kind, payload=None, max_attempts=MAX_ATTEMPTS, delay=0):
+    """Queue a job and return its id; it runs on the next free worker after `delay` seconds"""
+    if kind not in HANDLERS:
+        raise JobError(f"Unknown job kind: {kind}")
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO jobs (kind, payload, status, max_attempts, run_after)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (kind, json.dumps(payload or {}), QUEUED, max_attempts, datetime.now() + timedelta(seconds=delay)))
+        job_id = cursor.lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
+def save_upload(upload):
+    """Store an uploaded file for a job to read later; returns its path"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    name = f"{int(time.time() * 1000)}-{os.getpid()}-{threading.get_ident()}-{os.path.basename(upload.filename)}"
+    path = os.path.abspath(os.path.join(UPLOAD_DIR, name))
+    upload.save(path)
+    return path
+
+def _decode(job):
+    if job is None:
+        return None
+    job = job._asdict()
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def get_job(job_id):
+    """One job as a dict with its payload and result decoded, or None"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = %s", (job_id,))
+        job = records.fetch_one(cursor)
+    finally:
+        conn.close()
+    return _decode(job)
+
+def recent_jobs(status=None, limit=50):
+    """Newest jobs first, optionally only those in one status"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        if status:
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE status = %s ORDER BY id DESC LIMIT %s", (status, limit))
+        else:
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY id DESC LIMIT %s", (limit,))
+        jobs = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return [_decode(job) for job in jobs]
+
+def queue_stats():
+    """Number of jobs per status"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        counts = dict(cursor.fetchall())
+    finally:
+        conn.close()
+    return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+
+def retry(job_id):
+    """Queue a failed job again with a fresh set of attempts"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs SET status = %s, attempts = 0, run_after = %s, error = NULL, finished_at = NULL
+            WHERE id = %s AND status = %s
+        """, (QUEUED, datetime.now(), job_id, FAILED))
+        retried = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if not retried:
+        raise JobError(f"Job {job_id} does not exist or has not failed")
+
+# Workers
+def _under_limit(conn, cursor, kind):
+    """Lock the kind's job_kinds row, then count its running jobs; the lock is held until commit or rollback"""
+    # Claims of a limited kind queue on this row, so each one counts the jobs the previous one claimed
+    cursor.execute("SELECT kind FROM job_kinds WHERE kind = %s FOR UPDATE", (kind,))
+    if not cursor.fetchall():
+        cursor.execute("INSERT IGNORE INTO job_kinds (kind) VALUES (%s)", (kind,))
+        conn.commit()
+        cursor.execute("SELECT kind FROM job_kinds WHERE kind = %s FOR UPDATE", (kind,))
+        cursor.fetchall()
+    cursor.execute("SELECT COUNT(*) FROM jobs WHERE kind = %s AND status = %s", (kind, RUNNING))
+    return cursor.fetchone()[0] < CONCURRENCY[kind]
+
+def claim(worker_id, scan=20):
+    """Take the oldest due job whose kind is under its concurrency limit; returns it or None"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        now = datetime.now()
+        cursor.execute("""
+            SELECT id, kind, payload, attempts, max_attempts FROM jobs
+            WHERE status = %s AND run_after <= %s
+            ORDER BY run_after, id LIMIT %s
+        """, (QUEUED, now, scan))
+        candidates = cursor.fetchall()
+        # End the snapshot, so a limited kind's running count is read after its lock is taken
+        conn.commit()
+        for job_id, kind, payload, attempts, max_attempts in candidates:
+            if kind in CONCURRENCY and not _under_limit(conn, cursor, kind):
+                conn.rollback()
+                continue
+            # Only one worker's UPDATE still sees the job queued
+            cursor.execute("""
+                UPDATE jobs SET status = %s, attempts = attempts + 1, locked_by = %s, locked_at = %s
+                WHERE id = %s AND status = %s
+            """, (RUNNING, worker_id, now, job_id, QUEUED))
+            claimed = cursor.rowcount
+            conn.commit()
+            if claimed:
+                return {'id': job_id, 'kind': kind, 'payload': json.loads(payload or '{}'),
+                        'attempts': attempts + 1, 'max_attempts': max_attempts}
+        return None
+    finally:
+        conn.close()
+
+def _finish(job_id, status, result=None, error=None, run_after=None):
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs SET status = %s, result = %s, error = %s, locked_by = NULL, locked_at = NULL,
+                            run_after = COALESCE(%s, run_after), finished_at = %s
+            WHERE id = %s
+        """, (status, None if result is None else json.dumps(result, default=str), error, run_after,
+              None if status == QUEUED else datetime.now(), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_job(job):
+    """Run a claimed job and record its outcome: succeeded, queued for a retry, or failed"""
+    try:
+        result = HANDLERS[job['kind']](**job['payload'])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"
+        if job['attempts'] < job['max_attempts']:
+            delay = RETRY_DELAY * 2 ** (job['attempts'] - 1)
+            _finish(job['id'], QUEUED, error=error, run_after=datetime.now() + timedelta(seconds=delay))
+        else:
+            _finish(job['id'], FAILED, error=error)
+        return False
+    _finish(job['id'], SUCCEEDED, result=result)
+    return True
+
+def requeue_stale(stale_seconds=STALE_SECONDS):
+    """Queue again the jobs of workers that died mid-run; those out of attempts fail; returns the count"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cutoff = datetime.now() - timedelta(seconds=stale_seconds)
+        cursor.execute("""
+            UPDATE jobs SET status = %s, error = %s, locked_by = NULL, locked_at = NULL, finished_at = %s
+            WHERE status = %s AND locked_at < %s AND attempts >= max_attempts
+        """, (FAILED, 'Worker lost while running the job', datetime.now(), RUNNING, cutoff))
+        count = cursor.rowcount
+        cursor.execute("""
+            UPDATE jobs SET status = %s, locked_by = NULL, locked_at = NULL
+            WHERE status = %s AND locked_at < %s
+        """, (QUEUED, RUNNING, cutoff))
+        count += cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return count
+
+def work(worker_id, stop, poll=POLL_SECONDS, burst=False):
+    """Claim and run jobs until stopped (or, in burst mode, until none is due), requeueing stale ones now and then"""
+    next_requeue = 0.0
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_requeue:
+                requeue_stale()
+                next_requeue = time.monotonic() + REQUEUE_SECONDS
+            job = claim(worker_id)
+            if job is None:
+                if burst:
+                    return
+                stop.wait(poll)
+                continue
+            run_job(job)
+        except Exception:
+            # A dropped connection or a locked database must not end the thread, or the queue stops
+            # draining; a job left running by a failed _finish is queued again once stale
+            log.exception("Job worker %s failed, retrying in %ss", worker_id, poll)
+            stop.wait(poll)
+
+def start_workers(threads=WORKER_THREADS, poll=POLL_SECONDS, burst=False, stop=None):
+    """Start worker threads in this process; returns (threads, stop event)"""
+    stop = stop or threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    pool = [threading.Thread(target=work, args=(f"{prefix}:{i}", stop, poll, burst), daemon=True,
+                             name=f"job-worker-{i}")
+            for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    return pool, stop
+
+def run_worker(threads=WORKER_THREADS, poll=POLL_SECONDS, burst=False):
+    """Run a worker pool in the foreground until interrupted (or drained, in burst mode)"""
+    pool, stop = start_workers(threads, poll, burst)
+    try:
+        while any(thread.is_alive() for thread in pool):
+            for thread in pool:
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in pool:
+            thread.join()
+
+def run_processes(processes, threads=WORKER_THREADS, poll=POLL_SECONDS, burst=False):
+    """Run worker pools in separate processes, each with its own connection pool"""
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=run_worker, args=(threads, poll, burst)) for _ in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.join()
+
+# Flask Integration
+_embedded = {'workers': None}
+_embedded_lock = threading.Lock()
+
+def _start_embedded_workers():
+    # Started on the first request rather than at import, so they run in the
+    # serving process (after any fork) and scripts importing app start none
+    if _embedded['workers'] is None:
+        with _embedded_lock:
+            if _embedded['workers'] is None:
+                _embedded['workers'] = start_workers(EMBEDDED_WORKERS)
+
+def stop_embedded_workers(timeout=None):
+    """Let the embedded workers finish their current job and exit, waiting up to timeout seconds in all
+
+    A job still running after that is cut short with the process and requeued once stale.
+    """
+    with _embedded_lock:
+        workers, _embedded['workers'] = _embedded['workers'], None
+    if workers is None:
+        return
+    pool, stop = workers
+    stop.set()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for thread in pool:
+        thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+def init_app(app):
+    if EMBEDDED_WORKERS:
+        app.before_request(_start_embedded_workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run job workers or inspect the job queue")
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker = commands.add_parser('worker', help="claim and run queued jobs")
+    worker.add_argument('--threads', type=int, default=WORKER_THREADS, help="jobs run at once per process")
+    worker.add_argument('--processes', type=int, default=1)
+    worker.add_argument('--poll', type=float, default=POLL_SECONDS, help="seconds to wait when the queue is empty")
+    worker.add_argument('--burst', action='store_true', help="exit once no job can be claimed")
+    listing = commands.add_parser('list', help="show the newest jobs")
+    listing.add_argument('--status', choices=(QUEUED, RUNNING, SUCCEEDED, FAILED))
+    listing.add_argument('--limit', type=int, default=20)
+    commands.add_parser('retry', help="queue a failed job again").add_argument('job_id', type=int)
+    add = commands.add_parser('enqueue', help="queue a job by hand")
+    add.add_argument('kind', choices=sorted(HANDLERS))
+    add.add_argument('payload', nargs='?', default='{}', help="JSON keyword arguments for the handler")
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        print(f"👷 Starting {args.processes} x {args.threads} job worker(s) for: {', '.join(sorted(HANDLERS))}")
+        if args.processes > 1:
+            run_processes(args.processes, args.threads, args.poll, args.burst)
+        else:
+            run_worker(args.threads, args.poll, args.burst)
+    elif args.command == 'list':
+        print(f"📋 {queue_stats()}")
+        for job in recent_jobs(args.status, args.limit):
+            print(f"  #{job['id']:<6} {job['kind']:<20} {job['status']:<10} attempt {job['attempts']}/{job['max_attempts']}"
+                  f"  {job['error'].splitlines()[0] if job['error'] else job['result'] or ''}")
+    elif args.command == 'retry':
+        retry(args.job_id)
+        print(f"🔁 Job {args.job_id} queued again")
+    else:
+        print(f"📨 Queued job {enqueue(args.kind, json.loads(args.payload))}")
@@ -1,237 +1,1082 @@
 
-from db_config import connect_db
+from db_config import get_db, get_read_db
 from datetime import datetime, timedelta
+import mysql.connector
+import os
+import random
+import re
+import time
+import availability
+import cache
+import db_config
+import metrics
+import overdue
+import records
+import search_index
+import stats
+import versions
 
-# Book Functions
-def get_all_books():
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT b.*, 
-               CASE WHEN br.id IS NOT NULL THEN 'Borrowed' ELSE 'Available' END as status,
-               m.name as borrowed_by,
-               br.due_date
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+
+# Column projections: each reader selects only the columns its callers use
+DESCRIPTION_PREVIEW = 100
+BOOK_DETAIL_COLUMNS = "b.id, b.title, b.author, b.year, b.isbn, b.category, b.description, b.created_at, b.updated_at"
+# Listing pages show only the start of the description, so truncate it in SQL
+BOOK_SUMMARY_COLUMNS = f"b.id, b.title, b.author, b.year, b.isbn, b.category, SUBSTR(b.description, 1, {DESCRIPTION_PREVIEW}) as description"
+MEMBER_DETAIL_COLUMNS = "m.id, m.name, m.email, m.phone, m.address, m.join_date, m.created_at, m.updated_at"
+MEMBER_SUMMARY_COLUMNS = "m.id, m.name, m.email, m.phone, m.address, m.join_date"
+BORROWING_COLUMNS = "br.id, br.book_id, br.member_id, br.borrow_date, br.due_date, br.returned_date"
+
+# Listing queries shared with the async data-access layer (library_db_async.py).
+# Availability comes from the per-title copy counters on books and the open loans
+# from active_loans (see availability.py), so neither scans the borrowing history.
+BOOK_LISTING_TEMPLATE = """
+        SELECT {columns}, 
+               CASE WHEN b.available_copies > 0 THEN 'Available'
+                    WHEN b.total_copies = 0 THEN 'Unavailable' ELSE 'Borrowed' END as status,
+               b.available_copies, b.total_copies
         FROM books b 
-        LEFT JOIN borrowings br ON b.id = br.book_id AND br.returned_date IS NULL
-        LEFT JOIN members m ON br.member_id = m.id
-    """)
-    result = cursor.fetchall()
-    conn.close()
-    return result
-
-def add_book(title, author, year, isbn, category, description):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO books (title, author, year, isbn, category, description) 
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (title, author, year, isbn, category, description))
-    conn.commit()
-    conn.close()
+"""
+
+MEMBER_LISTING_TEMPLATE = """
+        SELECT {columns}, 
+               COUNT(al.borrowing_id) as books_borrowed
+        FROM members m 
+        LEFT JOIN active_loans al ON m.id = al.member_id
+"""
+
+def book_listing_sql(columns=BOOK_SUMMARY_COLUMNS):
+    return BOOK_LISTING_TEMPLATE.format(columns=columns)
+
+def member_listing_sql(columns=MEMBER_SUMMARY_COLUMNS):
+    return MEMBER_LISTING_TEMPLATE.format(columns=columns)
+
+BOOK_LISTING_SQL = book_listing_sql()
+MEMBER_LISTING_SQL = member_listing_sql()
+
+BORROWING_LISTING_SQL = f"""
+        SELECT {BORROWING_COLUMNS}, b.title, b.author, m.name as member_name,
+               CASE WHEN br.returned_date IS NULL THEN 'Active' ELSE 'Returned' END as status,
+               CASE WHEN br.due_date < CURDATE() AND br.returned_date IS NULL THEN 'Overdue' ELSE 'Normal' END as overdue_status
+        FROM borrowings br
+        JOIN books b ON br.book_id = b.id
+        JOIN members m ON br.member_id = m.id
+"""
+
+ACTIVE_BORROWING_SQL = BORROWING_LISTING_SQL + """        JOIN active_loans al ON al.borrowing_id = br.id
+"""
+
+# Returned loans, hot (borrowings) and archived (borrowings_archive, see archive.py),
+# newest first. Each branch is limited before the union so both read their primary key.
+HISTORY_SQL = """
+        SELECT h.*, b.title, b.author, m.name as member_name,
+               'Returned' as status, 'Normal' as overdue_status
+        FROM (
+            SELECT * FROM (SELECT id, book_id, member_id, borrow_date, due_date, returned_date, 0 as archived
+                           FROM borrowings WHERE returned_date IS NOT NULL AND id < %s ORDER BY id DESC LIMIT %s) hot
+            UNION ALL
+            SELECT * FROM (SELECT id, book_id, member_id, borrow_date, due_date, returned_date, 1 as archived
+                           FROM borrowings_archive WHERE id < %s ORDER BY id DESC LIMIT %s) archived
+        ) h
+        JOIN books b ON h.book_id = b.id
+        JOIN members m ON h.member_id = m.id
+        ORDER BY h.id DESC LIMIT %s
+"""
+# Cursor for the first history page: larger than any borrowing id
+HISTORY_START = 2 ** 31
+
+def history_params(after, limit):
+    before = after or HISTORY_START
+    return (before, limit + 1, before, limit + 1, limit + 1)
+
+# Copies of one title with the member holding each copy on loan
+BOOK_COPIES_SQL = """
+        SELECT c.id, c.barcode, c.state, m.name as borrowed_by, al.due_date
+        FROM book_copies c
+        LEFT JOIN active_loans al ON al.copy_id = c.id
+        LEFT JOIN members m ON al.member_id = m.id
+        WHERE c.book_id = %s
+        ORDER BY c.id
+"""
+
+# Overdue loans come from the precomputed queue maintained by overdue.py
+OVERDUE_SQL = """
+        SELECT q.borrowing_id as id, q.book_id, q.member_id, q.due_date, q.days_late, q.fine,
+               br.borrow_date, b.title, b.author, m.name as member_name, m.email, m.phone
+        FROM overdue_queue q
+        JOIN borrowings br ON q.borrowing_id = br.id
+        JOIN books b ON q.book_id = b.id
+        JOIN members m ON q.member_id = m.id
+"""
+OVERDUE_ORDER = " ORDER BY q.due_date, q.borrowing_id"
+
+def _page_size(limit):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE"""
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+SEARCH_LIMIT = 100
+# Type-ahead lookups for the /borrow form: a few rows each, cached briefly since every keystroke asks again
+LOOKUP_LIMIT = 20
+LOOKUP_CACHE_TTL = float(os.getenv('LOOKUP_CACHE_TTL', '30'))
+FT_MIN_TOKEN_SIZE = int(os.getenv('MYSQL_FT_MIN_TOKEN_SIZE', '3'))
+# InnoDB's default full-text stopwords; a required (+) stopword would match nothing
+FT_STOPWORDS = {
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how',
+    'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what',
+    'when', 'where', 'who', 'will', 'with', 'und', 'www'
+}
+# Hyphenated or long digit runs are ISBN lookups; short numbers like "1984" stay title searches
+ISBN_QUERY_RE = re.compile(r'^[0-9][0-9Xx ]*-[0-9Xx\- ]*$|^[0-9]{9,}[0-9Xx]?$')
+
+def _fulltext_query(query):
+    """Build a BOOLEAN MODE query requiring every word, with the last word matched as a prefix"""
+    if db_config.DB_BACKEND == 'sqlite':
+        return _fts5_query(query)
+    words = [word for word in search_index.tokenize(query)
+             if len(word) >= FT_MIN_TOKEN_SIZE and word not in FT_STOPWORDS]
+    if not words:
+        return None
+    return ' '.join(f'+{word}*' for word in words)
+
+def _fts5_query(query):
+    """The same query for SQLite FTS5: every word required, each matched as a prefix"""
+    words = search_index.tokenize(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def _open_loan_counts(cursor, column, value):
+    """Count the open and overdue loans that a cascading delete on `column` will remove"""
+    cursor.execute(f"""
+        SELECT COUNT(*) as active, COALESCE(SUM(due_date < CURDATE()), 0) as overdue
+        FROM active_loans WHERE {column} = %s
+    """, (value,))
+    row = cursor.fetchone()
+    return int(row[0]), int(row[1])
+
+def _keyset_page(rows, limit):
+    """Split a LIMIT n+1 result into the page and the cursor for the next one"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]['id']
+    return rows, None
+
+class BorrowingError(Exception):
+    """Raised when a loan cannot be created or closed"""
+
+class BookUnavailableError(BorrowingError):
+    """Raised when every copy of a book is out on loan"""
+
+class CopyError(Exception):
+    """Raised when copies cannot be added to or withdrawn from a title"""
 
+# MySQL errors worth retrying: chosen as deadlock victim, lock wait timeout
+RETRYABLE_ERRNOS = {1213, 1205}
+DUPLICATE_KEY_ERRNO = 1062
+FOREIGN_KEY_ERRNO = 1452
+TRANSACTION_RETRIES = int(os.getenv('DB_TRANSACTION_RETRIES', '3'))
+# Largest stack of items accepted by borrow_books/return_books
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '500'))
+transaction_stats = {'commits': 0, 'retries': 0}
+
+def run_transaction(work):
+    """Run work(cursor) in a short transaction, retrying deadlocks with jittered backoff"""
+    conn = get_db()
+    try:
+        for attempt in range(TRANSACTION_RETRIES + 1):
+            # Start from a fresh snapshot rather than one left open by earlier reads
+            conn.rollback()
+            cursor = conn.cursor()
+            try:
+                result = work(cursor)
+                conn.commit()
+                transaction_stats['commits'] += 1
+                return result
+            except mysql.connector.DatabaseError as e:
+                conn.rollback()
+                if e.errno not in RETRYABLE_ERRNOS or attempt == TRANSACTION_RETRIES:
+                    raise
+                transaction_stats['retries'] += 1
+                time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        conn.close()
+
+# Book Functions
+@metrics.timed
+def get_all_books(columns=BOOK_SUMMARY_COLUMNS):
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(book_listing_sql(columns))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_books_page(after=None, limit=DEFAULT_PAGE_SIZE, columns=BOOK_SUMMARY_COLUMNS):
+    """Return one page of books ordered by id, plus the cursor for the next page (None on the last page)"""
+    limit = _page_size(limit)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(book_listing_sql(columns) + "WHERE b.id > %s ORDER BY b.id LIMIT %s", (after or 0, limit + 1))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return _keyset_page(result, limit)
+
+def iter_books(after=None, batch_size=STREAM_BATCH_SIZE, columns=BOOK_SUMMARY_COLUMNS):
+    """Yield every book after the cursor, fetching one keyset batch at a time"""
+    while True:
+        books, after = get_books_page(after, batch_size, columns)
+        yield from books
+        if after is None:
+            return
+
+@metrics.timed
+def add_book(title, author, year, isbn, category, description, copies=1):
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO books (title, author, year, isbn, category, description, total_copies, available_copies) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (title, author, year, isbn, category, description, copies, copies))
+        book_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO book_copies (book_id, barcode) VALUES (%s, %s)",
+                           [(book_id, availability.barcode(book_id, n)) for n in range(1, copies + 1)])
+        stats.bump(cursor, total_books=1, total_copies=copies)
+        versions.bump(cursor, 'books')
+        conn.commit()
+    finally:
+        conn.close()
+    cache.invalidate(f'book:{book_id}', 'categories')
+    search_index.books.add({'id': book_id, 'title': title, 'author': author, 'category': category, 'isbn': isbn})
+    return book_id
+
+# Cached readers stay on the primary: a lagging replica must not refill the cache after an invalidation
+@metrics.timed
+@cache.cached(lambda book_id: f'book:{book_id}')
 def get_book_by_id(book_id):
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM books WHERE id=%s", (book_id,))
-    result = cursor.fetchone()
-    conn.close()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {BOOK_DETAIL_COLUMNS} FROM books b WHERE b.id=%s", (book_id,))
+        result = records.fetch_one(cursor)
+    finally:
+        conn.close()
     return result
 
+@metrics.timed
 def update_book(book_id, title, author, year, isbn, category, description):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE books SET title=%s, author=%s, year=%s, isbn=%s, category=%s, description=%s 
-        WHERE id=%s
-    """, (title, author, year, isbn, category, description, book_id))
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE books SET title=%s, author=%s, year=%s, isbn=%s, category=%s, description=%s 
+            WHERE id=%s
+        """, (title, author, year, isbn, category, description, book_id))
+        versions.bump(cursor, 'books')
+        conn.commit()
+    finally:
+        conn.close()
+    cache.invalidate(f'book:{book_id}', 'categories')
+    search_index.books.add({'id': book_id, 'title': title, 'author': author, 'category': category, 'isbn': isbn})
 
+@metrics.timed
 def delete_book(book_id):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM books WHERE id=%s", (book_id,))
-    conn.commit()
-    conn.close()
-
-def search_books(query):
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT b.*, 
-               CASE WHEN br.id IS NOT NULL THEN 'Borrowed' ELSE 'Available' END as status,
-               m.name as borrowed_by
-        FROM books b 
-        LEFT JOIN borrowings br ON b.id = br.book_id AND br.returned_date IS NULL
-        LEFT JOIN members m ON br.member_id = m.id
-        WHERE b.title LIKE %s OR b.author LIKE %s OR b.category LIKE %s
-    """, (f'%{query}%', f'%{query}%', f'%{query}%'))
-    result = cursor.fetchall()
-    conn.close()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        active, overdue = _open_loan_counts(cursor, 'book_id', book_id)
+        cursor.execute("SELECT total_copies FROM books WHERE id=%s", (book_id,))
+        row = cursor.fetchone()
+        cursor.execute("DELETE FROM books WHERE id=%s", (book_id,))
+        if cursor.rowcount:
+            stats.bump(cursor, total_books=-1, total_copies=-row[0], books_borrowed=-active, overdue_books=-overdue)
+            versions.bump(cursor, 'books', 'borrowings')
+        conn.commit()
+    finally:
+        conn.close()
+    cache.invalidate(f'book:{book_id}', 'categories')
+    search_index.books.remove(book_id)
+
+@metrics.timed
+def get_book_copies(book_id):
+    """Every copy of a title with its state and, when on loan, the borrower and due date"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BOOK_COPIES_SQL, (book_id,))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def add_copies(book_id, count=1):
+    """Add count new copies to a title; returns their barcodes"""
+    def work(cursor):
+        cursor.execute("SELECT id FROM books WHERE id = %s FOR UPDATE", (book_id,))
+        if cursor.fetchone() is None:
+            raise CopyError(f"Book {book_id} does not exist")
+        # Barcodes keep numbering after withdrawn copies, which stay on record
+        cursor.execute("SELECT COUNT(*) FROM book_copies WHERE book_id = %s", (book_id,))
+        first = cursor.fetchone()[0] + 1
+        barcodes = [availability.barcode(book_id, n) for n in range(first, first + count)]
+        cursor.executemany("INSERT INTO book_copies (book_id, barcode) VALUES (%s, %s)",
+                           [(book_id, code) for code in barcodes])
+        cursor.execute("""
+            UPDATE books SET total_copies = total_copies + %s, available_copies = available_copies + %s
+            WHERE id = %s
+        """, (count, count, book_id))
+        stats.bump(cursor, total_copies=count)
+        versions.bump(cursor, 'books')
+        return barcodes
+
+    if count < 1:
+        raise CopyError("Add at least one copy")
+    return run_transaction(work)
+
+@metrics.timed
+def withdraw_copy(copy_id):
+    """Take an available copy out of circulation; its loan history stays"""
+    def work(cursor):
+        cursor.execute("SELECT book_id, state FROM book_copies WHERE id = %s", (copy_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise CopyError(f"Copy {copy_id} does not exist")
+        # Claim the copy and the counter together so a concurrent borrow cannot take it
+        cursor.execute("UPDATE books SET available_copies = available_copies - 1, total_copies = total_copies - 1 "
+                       "WHERE id = %s AND available_copies > 0", (row[0],))
+        cursor.execute("UPDATE book_copies SET state = 'withdrawn' WHERE id = %s AND state = 'available'", (copy_id,))
+        if cursor.rowcount == 0:
+            raise CopyError(f"Copy {copy_id} is {row[1].replace('_', ' ')}, only available copies can be withdrawn")
+        stats.bump(cursor, total_copies=-1)
+        versions.bump(cursor, 'books')
+        return row[0]
+
+    return run_transaction(work)
+
+def book_search_statement(query, limit=SEARCH_LIMIT, columns=BOOK_SUMMARY_COLUMNS):
+    """Pick the book search strategy for a query and return its (sql, params)"""
+    query = query.strip()
+    listing_sql = book_listing_sql(columns)
+    fulltext_query = _fulltext_query(query)
+    if ISBN_QUERY_RE.match(query):
+        return listing_sql + "WHERE b.isbn LIKE %s ORDER BY b.isbn LIMIT %s", (f'{query}%', limit)
+    if fulltext_query and db_config.DB_BACKEND == 'sqlite':
+        return listing_sql + """
+            JOIN books_fts ON books_fts.rowid = b.id
+            WHERE books_fts MATCH %s ORDER BY books_fts.rank LIMIT %s
+        """, (fulltext_query, limit)
+    if fulltext_query:
+        return listing_sql + """
+            WHERE MATCH(b.title, b.author, b.category, b.isbn, b.description) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY MATCH(b.title, b.author, b.category, b.isbn, b.description) AGAINST (%s IN BOOLEAN MODE) DESC
+            LIMIT %s
+        """, (fulltext_query, fulltext_query, limit)
+    # Too short for the full-text index: fall back to an anchored title prefix
+    return listing_sql + "WHERE b.title LIKE %s ORDER BY b.title LIMIT %s", (f'{query}%', limit)
+
+@metrics.timed
+def search_books(query, limit=SEARCH_LIMIT, columns=BOOK_SUMMARY_COLUMNS):
+    """Relevance-ranked search over title, author, category, isbn and description"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(*book_search_statement(query, limit, columns))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
     return result
 
+INDEXED_BOOK_COLUMNS = "b.id, b.title, b.author, b.category, b.isbn"
+
+def ensure_search_index():
+    """(Re)build the in-process title index when it is missing or due for a refresh"""
+    if search_index.books.is_stale():
+        search_index.books.build(iter_books(columns=INDEXED_BOOK_COLUMNS))
+
+@metrics.timed
+def autocomplete_books(query, limit=10):
+    """Title suggestions, served from the in-process index when it is enabled"""
+    if search_index.ENABLED:
+        ensure_search_index()
+        return search_index.books.complete(query, limit)
+    return [{'id': book['id'], 'title': book['title'], 'author': book['author']}
+            for book in search_books(query, limit, columns=INDEXED_BOOK_COLUMNS)]
+
 # Member Functions
-def get_all_members():
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT m.*, 
-               COUNT(br.id) as books_borrowed
-        FROM members m 
-        LEFT JOIN borrowings br ON m.id = br.member_id AND br.returned_date IS NULL
-        GROUP BY m.id
-    """)
-    result = cursor.fetchall()
-    conn.close()
+@metrics.timed
+def get_all_members(columns=MEMBER_SUMMARY_COLUMNS):
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(member_listing_sql(columns) + "GROUP BY m.id")
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
     return result
 
+@metrics.timed
+def get_member_choices():
+    """id, name and email of every member, for the benchmarks"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, email FROM members ORDER BY name")
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_members_page(after=None, limit=DEFAULT_PAGE_SIZE, columns=MEMBER_SUMMARY_COLUMNS):
+    """Return one page of members ordered by id, plus the cursor for the next page (None on the last page)"""
+    limit = _page_size(limit)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(member_listing_sql(columns) + "WHERE m.id > %s GROUP BY m.id ORDER BY m.id LIMIT %s",
+                       (after or 0, limit + 1))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return _keyset_page(result, limit)
+
+def iter_members(after=None, batch_size=STREAM_BATCH_SIZE, columns=MEMBER_SUMMARY_COLUMNS):
+    """Yield every member after the cursor, fetching one keyset batch at a time"""
+    while True:
+        members, after = get_members_page(after, batch_size, columns)
+        yield from members
+        if after is None:
+            return
+
+@metrics.timed
 def add_member(name, email, phone, address):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO members (name, email, phone, address, join_date) 
-        VALUES (%s, %s, %s, %s, %s)
-    """, (name, email, phone, address, datetime.now().date()))
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO members (name, email, phone, address, join_date) 
+            VALUES (%s, %s, %s, %s, %s)
+        """, (name, email, phone, address, datetime.now().date()))
+        stats.bump(cursor, total_members=1)
+        versions.bump(cursor, 'members')
+        conn.commit()
+    finally:
+        conn.close()
 
+@metrics.timed
+@cache.cached(lambda member_id: f'member:{member_id}')
 def get_member_by_id(member_id):
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM members WHERE id=%s", (member_id,))
-    result = cursor.fetchone()
-    conn.close()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {MEMBER_DETAIL_COLUMNS} FROM members m WHERE m.id=%s", (member_id,))
+        result = records.fetch_one(cursor)
+    finally:
+        conn.close()
     return result
 
+@metrics.timed
 def update_member(member_id, name, email, phone, address):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE members SET name=%s, email=%s, phone=%s, address=%s 
-        WHERE id=%s
-    """, (name, email, phone, address, member_id))
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE members SET name=%s, email=%s, phone=%s, address=%s 
+            WHERE id=%s
+        """, (name, email, phone, address, member_id))
+        versions.bump(cursor, 'members')
+        conn.commit()
+    finally:
+        conn.close()
+    cache.invalidate(f'member:{member_id}')
 
+@metrics.timed
 def delete_member(member_id):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM members WHERE id=%s", (member_id,))
-    conn.commit()
-    conn.close()
-
-def search_members(query):
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT * FROM members 
-        WHERE name LIKE %s OR email LIKE %s OR phone LIKE %s
-    """, (f'%{query}%', f'%{query}%', f'%{query}%'))
-    result = cursor.fetchall()
-    conn.close()
+    """Delete a member and their loans, putting the copies they still had out back on the shelf"""
+    def work(cursor):
+        cursor.execute("""
+            SELECT book_id, copy_id, due_date < CURDATE() FROM borrowings
+            WHERE member_id = %s AND returned_date IS NULL
+            FOR UPDATE
+        """, (member_id,))
+        loans = cursor.fetchall()
+        if loans:
+            copies_by_book = {}
+            for book_id, copy_id, _ in loans:
+                copies_by_book.setdefault(book_id, []).append(copy_id)
+            _shelve_copies(cursor, copies_by_book)
+        cursor.execute("DELETE FROM members WHERE id=%s", (member_id,))
+        if cursor.rowcount:
+            stats.bump(cursor, total_members=-1, books_borrowed=-len(loans),
+                       overdue_books=-sum(int(loan[2]) for loan in loans))
+            versions.bump(cursor, 'books', 'members', 'borrowings')
+
+    run_transaction(work)
+    cache.invalidate(f'member:{member_id}')
+
+def member_search_statement(query, limit=SEARCH_LIMIT, columns=MEMBER_SUMMARY_COLUMNS):
+    """Pick the member search strategy for a query and return its (sql, params)"""
+    query = query.strip()
+    fulltext_query = _fulltext_query(query)
+    if fulltext_query and db_config.DB_BACKEND == 'sqlite':
+        return f"""
+            SELECT {columns} FROM members m
+            JOIN members_fts ON members_fts.rowid = m.id
+            WHERE members_fts MATCH %s ORDER BY members_fts.rank LIMIT %s
+        """, (fulltext_query, limit)
+    if fulltext_query:
+        return f"""
+            SELECT {columns} FROM members m 
+            WHERE MATCH(m.name, m.email, m.phone) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY MATCH(m.name, m.email, m.phone) AGAINST (%s IN BOOLEAN MODE) DESC
+            LIMIT %s
+        """, (fulltext_query, fulltext_query, limit)
+    return f"""
+        SELECT {columns} FROM members m 
+        WHERE m.name LIKE %s OR m.email LIKE %s
+        ORDER BY m.name
+        LIMIT %s
+    """, (f'{query}%', f'{query}%', limit)
+
+@metrics.timed
+def search_members(query, limit=SEARCH_LIMIT, columns=MEMBER_SUMMARY_COLUMNS):
+    """Relevance-ranked search over member name, email and phone"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(*member_search_statement(query, limit, columns))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+# Lookup Functions: anchored prefixes on the title and name indexes, never a scan.
+# Their cache entries only expire, so unlike the readers above they may use a replica;
+# borrow_book still checks availability itself.
+def _prefix_pattern(query):
+    """LIKE pattern matching values that start with query; '!' escapes the wildcards on both backends"""
+    return query.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+
+def _lookup_key(kind):
+    return lambda query, limit=LOOKUP_LIMIT: f'lookup:{kind}:{limit}:{query.strip().lower()}'
+
+@metrics.timed
+@cache.cached(_lookup_key('books'), ttl=LOOKUP_CACHE_TTL)
+def lookup_available_books(query, limit=LOOKUP_LIMIT):
+    """Books with a copy on the shelf whose title starts with query, in title order"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT b.id, b.title, b.author, b.available_copies FROM books b
+            WHERE b.title LIKE %s ESCAPE '!' AND b.available_copies > 0
+            ORDER BY b.title LIMIT %s
+        """, (_prefix_pattern(query.strip()), limit))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+@cache.cached(_lookup_key('members'), ttl=LOOKUP_CACHE_TTL)
+def lookup_members(query, limit=LOOKUP_LIMIT):
+    """Members whose name or email starts with query, in name order"""
+    pattern = _prefix_pattern(query.strip())
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        # A UNION of two index ranges rather than an OR, which would scan members
+        cursor.execute("""
+            SELECT * FROM (
+                SELECT id, name, email FROM members WHERE name LIKE %s ESCAPE '!' ORDER BY name LIMIT %s
+            ) by_name
+            UNION
+            SELECT * FROM (
+                SELECT id, name, email FROM members WHERE email LIKE %s ESCAPE '!' ORDER BY email LIMIT %s
+            ) by_email
+            ORDER BY name, id LIMIT %s
+        """, (pattern, limit, pattern, limit, limit))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
     return result
 
 # Borrowing Functions
+def _check_loan_days(days):
+    # A loan opened already past due is not counted in overdue_books, yet its return subtracts it
+    if days < 1:
+        raise BorrowingError(f"A loan must last at least one day, not {days}")
+
+@metrics.timed
 def borrow_book(book_id, member_id, days=14):
-    conn = connect_db()
-    cursor = conn.cursor()
-    due_date = datetime.now().date() + timedelta(days=days)
-    cursor.execute("""
-        INSERT INTO borrowings (book_id, member_id, borrow_date, due_date) 
-        VALUES (%s, %s, %s, %s)
-    """, (book_id, member_id, datetime.now().date(), due_date))
-    conn.commit()
-    conn.close()
+    """Lend any free copy of a book, never the same copy twice; returns the borrowing id"""
+    _check_loan_days(days)
+    today = datetime.now().date()
+    due_date = today + timedelta(days=days)
 
+    def work(cursor):
+        # Claim a copy through the counter: the conditional decrement locks the book row,
+        # so concurrent checkouts of the same title queue up here and none overdraws it
+        cursor.execute("UPDATE books SET available_copies = available_copies - 1 "
+                       "WHERE id = %s AND available_copies > 0", (book_id,))
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT id FROM books WHERE id = %s", (book_id,))
+            if cursor.fetchone() is None:
+                raise BorrowingError(f"Book {book_id} does not exist")
+            raise BookUnavailableError(f"No copy of book {book_id} is available")
+        cursor.execute("""
+            SELECT id FROM book_copies
+            WHERE book_id = %s AND state = 'available'
+            ORDER BY id LIMIT 1 FOR UPDATE
+        """, (book_id,))
+        row = cursor.fetchone()
+        if row is None:
+            # Counter ahead of the copies; `python availability.py repair` fixes it
+            raise BookUnavailableError(f"No copy of book {book_id} is available")
+        copy_id = row[0]
+        cursor.execute("UPDATE book_copies SET state = 'on_loan' WHERE id = %s", (copy_id,))
+        try:
+            cursor.execute("""
+                INSERT INTO borrowings (book_id, copy_id, member_id, borrow_date, due_date) 
+                VALUES (%s, %s, %s, %s, %s)
+            """, (book_id, copy_id, member_id, today, due_date))
+            borrowing_id = cursor.lastrowid
+            availability.activate(cursor, [copy_id])
+        except mysql.connector.IntegrityError as e:
+            # The unique active-loan keys are the backstop for the copy claim above
+            if e.errno == DUPLICATE_KEY_ERRNO:
+                raise BookUnavailableError(f"Copy {copy_id} of book {book_id} is already borrowed") from e
+            if e.errno == FOREIGN_KEY_ERRNO:
+                raise BorrowingError(f"Member {member_id} does not exist") from e
+            raise
+        stats.bump(cursor, books_borrowed=1)
+        versions.bump(cursor, 'books', 'borrowings')
+        return borrowing_id
+
+    return run_transaction(work)
+
+@metrics.timed
 def return_book(book_id, member_id):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE borrowings SET returned_date = %s 
-        WHERE book_id = %s AND member_id = %s AND returned_date IS NULL
-    """, (datetime.now().date(), book_id, member_id))
-    conn.commit()
-    conn.close()
+    """Close the member's open loan of a book; returns the number of loans closed"""
+    def work(cursor):
+        cursor.execute("""
+            SELECT id, copy_id, due_date < CURDATE() FROM borrowings
+            WHERE book_id = %s AND member_id = %s AND returned_date IS NULL
+            FOR UPDATE
+        """, (book_id, member_id))
+        loans = cursor.fetchall()
+        if not loans:
+            return 0
+        ids = [loan[0] for loan in loans]
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f"UPDATE borrowings SET returned_date = %s WHERE id IN ({placeholders})",
+                       [datetime.now().date()] + ids)
+        _shelve_copies(cursor, {book_id: [loan[1] for loan in loans]})
+        availability.deactivate(cursor, ids)
+        overdue.dequeue(cursor, ids)
+        stats.bump(cursor, books_borrowed=-len(ids), overdue_books=-sum(int(loan[2]) for loan in loans))
+        versions.bump(cursor, 'books', 'borrowings')
+        return len(ids)
+
+    return run_transaction(work)
+
+def _shelve_copies(cursor, copies_by_book):
+    """Put returned copies back on the shelf and raise their titles' available counters"""
+    copy_ids = [copy_id for copy_ids in copies_by_book.values() for copy_id in copy_ids]
+    placeholders = ', '.join(['%s'] * len(copy_ids))
+    cursor.execute(f"UPDATE book_copies SET state = 'available' WHERE id IN ({placeholders})", copy_ids)
+    # In id order, the order borrow_books locks titles in
+    cursor.executemany("UPDATE books SET available_copies = available_copies + %s WHERE id = %s",
+                       [(len(copy_ids), book_id) for book_id, copy_ids in sorted(copies_by_book.items())])
+
+def _batch_pairs(items):
+    """Normalise (book_id, member_id) pairs for the batch operations"""
+    pairs = [(int(book_id), int(member_id)) for book_id, member_id in items]
+    if len(pairs) > MAX_BATCH_SIZE:
+        raise BorrowingError(f"At most {MAX_BATCH_SIZE} items per batch")
+    return pairs
+
+@metrics.timed
+def borrow_books(items, days=14):
+    """Open loans for many (book_id, member_id) pairs in one transaction; returns a result per item"""
+    _check_loan_days(days)
+    pairs = _batch_pairs(items)
+    if not pairs:
+        return []
+    today = datetime.now().date()
+    due_date = today + timedelta(days=days)
+    book_ids = sorted({book_id for book_id, _ in pairs})
+    member_ids = sorted({member_id for _, member_id in pairs})
+    book_marks = ', '.join(['%s'] * len(book_ids))
+    member_marks = ', '.join(['%s'] * len(member_ids))
+
+    def work(cursor):
+        # Lock every requested book in id order, the same order concurrent batches use
+        cursor.execute(f"SELECT id FROM books WHERE id IN ({book_marks}) ORDER BY id FOR UPDATE", book_ids)
+        known_books = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f"SELECT id FROM members WHERE id IN ({member_marks})", member_ids)
+        known_members = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f"""
+            SELECT book_id, id FROM book_copies
+            WHERE book_id IN ({book_marks}) AND state = 'available'
+            ORDER BY id FOR UPDATE
+        """, book_ids)
+        free = {}
+        for book_id, copy_id in cursor.fetchall():
+            free.setdefault(book_id, []).append(copy_id)
 
+        results = []
+        rows = []
+        taken = {}
+        for book_id, member_id in pairs:
+            result = {'book_id': book_id, 'member_id': member_id, 'status': 'borrowed', 'error': None}
+            if book_id not in known_books:
+                result.update(status='error', error=f"Book {book_id} does not exist")
+            elif member_id not in known_members:
+                result.update(status='error', error=f"Member {member_id} does not exist")
+            elif not free.get(book_id):
+                result.update(status='unavailable', error=f"No copy of book {book_id} is available")
+            else:
+                copy_id = free[book_id].pop(0)
+                taken.setdefault(book_id, []).append(copy_id)
+                rows.append((book_id, copy_id, member_id, today, due_date))
+            results.append(result)
+        if rows:
+            copy_ids = [row[1] for row in rows]
+            placeholders = ', '.join(['%s'] * len(copy_ids))
+            cursor.execute(f"UPDATE book_copies SET state = 'on_loan' WHERE id IN ({placeholders})", copy_ids)
+            cursor.executemany("UPDATE books SET available_copies = available_copies - %s WHERE id = %s",
+                               [(len(copies), book_id) for book_id, copies in sorted(taken.items())])
+            # mysql.connector rewrites this into a single multi-row INSERT
+            cursor.executemany("""
+                INSERT INTO borrowings (book_id, copy_id, member_id, borrow_date, due_date)
+                VALUES (%s, %s, %s, %s, %s)
+            """, rows)
+            availability.activate(cursor, copy_ids)
+            stats.bump(cursor, books_borrowed=len(rows))
+            versions.bump(cursor, 'books', 'borrowings')
+        return results
+
+    return run_transaction(work)
+
+@metrics.timed
+def return_books(items):
+    """Close the open loans for many (book_id, member_id) pairs in one transaction; returns a result per item"""
+    pairs = _batch_pairs(items)
+    if not pairs:
+        return []
+    book_ids = sorted({book_id for book_id, _ in pairs})
+    book_marks = ', '.join(['%s'] * len(book_ids))
+
+    def work(cursor):
+        cursor.execute(f"""
+            SELECT id, book_id, copy_id, member_id, due_date < CURDATE() FROM borrowings
+            WHERE book_id IN ({book_marks}) AND returned_date IS NULL
+            FOR UPDATE
+        """, book_ids)
+        open_loans = {}
+        for loan_id, book_id, copy_id, member_id, late in cursor.fetchall():
+            open_loans.setdefault((book_id, member_id), []).append((loan_id, copy_id, int(late)))
+
+        results = []
+        loan_ids = []
+        returned = {}
+        overdue_count = 0
+        for book_id, member_id in pairs:
+            loans = open_loans.pop((book_id, member_id), None)
+            if loans:
+                loan_ids.extend(loan_id for loan_id, _, _ in loans)
+                returned.setdefault(book_id, []).extend(copy_id for _, copy_id, _ in loans)
+                overdue_count += sum(late for _, _, late in loans)
+                results.append({'book_id': book_id, 'member_id': member_id, 'status': 'returned', 'error': None})
+            else:
+                results.append({'book_id': book_id, 'member_id': member_id, 'status': 'not_borrowed',
+                                'error': f"No open loan of book {book_id} for member {member_id}"})
+        if loan_ids:
+            placeholders = ', '.join(['%s'] * len(loan_ids))
+            cursor.execute(f"UPDATE borrowings SET returned_date = %s WHERE id IN ({placeholders})",
+                           [datetime.now().date()] + loan_ids)
+            _shelve_copies(cursor, returned)
+            availability.deactivate(cursor, loan_ids)
+            overdue.dequeue(cursor, loan_ids)
+            stats.bump(cursor, books_borrowed=-len(loan_ids), overdue_books=-overdue_count)
+            versions.bump(cursor, 'books', 'borrowings')
+        return results
+
+    return run_transaction(work)
+
+@metrics.timed
+def get_available_books(limit=None):
+    """Books with at least one copy on the shelf, for the benchmarks and the query-plan check"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        query = """
+            SELECT b.id, b.title, b.author, b.available_copies FROM books b
+            WHERE b.available_copies > 0
+            ORDER BY b.title
+        """
+        if limit:
+            cursor.execute(query + " LIMIT %s", (limit,))
+        else:
+            cursor.execute(query)
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
 def get_borrowings():
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT br.*, b.title, b.author, m.name as member_name,
-               CASE WHEN br.returned_date IS NULL THEN 'Active' ELSE 'Returned' END as status,
-               CASE WHEN br.due_date < CURDATE() AND br.returned_date IS NULL THEN 'Overdue' ELSE 'Normal' END as overdue_status
-        FROM borrowings br
-        JOIN books b ON br.book_id = b.id
-        JOIN members m ON br.member_id = m.id
-        ORDER BY br.borrow_date DESC
-    """)
-    result = cursor.fetchall()
-    conn.close()
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BORROWING_LISTING_SQL + "ORDER BY br.borrow_date DESC")
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
     return result
 
-def get_overdue_books():
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT br.*, b.title, b.author, m.name as member_name, m.email, m.phone
-        FROM borrowings br
-        JOIN books b ON br.book_id = b.id
-        JOIN members m ON br.member_id = m.id
-        WHERE br.due_date < CURDATE() AND br.returned_date IS NULL
-    """)
-    result = cursor.fetchall()
-    conn.close()
+@metrics.timed
+def get_active_borrowings():
+    """Open loans, soonest due first"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(ACTIVE_BORROWING_SQL + "ORDER BY al.due_date, al.borrowing_id")
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_borrowing_history(after=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of returned loans, newest first, across the hot and archive tables; returns (rows, next_cursor)"""
+    limit = _page_size(limit)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(HISTORY_SQL, history_params(after, limit))
+        rows = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return _keyset_page(rows, limit)
+
+@metrics.timed
+def get_recent_borrowings(limit=5):
+    """Most recent loans for the dashboard, read from the borrow_date index"""
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BORROWING_LISTING_SQL + "ORDER BY br.borrow_date DESC LIMIT %s", (limit,))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_overdue_books(limit=None):
+    overdue.ensure_fresh()
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        if limit:
+            cursor.execute(OVERDUE_SQL + OVERDUE_ORDER + " LIMIT %s", (limit,))
+        else:
+            cursor.execute(OVERDUE_SQL + OVERDUE_ORDER)
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+def parse_overdue_cursor(after):
+    """(due_date, borrowing_id) from a "<due_date>:<borrowing_id>" cursor; raises ValueError when malformed"""
+    due_date, _, borrowing_id = after.partition(':')
+    return datetime.strptime(due_date, '%Y-%m-%d').date(), int(borrowing_id)
+
+def overdue_page_statement(after=None, limit=DEFAULT_PAGE_SIZE):
+    """Keyset page of the overdue queue; `after` is the "<due_date>:<borrowing_id>" cursor of the previous page"""
+    limit = _page_size(limit)
+    if after:
+        due_date, borrowing_id = parse_overdue_cursor(after)
+        where = "WHERE q.due_date > %s OR (q.due_date = %s AND q.borrowing_id > %s)"
+        return OVERDUE_SQL + where + OVERDUE_ORDER + " LIMIT %s", (due_date, due_date, borrowing_id, limit + 1), limit
+    return OVERDUE_SQL + OVERDUE_ORDER + " LIMIT %s", (limit + 1,), limit
+
+def _overdue_page(rows, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, f"{rows[-1]['due_date'].isoformat()}:{rows[-1]['id']}"
+    return rows, None
+
+@metrics.timed
+def get_overdue_summary():
+    """Number of overdue loans and their outstanding fines"""
+    overdue.ensure_fresh()
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) as count, COALESCE(SUM(fine), 0) as fines FROM overdue_queue")
+        result = records.fetch_one(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_overdue_page(after=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of overdue loans, most overdue first; returns (rows, next_cursor)"""
+    overdue.ensure_fresh()
+    sql, params, limit = overdue_page_statement(after, limit)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return _overdue_page(rows, limit)
+
+# Report Functions: aggregated in SQL over the hot and archived loans
+REPORT_MONTHS = 12
+REPORT_LOANS_SQL = """
+        SELECT book_id, member_id, borrow_date, due_date, returned_date FROM borrowings
+        WHERE borrow_date BETWEEN %s AND %s
+        UNION ALL
+        SELECT book_id, member_id, borrow_date, due_date, returned_date FROM borrowings_archive
+        WHERE borrow_date BETWEEN %s AND %s
+"""
+
+def report_range(start=None, end=None):
+    """The (start, end) borrow dates of a report, defaulting to the last REPORT_MONTHS months"""
+    end = end or datetime.now().date()
+    if not start:
+        months = end.year * 12 + end.month - REPORT_MONTHS
+        start = end.replace(year=months // 12, month=months % 12 + 1, day=1)
+    return start, end
+
+@metrics.timed
+def get_loans_by_category_month(start=None, end=None):
+    """Loans per month and category between two borrow dates"""
+    start, end = report_range(start, end)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT DATE_FORMAT(l.borrow_date, %s) as month,
+                   COALESCE(NULLIF(b.category, ''), 'Uncategorized') as category,
+                   COUNT(*) as loans
+            FROM ({REPORT_LOANS_SQL}) l
+            JOIN books b ON b.id = l.book_id
+            GROUP BY month, COALESCE(NULLIF(b.category, ''), 'Uncategorized')
+            ORDER BY month, category
+        """, ('%Y-%m', start, end, start, end))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_top_borrowers(start=None, end=None, limit=10):
+    """Members with the most loans between two borrow dates, with how many of those ran late"""
+    start, end = report_range(start, end)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT m.id, m.name, m.email, t.loans, t.late
+            FROM (
+                SELECT l.member_id, COUNT(*) as loans,
+                       SUM(CASE WHEN COALESCE(l.returned_date, CURDATE()) > l.due_date THEN 1 ELSE 0 END) as late
+                FROM ({REPORT_LOANS_SQL}) l
+                GROUP BY l.member_id
+                ORDER BY loans DESC, l.member_id
+                LIMIT %s
+            ) t
+            JOIN members m ON m.id = t.member_id
+            ORDER BY t.loans DESC, m.id
+        """, (start, end, start, end, limit))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
+    return result
+
+@metrics.timed
+def get_top_books(start=None, end=None, limit=10):
+    """Most borrowed titles between two borrow dates"""
+    start, end = report_range(start, end)
+    conn = get_read_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT b.id, b.title, b.author, t.loans
+            FROM (
+                SELECT l.book_id, COUNT(*) as loans
+                FROM ({REPORT_LOANS_SQL}) l
+                GROUP BY l.book_id
+                ORDER BY loans DESC, l.book_id
+                LIMIT %s
+            ) t
+            JOIN books b ON b.id = t.book_id
+            ORDER BY t.loans DESC, b.id
+        """, (start, end, start, end, limit))
+        result = records.fetch_all(cursor)
+    finally:
+        conn.close()
     return result
 
 # Dashboard Functions
+@metrics.timed
 def get_dashboard_stats():
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Total books
-    cursor.execute("SELECT COUNT(*) as total_books FROM books")
-    total_books = cursor.fetchone()['total_books']
-    
-    # Total members
-    cursor.execute("SELECT COUNT(*) as total_members FROM members")
-    total_members = cursor.fetchone()['total_members']
-    
-    # Books borrowed
-    cursor.execute("SELECT COUNT(*) as books_borrowed FROM borrowings WHERE returned_date IS NULL")
-    books_borrowed = cursor.fetchone()['books_borrowed']
-    
-    # Overdue books
-    cursor.execute("SELECT COUNT(*) as overdue_books FROM borrowings WHERE due_date < CURDATE() AND returned_date IS NULL")
-    overdue_books = cursor.fetchone()['overdue_books']
-    
-    conn.close()
-    
+    """Dashboard counters from the incrementally maintained library_stats table"""
+    counters = stats.get_counters()
+    total_copies = counters.get('total_copies', 0)
+    books_borrowed = counters.get('books_borrowed', 0)
     return {
-        'total_books': total_books,
-        'total_members': total_members,
+        'total_books': counters.get('total_books', 0),
+        'total_copies': total_copies,
+        'total_members': counters.get('total_members', 0),
         'books_borrowed': books_borrowed,
-        'available_books': total_books - books_borrowed,
-        'overdue_books': overdue_books
+        'available_books': total_copies - books_borrowed,
+        'overdue_books': counters.get('overdue_books', 0)
     }
 
+@metrics.timed
+@cache.cached(lambda: 'categories')
 def get_categories():
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT DISTINCT category FROM books WHERE category IS NOT NULL AND category != ''")
-    result = cursor.fetchall()
-    conn.close()
-    return [row['category'] for row in result]
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT category FROM books WHERE category IS NOT NULL AND category != ''")
+        result = cursor.fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in result]
 
+@metrics.timed
 def check_isbn_exists(isbn, exclude_book_id=None):
-    """Check if ISBN already exists in the database"""
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
+    """Check if ISBN already exists in the database (on the primary, since it guards a write)"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
     
-    if exclude_book_id:
-        cursor.execute("SELECT id FROM books WHERE isbn = %s AND id != %s", (isbn, exclude_book_id))
-    else:
-        cursor.execute("SELECT id FROM books WHERE isbn = %s", (isbn,))
+        if exclude_book_id:
+            cursor.execute("SELECT id FROM books WHERE isbn = %s AND id != %s", (isbn, exclude_book_id))
+        else:
+            cursor.execute("SELECT id FROM books WHERE isbn = %s", (isbn,))
     
-    result = cursor.fetchone()
-    conn.close()
+        result = cursor.fetchone()
+    finally:
+        conn.close()
     return result is not None
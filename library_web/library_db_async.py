@@ -0,0 +1,168 @@
+# asyncio variant of the library_db API for the ASGI app (asgi_app.py).
+# Reads run natively on an aiomysql pool and share their SQL with library_db;
+# writes run the synchronous functions in a worker thread so the counter,
+# cache and search-index bookkeeping stays in one place.
+#
+# MySQL only. The native reads always go to the primary and never through the
+# read-through cache: they are never stale, but read replicas (MYSQL_REPLICA_HOSTS)
+# and CACHE_BACKEND take no load off them. Run app.py or gunicorn with
+# DB_BACKEND=sqlite, or to spread reads over replicas.
+import asyncio
+import functools
+import os
+import aiomysql
+import db_config
+import library_db
+import overdue
+import stats
+from library_db import (
+    BOOK_SUMMARY_COLUMNS, BOOK_DETAIL_COLUMNS, MEMBER_SUMMARY_COLUMNS, MEMBER_DETAIL_COLUMNS,
+    book_listing_sql, member_listing_sql, BOOK_COPIES_SQL, BORROWING_LISTING_SQL, ACTIVE_BORROWING_SQL, HISTORY_SQL, OVERDUE_SQL, OVERDUE_ORDER,
+    DEFAULT_PAGE_SIZE, SEARCH_LIMIT, _page_size, _keyset_page, _overdue_page, history_params, parse_overdue_cursor
+)
+
+if db_config.DB_BACKEND != 'mysql':
+    # The shared SQL is written for the configured backend, not for the aiomysql pool
+    raise RuntimeError(f"The ASGI app needs DB_BACKEND=mysql, not {db_config.DB_BACKEND!r}: "
+                       f"serve app.py or gunicorn -c gunicorn.conf.py wsgi:app instead")
+
+_pool = None
+
+async def init_pool():
+    global _pool
+    if _pool is None:
+        size = int(os.getenv('DB_POOL_SIZE', '5'))
+        _pool = await aiomysql.create_pool(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            port=int(os.getenv('MYSQL_PORT', '3306')),
+            user=os.getenv('MYSQL_USER', 'root'),
+            password=os.getenv('MYSQL_PASSWORD') or '',
+            db=os.getenv('MYSQL_DATABASE', 'library_db'),
+            minsize=1,
+            maxsize=size + int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '3600')),
+            autocommit=True
+        )
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+async def _fetchall(sql, params=None):
+    pool = await init_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            return list(await cursor.fetchall())
+
+async def _fetchone(sql, params=None):
+    rows = await _fetchall(sql, params)
+    return rows[0] if rows else None
+
+# Book Functions
+async def get_books_page(after=None, limit=DEFAULT_PAGE_SIZE, columns=BOOK_SUMMARY_COLUMNS):
+    limit = _page_size(limit)
+    rows = await _fetchall(book_listing_sql(columns) + "WHERE b.id > %s ORDER BY b.id LIMIT %s", (after or 0, limit + 1))
+    return _keyset_page(rows, limit)
+
+async def get_book_by_id(book_id):
+    return await _fetchone(f"SELECT {BOOK_DETAIL_COLUMNS} FROM books b WHERE b.id=%s", (book_id,))
+
+async def get_book_copies(book_id):
+    return await _fetchall(BOOK_COPIES_SQL, (book_id,))
+
+async def search_books(query, limit=SEARCH_LIMIT):
+    return await _fetchall(*library_db.book_search_statement(query, limit))
+
+# Member Functions
+async def get_members_page(after=None, limit=DEFAULT_PAGE_SIZE, columns=MEMBER_SUMMARY_COLUMNS):
+    limit = _page_size(limit)
+    rows = await _fetchall(member_listing_sql(columns) + "WHERE m.id > %s GROUP BY m.id ORDER BY m.id LIMIT %s",
+                           (after or 0, limit + 1))
+    return _keyset_page(rows, limit)
+
+async def get_member_by_id(member_id):
+    return await _fetchone(f"SELECT {MEMBER_DETAIL_COLUMNS} FROM members m WHERE m.id=%s", (member_id,))
+
+async def search_members(query, limit=SEARCH_LIMIT):
+    return await _fetchall(*library_db.member_search_statement(query, limit))
+
+# Borrowing Functions
+async def get_borrowings():
+    return await _fetchall(BORROWING_LISTING_SQL + "ORDER BY br.borrow_date DESC")
+
+async def get_active_borrowings():
+    return await _fetchall(ACTIVE_BORROWING_SQL + "ORDER BY al.due_date, al.borrowing_id")
+
+async def get_borrowing_history(after=None, limit=DEFAULT_PAGE_SIZE):
+    limit = _page_size(limit)
+    return _keyset_page(await _fetchall(HISTORY_SQL, history_params(after, limit)), limit)
+
+async def get_recent_borrowings(limit=5):
+    return await _fetchall(BORROWING_LISTING_SQL + "ORDER BY br.borrow_date DESC LIMIT %s", (limit,))
+
+async def _ensure_overdue_fresh():
+    if not overdue.checked_today():
+        await asyncio.to_thread(overdue.ensure_fresh)
+
+async def get_overdue_books(limit=None):
+    await _ensure_overdue_fresh()
+    if limit:
+        return await _fetchall(OVERDUE_SQL + OVERDUE_ORDER + " LIMIT %s", (limit,))
+    return await _fetchall(OVERDUE_SQL + OVERDUE_ORDER)
+
+async def get_overdue_summary():
+    await _ensure_overdue_fresh()
+    return await _fetchone("SELECT COUNT(*) as count, COALESCE(SUM(fine), 0) as fines FROM overdue_queue")
+
+async def get_overdue_page(after=None, limit=DEFAULT_PAGE_SIZE):
+    await _ensure_overdue_fresh()
+    sql, params, limit = library_db.overdue_page_statement(after, limit)
+    return _overdue_page(await _fetchall(sql, params), limit)
+
+# Dashboard Functions
+async def get_dashboard_stats():
+    rows = await _fetchall("SELECT name, value FROM library_stats")
+    counters = {row['name']: row['value'] for row in rows}
+    if stats.needs_reconcile(counters):
+        await asyncio.to_thread(stats.reconcile)
+        return await get_dashboard_stats()
+    total_copies = counters.get('total_copies', 0)
+    books_borrowed = counters.get('books_borrowed', 0)
+    return {
+        'total_books': counters.get('total_books', 0),
+        'total_copies': total_copies,
+        'total_members': counters.get('total_members', 0),
+        'books_borrowed': books_borrowed,
+        'available_books': total_copies - books_borrowed,
+        'overdue_books': counters.get('overdue_books', 0)
+    }
+
+async def get_categories():
+    rows = await _fetchall("SELECT DISTINCT category FROM books WHERE category IS NOT NULL AND category != ''")
+    return [row['category'] for row in rows]
+
+# Writes run the synchronous implementation in a worker thread
+def _in_thread(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return wrapper
+
+add_book = _in_thread(library_db.add_book)
+update_book = _in_thread(library_db.update_book)
+delete_book = _in_thread(library_db.delete_book)
+add_copies = _in_thread(library_db.add_copies)
+withdraw_copy = _in_thread(library_db.withdraw_copy)
+add_member = _in_thread(library_db.add_member)
+update_member = _in_thread(library_db.update_member)
+delete_member = _in_thread(library_db.delete_member)
+borrow_book = _in_thread(library_db.borrow_book)
+return_book = _in_thread(library_db.return_book)
+borrow_books = _in_thread(library_db.borrow_books)
+return_books = _in_thread(library_db.return_books)
+check_isbn_exists = _in_thread(library_db.check_isbn_exists)
@@ -0,0 +1,186 @@
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request
+import db_config
+import sqlite_backend
+
+# Load instrumentation settings
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+BYTE_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+slow_query_log = logging.getLogger('library.slow_query')
+profile_log = logging.getLogger('library.profile')
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label tuple"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+                prefix = label_text + ',' if label_text else ''
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+                lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+db_call_seconds = Histogram('library_db_call_seconds', 'Latency of library_db functions', ('function',), LATENCY_BUCKETS)
+db_call_rows = Histogram('library_db_call_rows', 'Rows returned by library_db functions', ('function',), ROW_BUCKETS)
+http_request_seconds = Histogram('http_request_seconds', 'Flask request latency', ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+http_response_bytes = Histogram('http_response_bytes', 'Response body size on the wire, after compression',
+                                ('endpoint',), BYTE_BUCKETS)
+HISTOGRAMS = (db_call_seconds, db_call_rows, http_request_seconds, http_response_bytes)
+
+def _row_count(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        # (page, next_cursor) from the keyset paginated readers
+        return len(result[0])
+    return 0 if result is None else 1
+
+def timed(func):
+    """Record call latency and returned row count for a library_db function"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            db_call_seconds.observe(time.perf_counter() - started, func.__name__)
+        db_call_rows.observe(_row_count(result), func.__name__)
+        return result
+    return wrapper
+
+# Slow Query Log
+def _explain(cursor, statement, params):
+    if db_config.DB_BACKEND == 'sqlite':
+        return '\n'.join(f"  {detail}{' (full scan)' if full_scan else ''}"
+                         for detail, full_scan in sqlite_backend.explain(cursor, statement, params))
+    cursor.execute('EXPLAIN ' + statement, params)
+    return '\n'.join(
+        f"  {row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}"
+        for row in cursor.fetchall())
+
+def log_slow_query(statement, params, seconds, connection):
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+    plan = ''
+    if statement.lstrip().upper().startswith('SELECT'):
+        try:
+            plan = _explain(connection.cursor(dictionary=True), statement, params)
+        except Exception as e:
+            # e.g. an unbuffered cursor still streaming on this connection
+            plan = f"  (EXPLAIN unavailable: {e})"
+    slow_query_log.warning("Slow query (%.1f ms): %s\nparams=%r\n%s",
+                           seconds * 1000, ' '.join(statement.split()), params, plan)
+
+# Flask Integration
+def _start_request():
+    g.request_started = time.perf_counter()
+    if PROFILING_ENABLED and request.headers.get(PROFILE_HEADER):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def _finish_request(response):
+    endpoint = request.endpoint or 'unknown'
+    started = g.pop('request_started', None)
+    if started is not None:
+        http_request_seconds.observe(time.perf_counter() - started, endpoint, request.method, str(response.status_code))
+    # after_request hooks run in reverse order of registration, so http_cache has compressed the
+    # body by now: the size is what went over the wire, and the latency includes compressing it
+    if response.content_length is not None:
+        http_response_bytes.observe(response.content_length, endpoint)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _dump_profile(profiler, endpoint, response)
+    return response
+
+def _dump_profile(profiler, endpoint, response):
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(30)
+    profile_log.info("Profile for %s %s\n%s", request.method, request.full_path, output.getvalue())
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{endpoint}-{int(time.time() * 1000)}.prof")
+        profiler.dump_stats(path)
+        response.headers['X-Profile-File'] = path
+
+def _gauge(name, help_text, value):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+def _counter(name, help_text, value):
+    return [f"# HELP {name}_total {help_text}", f"# TYPE {name}_total counter", f"{name}_total {value}"]
+
+def render_metrics():
+    import cache
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    pool = db_config.pool_stats()
+    lines += _gauge('db_pool_in_use', 'Pooled connections checked out', pool['in_use'])
+    lines += _gauge('db_pool_idle', 'Idle pooled connections', pool['idle'])
+    lines += _gauge('db_pool_waiters', 'Threads waiting for a pooled connection', pool['waiters'])
+    lines += _gauge('db_pool_avg_checkout_ms', 'Average pool checkout latency', pool['avg_checkout_ms'])
+    if pool.get('replicas'):
+        lines += ["# HELP db_replica_healthy Replica passed its last health check",
+                  "# TYPE db_replica_healthy gauge"]
+        lines += [f'db_replica_healthy{{replica="{r["name"]}"}} {int(r["healthy"])}' for r in pool['replicas']]
+        lines += ["# HELP db_replica_lag_seconds Replication lag seen by the last health check",
+                  "# TYPE db_replica_lag_seconds gauge"]
+        lines += [f'db_replica_lag_seconds{{replica="{r["name"]}"}} {r["lag"]}' for r in pool['replicas']
+                  if r['lag'] is not None]
+    cache_stats = cache.stats()
+    for counter in ('hits', 'misses', 'evictions', 'invalidations', 'stale_fills', 'errors'):
+        if cache_stats.get(counter) is not None:
+            help_text = f"Read-through cache {counter.replace('_', ' ')} since the worker started"
+            lines += _counter(f'cache_{counter}', help_text, cache_stats[counter])
+    return '\n'.join(lines) + '\n'
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    db_config.add_query_listener(log_slow_query)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,434 @@
+import sys
+from db_config import connect_db
+import db_config
+import sqlite_backend
+
+class MigrationError(Exception):
+    """Raised when a migration cannot be applied to the current data"""
+
+# Idempotent schema helpers, so migrations also succeed on databases patched by hand
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+def add_column(cursor, table, column, definition):
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def add_index(cursor, table, index, definition):
+    if not index_exists(cursor, table, index):
+        cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+
+def drop_column(cursor, table, column):
+    if column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+def drop_index(cursor, table, index):
+    if index_exists(cursor, table, index):
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}")
+
+# Migrations
+def legacy_book_columns(cursor):
+    add_column(cursor, 'books', 'category', "VARCHAR(100)")
+    add_column(cursor, 'books', 'description', "TEXT")
+    add_column(cursor, 'books', 'created_at', "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    add_column(cursor, 'books', 'updated_at', "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+
+def fulltext_search_indexes(cursor):
+    add_index(cursor, 'books', 'ft_books_search',
+              "FULLTEXT INDEX ft_books_search (title, author, category, isbn, description)")
+    add_index(cursor, 'members', 'ft_members_search',
+              "FULLTEXT INDEX ft_members_search (name, email, phone)")
+
+def hot_path_indexes(cursor):
+    # Blank ISBNs would collide under the unique index; store them as NULL instead
+    cursor.execute("UPDATE books SET isbn = NULL WHERE isbn = ''")
+    cursor.execute("""
+        SELECT isbn, COUNT(*) FROM books
+        WHERE isbn IS NOT NULL
+        GROUP BY isbn HAVING COUNT(*) > 1
+        LIMIT 20
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        listed = ', '.join(f"{isbn} (x{count})" for isbn, count in duplicates)
+        raise MigrationError(f"Resolve duplicate ISBNs before adding the unique index: {listed}")
+    add_index(cursor, 'books', 'uq_books_isbn', "UNIQUE INDEX uq_books_isbn (isbn)")
+    add_index(cursor, 'books', 'idx_books_category', "INDEX idx_books_category (category)")
+    # Open loans per book / per member: LEFT JOINs in the listings and the active-loan counts
+    add_index(cursor, 'borrowings', 'idx_borrowings_book_returned',
+              "INDEX idx_borrowings_book_returned (book_id, returned_date)")
+    add_index(cursor, 'borrowings', 'idx_borrowings_member_returned',
+              "INDEX idx_borrowings_member_returned (member_id, returned_date)")
+    # Overdue scans: equality on returned_date first, then the due_date range
+    add_index(cursor, 'borrowings', 'idx_borrowings_returned_due',
+              "INDEX idx_borrowings_returned_due (returned_date, due_date)")
+    add_index(cursor, 'borrowings', 'idx_borrowings_borrow_date',
+              "INDEX idx_borrowings_borrow_date (borrow_date)")
+
+def dashboard_stats_table(cursor):
+    # Starts empty: the first dashboard read finds no reconciled_at and recounts
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS library_stats (
+            name VARCHAR(50) PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+def unique_active_loan(cursor):
+    cursor.execute("""
+        SELECT book_id, COUNT(*) FROM borrowings
+        WHERE returned_date IS NULL
+        GROUP BY book_id HAVING COUNT(*) > 1
+        LIMIT 20
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        listed = ', '.join(f"book {book_id} (x{count})" for book_id, count in duplicates)
+        raise MigrationError(f"Close duplicate open loans before adding the active-loan constraint: {listed}")
+    # NULL once returned, so only open loans compete for the unique key
+    add_column(cursor, 'borrowings', 'active_book_id',
+               "INT AS (IF(returned_date IS NULL, book_id, NULL)) STORED")
+    add_index(cursor, 'borrowings', 'uq_borrowings_active_book',
+              "UNIQUE INDEX uq_borrowings_active_book (active_book_id)")
+
+def active_loans_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS active_loans (
+            book_id INT PRIMARY KEY,
+            borrowing_id INT NOT NULL,
+            member_id INT NOT NULL,
+            due_date DATE NOT NULL,
+            UNIQUE INDEX uq_active_loans_borrowing (borrowing_id),
+            INDEX idx_active_loans_member (member_id),
+            INDEX idx_active_loans_due (due_date),
+            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+            FOREIGN KEY (member_id) REFERENCES members(id) ON DELETE CASCADE,
+            FOREIGN KEY (borrowing_id) REFERENCES borrowings(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("DELETE FROM active_loans")
+    cursor.execute("""
+        INSERT INTO active_loans (book_id, borrowing_id, member_id, due_date)
+        SELECT book_id, id, member_id, due_date FROM borrowings WHERE returned_date IS NULL
+    """)
+
+def overdue_queue_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS overdue_queue (
+            borrowing_id INT PRIMARY KEY,
+            book_id INT NOT NULL,
+            member_id INT NOT NULL,
+            due_date DATE NOT NULL,
+            days_late INT NOT NULL,
+            fine DECIMAL(8, 2) NOT NULL DEFAULT 0,
+            scanned_on DATE NOT NULL,
+            reminded_on DATE NULL,
+            INDEX idx_overdue_queue_due (due_date, borrowing_id),
+            INDEX idx_overdue_queue_member (member_id, reminded_on),
+            FOREIGN KEY (borrowing_id) REFERENCES borrowings(id) ON DELETE CASCADE,
+            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+            FOREIGN KEY (member_id) REFERENCES members(id) ON DELETE CASCADE
+        )
+    """)
+    # Filled by the first overdue scan, which ensure_fresh() queues while no scan is recorded
+    cursor.execute("DELETE FROM library_stats WHERE name = 'overdue_scanned_at'")
+
+def borrowings_archive_table(cursor):
+    # A separate table rather than RANGE partitions: InnoDB cannot partition
+    # borrowings while active_loans and overdue_queue reference it by foreign key
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS borrowings_archive (
+            id INT PRIMARY KEY,
+            book_id INT NOT NULL,
+            member_id INT NOT NULL,
+            borrow_date DATE NOT NULL,
+            due_date DATE NOT NULL,
+            returned_date DATE NOT NULL,
+            created_at TIMESTAMP NULL,
+            updated_at TIMESTAMP NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_borrowings_archive_book (book_id),
+            INDEX idx_borrowings_archive_member (member_id, borrow_date),
+            INDEX idx_borrowings_archive_borrow_date (borrow_date),
+            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+            FOREIGN KEY (member_id) REFERENCES members(id) ON DELETE CASCADE
+        )
+    """)
+
+def table_versions_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.executemany("INSERT IGNORE INTO table_versions (name, version) VALUES (%s, 1)",
+                       [('books',), ('members',), ('borrowings',)])
+
+def populate_copies(cursor):
+    """One copy per existing title, then copy states, counters and active_loans from the open loans"""
+    # The schema as of version 10, spelled out so later changes to availability.py leave it alone
+    cursor.execute("""
+        INSERT INTO book_copies (book_id, barcode, state)
+        SELECT id, CONCAT('B', id, '-1'), 'available' FROM books
+        WHERE NOT EXISTS (SELECT 1 FROM book_copies c WHERE c.book_id = books.id)
+    """)
+    for table in ('borrowings', 'borrowings_archive'):
+        cursor.execute(f"""
+            UPDATE {table} SET copy_id = (SELECT MIN(c.id) FROM book_copies c WHERE c.book_id = {table}.book_id)
+            WHERE copy_id IS NULL
+        """)
+    cursor.execute("""
+        UPDATE book_copies SET state = 'available'
+        WHERE state = 'on_loan'
+          AND id NOT IN (SELECT copy_id FROM borrowings WHERE returned_date IS NULL AND copy_id IS NOT NULL)
+    """)
+    cursor.execute("""
+        UPDATE book_copies SET state = 'on_loan'
+        WHERE id IN (SELECT copy_id FROM borrowings WHERE returned_date IS NULL)
+    """)
+    cursor.execute("DELETE FROM active_loans")
+    cursor.execute("""
+        INSERT INTO active_loans (borrowing_id, book_id, copy_id, member_id, due_date)
+        SELECT id, book_id, copy_id, member_id, due_date FROM borrowings
+        WHERE returned_date IS NULL
+    """)
+    cursor.execute("""
+        UPDATE books SET
+            total_copies = (SELECT COUNT(*) FROM book_copies c WHERE c.book_id = books.id AND c.state <> 'withdrawn'),
+            available_copies = (SELECT COUNT(*) FROM book_copies c WHERE c.book_id = books.id AND c.state = 'available')
+    """)
+
+def book_copies_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS book_copies (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            book_id INT NOT NULL,
+            barcode VARCHAR(32) NOT NULL,
+            state VARCHAR(16) NOT NULL DEFAULT 'available',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE INDEX uq_book_copies_barcode (barcode),
+            INDEX idx_book_copies_book_state (book_id, state),
+            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE
+        )
+    """)
+    add_column(cursor, 'books', 'total_copies', "INT NOT NULL DEFAULT 0")
+    add_column(cursor, 'books', 'available_copies', "INT NOT NULL DEFAULT 0")
+    add_column(cursor, 'borrowings', 'copy_id', "INT NULL")
+    add_column(cursor, 'borrowings_archive', 'copy_id', "INT NULL")
+    add_index(cursor, 'borrowings', 'fk_borrowings_copy',
+              "CONSTRAINT fk_borrowings_copy FOREIGN KEY (copy_id) REFERENCES book_copies(id) ON DELETE CASCADE")
+    # Several copies of a title can be out at once; the open-loan guard moves from the book to the copy
+    add_column(cursor, 'borrowings', 'active_copy_id',
+               "INT AS (IF(returned_date IS NULL, copy_id, NULL)) STORED")
+    add_index(cursor, 'borrowings', 'uq_borrowings_active_copy',
+              "UNIQUE INDEX uq_borrowings_active_copy (active_copy_id)")
+    drop_index(cursor, 'borrowings', 'uq_borrowings_active_book')
+    drop_column(cursor, 'borrowings', 'active_book_id')
+    # active_loans: one row per open loan rather than per book
+    add_index(cursor, 'active_loans', 'idx_active_loans_book', "INDEX idx_active_loans_book (book_id)")
+    add_column(cursor, 'active_loans', 'copy_id', "INT NULL")
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'active_loans' AND CONSTRAINT_NAME = 'PRIMARY'
+    """)
+    if [row[0] for row in cursor.fetchall()] != ['borrowing_id']:
+        cursor.execute("ALTER TABLE active_loans DROP PRIMARY KEY, ADD PRIMARY KEY (borrowing_id)")
+    add_index(cursor, 'active_loans', 'uq_active_loans_copy', "UNIQUE INDEX uq_active_loans_copy (copy_id)")
+    populate_copies(cursor)
+    # Make the next dashboard read recount, now with total_copies
+    cursor.execute("DELETE FROM library_stats WHERE name = 'reconciled_at'")
+
+def jobs_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL DEFAULT 3,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by VARCHAR(100) NULL,
+            locked_at TIMESTAMP NULL,
+            result TEXT NULL,
+            error TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP NULL,
+            INDEX idx_jobs_status_run_after (status, run_after, id),
+            INDEX idx_jobs_status_locked_at (status, locked_at)
+        )
+    """)
+
+def lookup_indexes(cursor):
+    # Anchored prefix lookups from the /borrow form, in title and name order
+    add_index(cursor, 'books', 'idx_books_title', "INDEX idx_books_title (title)")
+    add_index(cursor, 'members', 'idx_members_name', "INDEX idx_members_name (name)")
+
+def job_kinds_table(cursor):
+    # One row per job kind with a concurrency limit, locked while a worker claims a job of that kind
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_kinds (
+            kind VARCHAR(50) PRIMARY KEY
+        )
+    """)
+
+MIGRATIONS = [
+    (1, 'Add catalogue columns to legacy books tables', legacy_book_columns),
+    (2, 'Full-text search indexes', fulltext_search_indexes),
+    (3, 'Indexes for listing, loan, overdue and ISBN lookups', hot_path_indexes),
+    (4, 'Summary table for dashboard counters', dashboard_stats_table),
+    (5, 'At most one open loan per book', unique_active_loan),
+    (6, 'Materialized open loans for listings', active_loans_table),
+    (7, 'Precomputed overdue queue with fines', overdue_queue_table),
+    (8, 'Archive table for old returned loans', borrowings_archive_table),
+    (9, 'Per-table change versions for HTTP validators', table_versions_table),
+    (10, 'Physical copies with per-title availability counters', book_copies_table),
+    (11, 'Durable queue for background jobs', jobs_table),
+    (12, 'Title and name indexes for type-ahead lookups', lookup_indexes),
+    (13, 'Lock rows for per-kind job concurrency limits', job_kinds_table),
+]
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def applied_versions(cursor):
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def current_version(conn):
+    cursor = conn.cursor()
+    versions = applied_versions(cursor)
+    return max(versions) if versions else 0
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+def migrate(conn, target=None):
+    """Apply every pending migration up to target (default: latest) and return the versions applied"""
+    cursor = conn.cursor()
+    done = applied_versions(cursor)
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        if target is not None and version > target:
+            break
+        print(f"⏫ Applying migration {version}: {description}")
+        if db_config.DB_BACKEND == 'sqlite':
+            sqlite_backend.apply_migration(cursor, version)
+        else:
+            apply(cursor)
+        cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                       (version, description))
+        conn.commit()
+        applied.append(version)
+    return applied
+
+# Query Plans
+def explain_queries(out=sys.stdout):
+    """Run every read path in library_db, EXPLAIN each statement it issues and flag full table scans"""
+    import library_db
+
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT MIN(id) AS id FROM books")
+    book_id = cursor.fetchone()['id'] or 1
+    cursor.execute("SELECT MIN(id) AS id FROM members")
+    member_id = cursor.fetchone()['id'] or 1
+
+    read_paths = [
+        ('get_books_page', lambda: library_db.get_books_page()),
+        ('get_book_by_id', lambda: library_db.get_book_by_id(book_id)),
+        ('search_books (full-text)', lambda: library_db.search_books('history')),
+        ('search_books (isbn)', lambda: library_db.search_books('978-0-')),
+        ('get_members_page', lambda: library_db.get_members_page()),
+        ('get_member_by_id', lambda: library_db.get_member_by_id(member_id)),
+        ('search_members', lambda: library_db.search_members('john')),
+        ('get_borrowings', lambda: library_db.get_borrowings()),
+        ('get_active_borrowings', lambda: library_db.get_active_borrowings()),
+        ('get_borrowing_history', lambda: library_db.get_borrowing_history()),
+        ('get_recent_borrowings', lambda: library_db.get_recent_borrowings()),
+        ('get_overdue_books', lambda: library_db.get_overdue_books()),
+        ('get_overdue_page', lambda: library_db.get_overdue_page()),
+        ('get_dashboard_stats', lambda: library_db.get_dashboard_stats()),
+        ('get_categories', lambda: library_db.get_categories()),
+        ('get_available_books', lambda: library_db.get_available_books(limit=50)),
+        ('lookup_available_books', lambda: library_db.lookup_available_books('the')),
+        ('lookup_members', lambda: library_db.lookup_members('jo')),
+        ('check_isbn_exists', lambda: library_db.check_isbn_exists('978-0-0000-0000-0', book_id)),
+    ]
+
+    full_scans = 0
+    for name, call in read_paths:
+        statements = []
+        def record(statement, params, seconds, connection):
+            statements.append((statement, params))
+        db_config.add_query_listener(record)
+        try:
+            call()
+        finally:
+            db_config.remove_query_listener(record)
+
+        print(f"\n=== {name} ===", file=out)
+        for statement, params in statements:
+            if db_config.DB_BACKEND == 'sqlite':
+                for detail, scan in sqlite_backend.explain(cursor, statement, params):
+                    full_scans += scan
+                    print(f"  {'⚠️ ' if scan else '  '}{detail}", file=out)
+                continue
+            cursor.execute("EXPLAIN " + statement, params)
+            for row in cursor.fetchall():
+                scan = row['type'] == 'ALL'
+                full_scans += scan
+                print(f"  {'⚠️ ' if scan else '  '}{row['table'] or '-':<12} type={row['type'] or '-':<8} "
+                      f"key={row['key'] or '-':<32} rows={row['rows'] or 0:<8} {row['Extra'] or ''}", file=out)
+    conn.close()
+    print(f"\n{full_scans} full table scan(s) found", file=out)
+    return full_scans
+
+def print_status(conn):
+    cursor = conn.cursor()
+    done = applied_versions(cursor)
+    for version, description, apply in MIGRATIONS:
+        state = 'applied' if version in done else 'pending'
+        print(f"{version:>4}  {state:<8} {description}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'explain':
+        explain_queries()
+        sys.exit(0)
+    conn = connect_db()
+    if command == 'status':
+        print_status(conn)
+    elif command == 'migrate':
+        applied = migrate(conn)
+        print(f"✅ Schema at version {current_version(conn)} ({len(applied)} migration(s) applied)")
+    else:
+        print("Usage: python migrations.py [migrate|status|explain]")
+        sys.exit(2)
+    conn.close()
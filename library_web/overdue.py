@@ -0,0 +1,181 @@
+import os
+import smtplib
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from email.message import EmailMessage
+from db_config import get_db
+
+# overdue_queue holds one row per overdue open loan with its days late and fine,
+# recomputed by a daily scan of active_loans and trimmed by the return paths, so
+# /overdue and the dashboard never evaluate the overdue predicate per request.
+
+# Load fine and reminder settings
+FINE_PER_DAY = Decimal(os.getenv('OVERDUE_FINE_PER_DAY', '0.25'))
+FINE_CAP = Decimal(os.getenv('OVERDUE_FINE_CAP', '20.00'))
+SCAN_INTERVAL = int(os.getenv('OVERDUE_SCAN_INTERVAL', '3600'))
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '500'))
+REMINDER_INTERVAL_DAYS = int(os.getenv('REMINDER_INTERVAL_DAYS', '7'))
+REMINDER_DIR = os.getenv('REMINDER_DIR', 'reminders')
+REMINDER_SENDER = os.getenv('REMINDER_SENDER', 'library@example.org')
+# Set SMTP_HOST to deliver through a server, e.g. a local stand-in started with
+# `python -m aiosmtpd -n -l localhost:8025`; otherwise reminders are written as .eml files
+SMTP_HOST = os.getenv('SMTP_HOST')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '25'))
+
+_state = {'scanned_on': None, 'queued_on': None}
+
+def refresh(cursor, today):
+    """Bring the queue in line with active_loans as of `today`; returns the number of newly overdue loans"""
+    fine = "LEAST(DATEDIFF(%s, due_date) * %s, %s)"
+    cursor.execute("DELETE FROM overdue_queue WHERE borrowing_id NOT IN (SELECT borrowing_id FROM active_loans)")
+    cursor.execute(f"UPDATE overdue_queue SET days_late = DATEDIFF(%s, due_date), fine = {fine}, scanned_on = %s",
+                   (today, today, FINE_PER_DAY, FINE_CAP, today))
+    cursor.execute(f"""
+        INSERT INTO overdue_queue (borrowing_id, book_id, member_id, due_date, days_late, fine, scanned_on)
+        SELECT borrowing_id, book_id, member_id, due_date, DATEDIFF(%s, due_date), {fine}, %s
+        FROM active_loans al
+        WHERE due_date < %s
+          AND NOT EXISTS (SELECT 1 FROM overdue_queue q WHERE q.borrowing_id = al.borrowing_id)
+    """, (today, today, FINE_PER_DAY, FINE_CAP, today, today))
+    return cursor.rowcount
+
+def scan(conn=None, today=None):
+    """Recompute the overdue queue in one transaction and return the number of newly overdue loans"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    try:
+        today = today or date.today()
+        cursor = conn.cursor()
+        added = refresh(cursor, today)
+        cursor.execute("REPLACE INTO library_stats (name, value) VALUES ('overdue_scanned_at', %s)", (int(time.time()),))
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    _state['scanned_on'] = today
+    return added
+
+def dequeue(cursor, borrowing_ids):
+    """Drop returned loans from the queue inside the caller's transaction"""
+    placeholders = ', '.join(['%s'] * len(borrowing_ids))
+    cursor.execute(f"DELETE FROM overdue_queue WHERE borrowing_id IN ({placeholders})", list(borrowing_ids))
+
+def checked_today():
+    return _state['scanned_on'] == date.today()
+
+def ensure_fresh():
+    """On the first overdue read of the day, queue a scan if the scheduled one has not run yet
+
+    The read itself is served from the queue as it stands (yesterday's fines) rather
+    than waiting for the scan.
+    """
+    today = date.today()
+    if checked_today() or _state['queued_on'] == today:
+        return
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM library_stats WHERE name = 'overdue_scanned_at'")
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    if row is not None and date.fromtimestamp(row[0]) == today:
+        _state['scanned_on'] = today
+        return
+    # jobs imports library_db, which imports this module
+    import jobs
+    jobs.enqueue('overdue_scan')
+    _state['queued_on'] = today
+
+# Reminders
+def render_reminder(member, loans):
+    message = EmailMessage()
+    message['From'] = REMINDER_SENDER
+    message['To'] = member['email']
+    message['Subject'] = f"Overdue library books: {len(loans)} item{'s' if len(loans) != 1 else ''}"
+    lines = [f"Dear {member['name']},", "", "The following books are overdue:", ""]
+    for loan in loans:
+        lines.append(f"  - {loan['title']} by {loan['author']}: due {loan['due_date']}, "
+                     f"{loan['days_late']} day(s) late, fine {loan['fine']}")
+    lines += ["", f"Total fines: {sum(loan['fine'] for loan in loans)}",
+              "Please return them at your earliest convenience.", "", "Library Management System"]
+    message.set_content('\n'.join(lines))
+    return message
+
+def _deliver(messages, today):
+    if SMTP_HOST:
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
+            for member_id, message in messages:
+                smtp.send_message(message)
+        return
+    directory = os.path.join(REMINDER_DIR, today.isoformat())
+    os.makedirs(directory, exist_ok=True)
+    for member_id, message in messages:
+        with open(os.path.join(directory, f"member-{member_id}.eml"), 'wb') as f:
+            f.write(message.as_bytes())
+
+def send_reminders(conn=None, today=None, batch_size=REMINDER_BATCH_SIZE):
+    """Send one reminder per member with overdue loans, committing after each batch of members"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    try:
+        today = today or date.today()
+        resend_before = today - timedelta(days=REMINDER_INTERVAL_DAYS)
+        cursor = conn.cursor(dictionary=True)
+        after = 0
+        sent = 0
+        while True:
+            cursor.execute("""
+                SELECT DISTINCT member_id FROM overdue_queue
+                WHERE member_id > %s AND (reminded_on IS NULL OR reminded_on <= %s)
+                ORDER BY member_id LIMIT %s
+            """, (after, resend_before, batch_size))
+            member_ids = [row['member_id'] for row in cursor.fetchall()]
+            if not member_ids:
+                break
+            placeholders = ', '.join(['%s'] * len(member_ids))
+            cursor.execute(f"""
+                SELECT q.borrowing_id, q.member_id, q.due_date, q.days_late, q.fine,
+                       b.title, b.author, m.name, m.email
+                FROM overdue_queue q
+                JOIN books b ON q.book_id = b.id
+                JOIN members m ON q.member_id = m.id
+                WHERE q.member_id IN ({placeholders})
+                ORDER BY q.member_id, q.due_date
+            """, member_ids)
+            by_member = {}
+            for row in cursor.fetchall():
+                by_member.setdefault(row['member_id'], []).append(row)
+            messages = [(member_id, render_reminder(loans[0], loans)) for member_id, loans in by_member.items()]
+            _deliver(messages, today)
+            borrowing_ids = [loan['borrowing_id'] for loans in by_member.values() for loan in loans]
+            placeholders = ', '.join(['%s'] * len(borrowing_ids))
+            cursor.execute(f"UPDATE overdue_queue SET reminded_on = %s WHERE borrowing_id IN ({placeholders})",
+                           [today] + borrowing_ids)
+            conn.commit()
+            sent += len(messages)
+            after = member_ids[-1]
+            print(f"  📨 {sent} reminder(s) sent", end='\r')
+    finally:
+        if own_conn:
+            conn.close()
+    return sent
+
+def run(interval=SCAN_INTERVAL):
+    """Scan and send due reminders every `interval` seconds until interrupted"""
+    while True:
+        added = scan()
+        sent = send_reminders()
+        print(f"⏰ Overdue queue refreshed ({added} newly overdue), {sent} reminder(s) sent")
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'scan'
+    if command == 'run':
+        run(int(sys.argv[2]) if len(sys.argv) > 2 else SCAN_INTERVAL)
+    elif command == 'remind':
+        print(f"📨 {send_reminders()} reminder(s) sent")
+    else:
+        print(f"⏰ Overdue queue refreshed, {scan()} newly overdue loan(s)")
@@ -0,0 +1,68 @@
+# Compact result rows for library_db readers. Each distinct column list gets a
+# __slots__ class, so a row costs one small object instead of a per-row dict
+# with its own hash table. Records support attribute access (Jinja, code) and
+# item access (row['id']) so they drop in where dictionary cursors were used.
+
+class Record:
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._fields == other._fields and self._values() == other._values()
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Record(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields) + ')'
+
+    def __reduce__(self):
+        # Classes are built at runtime, so pickle (the shared cache) goes through make_record
+        return make_record, (self._fields, self._values())
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return self._fields
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+_classes = {}
+
+def record_class(fields):
+    """Return the Record subclass for a tuple of column names"""
+    cls = _classes.get(fields)
+    if cls is None:
+        cls = _classes[fields] = type('Record', (Record,), {'__slots__': fields, '_fields': fields})
+    return cls
+
+def make_record(fields, values):
+    return record_class(tuple(fields))(*values)
+
+def _fields(cursor):
+    return tuple(column[0] for column in cursor.description)
+
+def fetch_all(cursor):
+    """Fetch the remaining rows of a plain (tuple) cursor as Records"""
+    cls = record_class(_fields(cursor))
+    return [cls(*row) for row in cursor.fetchall()]
+
+def fetch_one(cursor):
+    row = cursor.fetchone()
+    return None if row is None else record_class(_fields(cursor))(*row)
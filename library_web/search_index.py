@@ -0,0 +1,123 @@
+import heapq
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+# Load settings for the in-process autocomplete index
+ENABLED = os.getenv('SEARCH_INDEX_ENABLED', '1') == '1'
+REFRESH_SECONDS = int(os.getenv('SEARCH_INDEX_REFRESH', '300'))
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+class InvertedIndex:
+    """Token -> document postings with a sorted term list for prefix lookups"""
+
+    def __init__(self, fields, label_fields):
+        self.fields = fields
+        self.label_fields = label_fields
+        self.built_at = None
+        self._postings = {}
+        self._terms = []
+        self._docs = {}
+        self._lock = threading.RLock()
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def is_stale(self):
+        return not self.is_built or time.monotonic() - self.built_at > REFRESH_SECONDS
+
+    def build(self, rows):
+        """Replace the index contents with the given rows"""
+        with self._lock:
+            self._postings = {}
+            self._terms = []
+            self._docs = {}
+            for row in rows:
+                self._add(row)
+            self.built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on next use, e.g. after a bulk load that bypassed add()"""
+        self.built_at = None
+
+    def add(self, row):
+        """Index or re-index one document; a no-op until the index has been built"""
+        if not self.is_built:
+            return
+        with self._lock:
+            self._remove(row['id'])
+            self._add(row)
+
+    def remove(self, doc_id):
+        if not self.is_built:
+            return
+        with self._lock:
+            self._remove(int(doc_id))
+
+    def _add(self, row):
+        doc_id = int(row['id'])
+        tokens = set()
+        for field in self.fields:
+            tokens.update(tokenize(row.get(field)))
+        self._docs[doc_id] = ({field: row.get(field) for field in self.label_fields}, tokens)
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                insort(self._terms, token)
+            postings.add(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for token in doc[1]:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[token]
+                del self._terms[bisect_left(self._terms, token)]
+
+    def _prefix_matches(self, prefix):
+        matches = set()
+        start = bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches |= self._postings[term]
+        return matches
+
+    def complete(self, query, limit=10):
+        """Return documents containing every query word, treating the last word as a prefix"""
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            *exact, prefix = words
+            candidates = self._prefix_matches(prefix)
+            for word in exact:
+                candidates &= self._postings.get(word, set())
+                if not candidates:
+                    return []
+            # Shorter labels first, so "dune" ranks above "dune messiah"
+            first_label = self.label_fields[0]
+            ranked = heapq.nsmallest(limit, candidates, key=lambda doc_id: (len(str(self._docs[doc_id][0].get(first_label) or '')), doc_id))
+            return [dict(self._docs[doc_id][0], id=doc_id) for doc_id in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {'documents': len(self._docs), 'terms': len(self._terms), 'built': self.is_built}
+
+books = InvertedIndex(fields=('title', 'author', 'category', 'isbn'), label_fields=('title', 'author'))
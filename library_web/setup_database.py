@@ -1,14 +1,23 @@
+import argparse
 import mysql.connector
 import os
-from dotenv import load_dotenv
+import db_config
 from db_config import connect_db
-
-# Load environment variables
-load_dotenv()
+from migrations import migrate
+import availability
 
 def create_database_tables():
     """Create all required tables for the library management system"""
-    
+    if db_config.DB_BACKEND == 'sqlite':
+        # The SQLite file is created on first connect and its tables by the migrations
+        conn = connect_db()
+        migrate(conn)
+        conn.close()
+    elif not create_mysql_tables():
+        return
+    add_sample_data()
+
+def create_mysql_tables():
     # First, let's create the database if it doesn't exist
     try:
         # Connect without specifying database
@@ -23,7 +32,7 @@ def create_database_tables():
         conn.close()
     except Exception as e:
         print(f"Error creating database: {e}")
-        return
+        return False
     
     # Now connect to the database and create tables
     try:
@@ -75,24 +84,21 @@ def create_database_tables():
             )
         """)
         
-        # Check if we need to add new columns to existing books table
-        cursor.execute("DESCRIBE books")
-        columns = [col[0] for col in cursor.fetchall()]
-        
-        if 'category' not in columns:
-            cursor.execute("ALTER TABLE books ADD COLUMN category VARCHAR(100)")
-        
-        if 'description' not in columns:
-            cursor.execute("ALTER TABLE books ADD COLUMN description TEXT")
-        
-        if 'created_at' not in columns:
-            cursor.execute("ALTER TABLE books ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-        
-        if 'updated_at' not in columns:
-            cursor.execute("ALTER TABLE books ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+        # Bring existing databases up to the current schema version
+        migrate(conn)
         
         conn.commit()
+        conn.close()
         print("✅ Database tables created/updated successfully!")
+        return True
+    except Exception as e:
+        print(f"Error creating tables: {e}")
+        return False
+
+def add_sample_data():
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
         
         # Insert sample data if tables are empty
         cursor.execute("SELECT COUNT(*) FROM books")
@@ -114,6 +120,7 @@ def create_database_tables():
                     INSERT INTO books (title, author, year, isbn, category, description) 
                     VALUES (%s, %s, %s, %s, %s, %s)
                 """, book)
+            availability.ensure_copies(cursor)
         
         cursor.execute("SELECT COUNT(*) FROM members")
         if cursor.fetchone()[0] == 0:
@@ -138,7 +145,11 @@ def create_database_tables():
         print("📊 Dashboard: http://localhost:5000/")
         
     except Exception as e:
-        print(f"Error creating tables: {e}")
+        print(f"Error adding sample data: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the library database, tables and sample data")
+    parser.add_argument('--backend', choices=db_config.BACKENDS, default=db_config.DB_BACKEND)
+    args = parser.parse_args()
+    db_config.use_backend(args.backend)
     create_database_tables()
@@ -0,0 +1,471 @@
+import calendar
+import functools
+import os
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+from decimal import Decimal
+import mysql.connector
+
+# Embedded SQLite storage for single-node branches and CI. connect() returns a
+# connection that speaks the subset of the mysql.connector API library_db uses
+# (%s placeholders, dictionary cursors, MySQL error numbers), rewrites the few
+# MySQL-only constructs and supplies the MySQL functions the shared SQL calls,
+# so library_db, stats, overdue and friends run unchanged on either backend.
+
+# Load SQLite settings
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'library.db')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_KIB = int(os.getenv('SQLITE_CACHE_KIB', str(64 * 1024)))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+# Compiled statements kept per connection, keyed by SQL text
+STATEMENT_CACHE_SIZE = int(os.getenv('SQLITE_STATEMENT_CACHE', '256'))
+
+# MySQL error numbers library_db reacts to
+DUPLICATE_KEY_ERRNO = 1062
+FOREIGN_KEY_ERRNO = 1452
+LOCK_WAIT_ERRNO = 1205
+
+# Values in and out: ISO text for dates, DECIMAL columns back as Decimal
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+
+# MySQL functions used by the shared SQL
+def _as_date(value):
+    return date.fromisoformat(str(value)[:10])
+
+def _curdate():
+    return date.today().isoformat()
+
+def _datediff(end, start):
+    if end is None or start is None:
+        return None
+    return (_as_date(end) - _as_date(start)).days
+
+def _least(*values):
+    return None if None in values else min(values)
+
+def _concat(*values):
+    return None if None in values else ''.join(str(value) for value in values)
+
+def _date_format(value, fmt):
+    # %Y, %m and %d mean the same to MySQL and strftime
+    return None if value is None else _as_date(value).strftime(fmt)
+
+def _unix_timestamp(value=None):
+    if value is None:
+        return int(time.time())
+    # CURRENT_TIMESTAMP is stored in UTC
+    return calendar.timegm(datetime.fromisoformat(str(value)).timetuple())
+
+FUNCTIONS = [
+    ('CONCAT', -1, _concat, True),
+    ('CURDATE', 0, _curdate, False),
+    ('DATE_FORMAT', 2, _date_format, True),
+    ('DATEDIFF', 2, _datediff, True),
+    ('LEAST', -1, _least, True),
+    ('UNIX_TIMESTAMP', 1, _unix_timestamp, True),
+    ('UNIX_TIMESTAMP', 0, _unix_timestamp, False),
+]
+
+# Statement Translation
+FOR_UPDATE_RE = re.compile(r'\s+FOR\s+UPDATE\b', re.IGNORECASE)
+INSERT_IGNORE_RE = re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE)
+FIRST_WORD_RE = re.compile(r'\W*(\w+)')
+READ_STATEMENTS = {'SELECT', 'WITH', 'EXPLAIN', 'PRAGMA'}
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql, has_params=True):
+    """(sqlite_sql, is_write) for a statement written for mysql.connector"""
+    # The whole database is locked by the write transaction instead (see Connection.begin)
+    write = FOR_UPDATE_RE.search(sql) is not None
+    statement = INSERT_IGNORE_RE.sub('INSERT OR IGNORE', FOR_UPDATE_RE.sub('', sql))
+    if has_params:
+        statement = statement.replace('%s', '?').replace('%%', '%')
+    match = FIRST_WORD_RE.match(statement)
+    write = write or match is None or match.group(1).upper() not in READ_STATEMENTS
+    return statement, write
+
+def _mysql_error(error):
+    """Re-raise SQLite errors as the mysql.connector errors callers already handle"""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        errno = FOREIGN_KEY_ERRNO if 'FOREIGN KEY' in message else DUPLICATE_KEY_ERRNO if 'UNIQUE' in message else None
+        return mysql.connector.errors.IntegrityError(msg=message, errno=errno)
+    if isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message):
+        # Retried by library_db.run_transaction like an InnoDB lock wait timeout
+        return mysql.connector.errors.OperationalError(msg=message, errno=LOCK_WAIT_ERRNO)
+    return error
+
+class Cursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn._raw.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, sql, params=None):
+        statement, write = translate(sql, params is not None)
+        self._conn.begin(write)
+        try:
+            self._cursor.execute(statement, tuple(params) if params is not None else ())
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def executemany(self, sql, rows):
+        statement, _ = translate(sql)
+        self._conn.begin(True)
+        try:
+            self._cursor.executemany(statement, [tuple(row) for row in rows])
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+class Connection:
+    """A SQLite connection with mysql.connector's transaction behaviour: every statement runs in a transaction until commit/rollback"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._writing = False
+
+    def begin(self, write):
+        raw = self._raw
+        if raw.in_transaction:
+            if write and not self._writing:
+                # Upgrading a read snapshot fails if another connection has written since;
+                # end it (it holds no changes) and take the write lock as a fresh transaction
+                raw.commit()
+                self._begin_immediate()
+            return
+        if write:
+            self._begin_immediate()
+        else:
+            raw.execute('BEGIN')
+            self._writing = False
+
+    def _begin_immediate(self):
+        try:
+            self._raw.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+        self._writing = True
+
+    def cursor(self, dictionary=False, **kwargs):
+        return Cursor(self, dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=False):
+        self._raw.execute('SELECT 1')
+
+    def close(self):
+        try:
+            self._raw.execute('PRAGMA optimize')
+        finally:
+            self._raw.close()
+
+def connect(path=None):
+    path = path or SQLITE_PATH
+    raw = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False,
+                          detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=STATEMENT_CACHE_SIZE,
+                          uri=path.startswith('file:'))
+    raw.execute('PRAGMA journal_mode = WAL')
+    raw.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS}')
+    raw.execute('PRAGMA foreign_keys = ON')
+    raw.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    raw.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KIB}')
+    raw.execute('PRAGMA temp_store = MEMORY')
+    for name, arity, function, deterministic in FUNCTIONS:
+        raw.create_function(name, arity, function, deterministic=deterministic)
+    return Connection(raw)
+
+# Schema
+# SQLite counterparts of migrations.MIGRATIONS, by version. A new SQLite
+# database is created through all of them; MySQL-only steps (data checks
+# before adding constraints) have nothing to do on an empty database.
+def _updated_at_trigger(table, key='id'):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_updated_at AFTER UPDATE ON {table}
+        BEGIN
+            UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE {key} = NEW.{key};
+        END
+    """
+
+def _fts_table(table, columns):
+    """External-content FTS5 index over `columns` of `table`, kept in sync by triggers"""
+    listed = ', '.join(columns)
+    new_values = ', '.join(f'NEW.{column}' for column in columns)
+    old_values = ', '.join(f'OLD.{column}' for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({listed}, content='{table}', content_rowid='id')",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, {listed}) VALUES (NEW.id, {new_values});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {listed}) VALUES ('delete', OLD.id, {old_values});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {listed} ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {listed}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {table}_fts (rowid, {listed}) VALUES (NEW.id, {new_values});
+            END""",
+        f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')",
+    ]
+
+def _populate_copies(cursor):
+    # Shared with the MySQL migration; imported here since migrations imports this module
+    import migrations
+    migrations.populate_copies(cursor)
+
+SCHEMA_MIGRATIONS = {
+    1: [
+        # AUTOINCREMENT: like InnoDB, never hand out an id again (archived loans keep theirs).
+        # NOCASE text compares like MySQL's default collation and lets prefix LIKEs use indexes.
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR(255) NOT NULL COLLATE NOCASE,
+            author VARCHAR(255) NOT NULL COLLATE NOCASE,
+            year INT,
+            isbn VARCHAR(20) COLLATE NOCASE,
+            category VARCHAR(100) COLLATE NOCASE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(255) NOT NULL COLLATE NOCASE,
+            email VARCHAR(255) UNIQUE NOT NULL COLLATE NOCASE,
+            phone VARCHAR(20),
+            address TEXT,
+            join_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS borrowings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INT NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            member_id INT NOT NULL REFERENCES members(id) ON DELETE CASCADE,
+            borrow_date DATE NOT NULL,
+            due_date DATE NOT NULL,
+            returned_date DATE NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        _updated_at_trigger('books'),
+        _updated_at_trigger('members'),
+        _updated_at_trigger('borrowings'),
+    ],
+    2: _fts_table('books', ('title', 'author', 'category', 'isbn', 'description'))
+       + _fts_table('members', ('name', 'email', 'phone')),
+    3: [
+        "UPDATE books SET isbn = NULL WHERE isbn = ''",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_books_isbn ON books (isbn)",
+        "CREATE INDEX IF NOT EXISTS idx_books_category ON books (category)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_book_returned ON borrowings (book_id, returned_date)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_member_returned ON borrowings (member_id, returned_date)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_returned_due ON borrowings (returned_date, due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_borrow_date ON borrowings (borrow_date)",
+    ],
+    4: [
+        """
+        CREATE TABLE IF NOT EXISTS library_stats (
+            name VARCHAR(50) PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        _updated_at_trigger('library_stats', 'name'),
+    ],
+    # A partial unique index plays the role of MySQL's generated active_book_id column
+    5: ["CREATE UNIQUE INDEX IF NOT EXISTS uq_borrowings_active_book ON borrowings (book_id) WHERE returned_date IS NULL"],
+    6: [
+        """
+        CREATE TABLE IF NOT EXISTS active_loans (
+            book_id INTEGER PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+            borrowing_id INT NOT NULL UNIQUE REFERENCES borrowings(id) ON DELETE CASCADE,
+            member_id INT NOT NULL REFERENCES members(id) ON DELETE CASCADE,
+            due_date DATE NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_active_loans_member ON active_loans (member_id)",
+        "CREATE INDEX IF NOT EXISTS idx_active_loans_due ON active_loans (due_date)",
+    ],
+    7: [
+        """
+        CREATE TABLE IF NOT EXISTS overdue_queue (
+            borrowing_id INTEGER PRIMARY KEY REFERENCES borrowings(id) ON DELETE CASCADE,
+            book_id INT NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            member_id INT NOT NULL REFERENCES members(id) ON DELETE CASCADE,
+            due_date DATE NOT NULL,
+            days_late INT NOT NULL,
+            fine DECIMAL(8, 2) NOT NULL DEFAULT 0,
+            scanned_on DATE NOT NULL,
+            reminded_on DATE NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_overdue_queue_due ON overdue_queue (due_date, borrowing_id)",
+        "CREATE INDEX IF NOT EXISTS idx_overdue_queue_member ON overdue_queue (member_id, reminded_on)",
+        "DELETE FROM library_stats WHERE name = 'overdue_scanned_at'",
+    ],
+    8: [
+        """
+        CREATE TABLE IF NOT EXISTS borrowings_archive (
+            id INTEGER PRIMARY KEY,
+            book_id INT NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            member_id INT NOT NULL REFERENCES members(id) ON DELETE CASCADE,
+            borrow_date DATE NOT NULL,
+            due_date DATE NOT NULL,
+            returned_date DATE NOT NULL,
+            created_at TIMESTAMP NULL,
+            updated_at TIMESTAMP NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_archive_book ON borrowings_archive (book_id)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_archive_member ON borrowings_archive (member_id, borrow_date)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_archive_borrow_date ON borrowings_archive (borrow_date)",
+    ],
+    9: [
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "INSERT OR IGNORE INTO table_versions (name, version) VALUES ('books', 1), ('members', 1), ('borrowings', 1)",
+    ],
+    10: [
+        """
+        CREATE TABLE IF NOT EXISTS book_copies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INT NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            barcode VARCHAR(32) NOT NULL UNIQUE,
+            state VARCHAR(16) NOT NULL DEFAULT 'available',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_book_copies_book_state ON book_copies (book_id, state)",
+        _updated_at_trigger('book_copies'),
+        "ALTER TABLE books ADD COLUMN total_copies INT NOT NULL DEFAULT 0",
+        "ALTER TABLE books ADD COLUMN available_copies INT NOT NULL DEFAULT 0",
+        "ALTER TABLE borrowings ADD COLUMN copy_id INT NULL REFERENCES book_copies(id) ON DELETE CASCADE",
+        "ALTER TABLE borrowings_archive ADD COLUMN copy_id INT NULL",
+        # Several copies of a title can be out at once; the open-loan guard moves to the copy
+        "DROP INDEX IF EXISTS uq_borrowings_active_book",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_borrowings_active_copy ON borrowings (copy_id) WHERE returned_date IS NULL",
+        # SQLite cannot change a primary key in place, so rebuild active_loans keyed by loan
+        """
+        CREATE TABLE active_loans_new (
+            borrowing_id INTEGER PRIMARY KEY REFERENCES borrowings(id) ON DELETE CASCADE,
+            book_id INT NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            copy_id INT UNIQUE REFERENCES book_copies(id) ON DELETE CASCADE,
+            member_id INT NOT NULL REFERENCES members(id) ON DELETE CASCADE,
+            due_date DATE NOT NULL
+        )
+        """,
+        "DROP TABLE active_loans",
+        "ALTER TABLE active_loans_new RENAME TO active_loans",
+        "CREATE INDEX IF NOT EXISTS idx_active_loans_book ON active_loans (book_id)",
+        "CREATE INDEX IF NOT EXISTS idx_active_loans_member ON active_loans (member_id)",
+        "CREATE INDEX IF NOT EXISTS idx_active_loans_due ON active_loans (due_date)",
+        _populate_copies,
+        "DELETE FROM library_stats WHERE name = 'reconciled_at'",
+    ],
+    11: [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL DEFAULT 3,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by VARCHAR(100) NULL,
+            locked_at TIMESTAMP NULL,
+            result TEXT NULL,
+            error TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after, id)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_locked_at ON jobs (status, locked_at)",
+        _updated_at_trigger('jobs'),
+    ],
+    # The NOCASE columns make these serve case-insensitive prefix LIKEs
+    12: [
+        "CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)",
+        "CREATE INDEX IF NOT EXISTS idx_members_name ON members (name)",
+    ],
+    13: [
+        "CREATE TABLE IF NOT EXISTS job_kinds (kind VARCHAR(50) PRIMARY KEY)",
+    ],
+}
+
+def apply_migration(cursor, version):
+    for step in SCHEMA_MIGRATIONS[version]:
+        if callable(step):
+            step(cursor)
+        else:
+            cursor.execute(step)
+
+# Query Plans
+def explain(cursor, statement, params):
+    """EXPLAIN QUERY PLAN steps as (detail, full_scan), read through a dictionary cursor"""
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, params)
+    details = [row['detail'] for row in cursor.fetchall()]
+    # Scans of materialized or co-routine subqueries read rows already narrowed by their own plan
+    derived = {detail.split()[1] for detail in details if detail.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    return [(detail, detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail
+             and detail.split()[1] not in derived)
+            for detail in details]
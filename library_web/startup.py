@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+import db_config
+import library_db
+import migrations
+import search_index
+import versions
+
+# Startup for server processes. create_app() checks the schema version once:
+# in the gunicorn master when the app is preloaded (see gunicorn.conf.py), so a
+# release whose migrations have not run fails before any worker forks. Each
+# worker then builds its pools after the fork and warms them, the read-through
+# caches and the templates before it accepts connections. A rolling restart
+# therefore never hands live requests to a cold worker. /readyz reports the
+# state kept here.
+
+# Load startup settings
+SCHEMA_CHECK = os.getenv('STARTUP_SCHEMA_CHECK', 'verify')  # verify, migrate or off
+WARMUP_ENABLED = os.getenv('WARMUP', '1') == '1'
+WARMUP_BOOK_PAGES = int(os.getenv('WARMUP_BOOK_PAGES', '2'))
+WARMUP_HOT_BOOKS = int(os.getenv('WARMUP_HOT_BOOKS', '50'))
+# A failed warm-up is tried again by /readyz after this many seconds, doubling up to WARMUP_RETRY_MAX
+WARMUP_RETRY_SECONDS = float(os.getenv('WARMUP_RETRY_SECONDS', '5'))
+WARMUP_RETRY_MAX = float(os.getenv('WARMUP_RETRY_MAX', '300'))
+
+log = logging.getLogger('library.startup')
+
+state = {'schema_version': None, 'expected_version': migrations.latest_version(), 'warm': False,
+         'warmed_at': None, 'warmup_seconds': None, 'steps': {}, 'error': None, 'attempts': 0}
+_retry = {'app': None, 'next_at': 0.0}
+_warm_lock = threading.Lock()
+
+class SchemaError(Exception):
+    """Raised when the database schema is older than the code expects"""
+
+# Schema
+def check_schema(mode=SCHEMA_CHECK):
+    """Verify the schema version, or with mode 'migrate' apply pending migrations first; returns the version"""
+    if mode == 'off':
+        return None
+    # A connection outside the pool, so a preloading master holds none when it forks
+    conn = db_config.connect_db()
+    try:
+        if mode == 'migrate':
+            migrations.migrate(conn)
+        version = migrations.current_version(conn)
+    finally:
+        conn.close()
+    state['schema_version'] = version
+    if version < state['expected_version']:
+        raise SchemaError(f"Database schema is at version {version}, this release needs {state['expected_version']}: "
+                          f"run python migrations.py or set STARTUP_SCHEMA_CHECK=migrate")
+    if version > state['expected_version']:
+        log.warning("Database schema is at version %s, newer than this release's %s", version, state['expected_version'])
+    return version
+
+# Warm-up
+def _book_pages(pages):
+    after = None
+    for _ in range(pages):
+        _, after = library_db.get_books_page(after)
+        if after is None:
+            break
+
+def _hot_books(limit):
+    # The titles most borrowed lately are the detail pages most likely to be asked for first
+    for book in library_db.get_top_books(limit=limit):
+        library_db.get_book_by_id(book['id'])
+
+def _compile_templates(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+def warm(app):
+    """Open pooled connections, prime the caches and compile the templates of this process; returns the state"""
+    if not WARMUP_ENABLED:
+        return state
+    steps = [
+        ('pools', db_config.warm_pools),
+        ('versions', versions.current),
+        ('dashboard', library_db.get_dashboard_stats),
+        ('categories', library_db.get_categories),
+        ('book_pages', lambda: _book_pages(WARMUP_BOOK_PAGES)),
+        ('hot_books', lambda: _hot_books(WARMUP_HOT_BOOKS)),
+        ('templates', lambda: _compile_templates(app)),
+    ]
+    if search_index.ENABLED:
+        steps.append(('search_index', library_db.ensure_search_index))
+    _retry['app'] = app
+    started = time.perf_counter()
+    state['error'] = None
+    state['attempts'] += 1
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            # Serve anyway: the caches fill on demand, and /readyz retries with backoff and says why
+            delay = min(WARMUP_RETRY_SECONDS * 2 ** (state['attempts'] - 1), WARMUP_RETRY_MAX)
+            _retry['next_at'] = time.monotonic() + delay
+            state['error'] = f"{name}: {e}"
+            log.warning("Warm-up step %s failed, retrying in %ss: %s", name, delay, e)
+            return state
+        state['steps'][name] = round((time.perf_counter() - step_started) * 1000, 1)
+    state.update(warm=True, warmed_at=datetime.now().isoformat(timespec='seconds'),
+                 warmup_seconds=round(time.perf_counter() - started, 3))
+    log.info("Warmed up in %.3fs: %s", state['warmup_seconds'], state['steps'])
+    return state
+
+# Health
+def _retry_warm():
+    # One probe at a time retries, once the backoff has passed; the others report the state as it is
+    if state['warm'] or _retry['app'] is None or time.monotonic() < _retry['next_at']:
+        return
+    if _warm_lock.acquire(blocking=False):
+        try:
+            warm(_retry['app'])
+        finally:
+            _warm_lock.release()
+
+def readiness():
+    """(ready, details): the schema is current, warm-up finished (when enabled) and the primary answers"""
+    if WARMUP_ENABLED:
+        _retry_warm()
+    details = dict(state, pid=os.getpid())
+    try:
+        conn = db_config.get_db()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        conn.close()
+        details['database'] = 'ok'
+    except Exception as e:
+        details['database'] = str(e)
+    schema_ok = SCHEMA_CHECK == 'off' or (state['schema_version'] or 0) >= state['expected_version']
+    warm_ok = state['warm'] or not WARMUP_ENABLED
+    return schema_ok and warm_ok and details['database'] == 'ok', details
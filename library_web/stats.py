@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import time
+from datetime import date
+from db_config import add_commit_listener, get_db
+
+# Counters kept in the library_stats summary table
+COUNTERS = ('total_books', 'total_copies', 'total_members', 'books_borrowed', 'overdue_books')
+# Seconds a worker may serve its in-process copy of the counters
+CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '5'))
+# Seconds after which a dashboard read recounts everything from the base tables
+RECONCILE_TTL = int(os.getenv('STATS_RECONCILE_TTL', '3600'))
+
+_cache = {'values': None, 'loaded_at': 0.0, 'generation': 0}
+_cache_lock = threading.Lock()
+# Set by bump() until the transaction commits: dropping the cached copy any earlier
+# lets a concurrent read reload the old values and serve them for CACHE_TTL
+_pending = threading.local()
+
+def bump(cursor, **deltas):
+    """Adjust counters inside the caller's transaction, e.g. bump(cursor, total_books=1)"""
+    for name, delta in deltas.items():
+        if delta:
+            cursor.execute("UPDATE library_stats SET value = value + %s WHERE name = %s", (delta, name))
+    _pending.bumped = True
+
+def invalidate():
+    with _cache_lock:
+        _cache['values'] = None
+        _cache['generation'] += 1
+
+def _after_commit():
+    if getattr(_pending, 'bumped', False):
+        _pending.bumped = False
+        invalidate()
+
+add_commit_listener(_after_commit)
+
+def count_from_tables(cursor):
+    """Recount every counter from the base tables"""
+    cursor.execute("SELECT COUNT(*) FROM books")
+    total_books = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM book_copies WHERE state <> 'withdrawn'")
+    total_copies = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM members")
+    total_members = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM borrowings WHERE returned_date IS NULL")
+    books_borrowed = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM active_loans WHERE due_date < CURDATE()")
+    overdue_books = cursor.fetchone()[0]
+    return {
+        'total_books': total_books,
+        'total_copies': total_copies,
+        'total_members': total_members,
+        'books_borrowed': books_borrowed,
+        'overdue_books': overdue_books
+    }
+
+def reconcile(conn=None):
+    """Rewrite the summary table from the base tables and return the drift that was corrected"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, value FROM library_stats")
+        stored = dict(cursor.fetchall())
+        counts = count_from_tables(cursor)
+        rows = list(counts.items())
+        rows.append(('reconciled_at', int(time.time())))
+        cursor.executemany("REPLACE INTO library_stats (name, value) VALUES (%s, %s)", rows)
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    invalidate()
+    return {name: value - stored.get(name, 0) for name, value in counts.items() if value != stored.get(name, 0)}
+
+def needs_reconcile(values):
+    reconciled_at = values.get('reconciled_at', 0)
+    if time.time() - reconciled_at > RECONCILE_TTL:
+        return True
+    # Loans become overdue at midnight without any write touching them
+    return date.fromtimestamp(reconciled_at) != date.today()
+
+def get_counters():
+    with _cache_lock:
+        if _cache['values'] is not None and time.monotonic() - _cache['loaded_at'] < CACHE_TTL:
+            return _cache['values']
+        generation = _cache['generation']
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, value FROM library_stats")
+        values = dict(cursor.fetchall())
+    finally:
+        conn.close()
+    if needs_reconcile(values):
+        reconcile()
+        return get_counters()
+    with _cache_lock:
+        # As in cache.cached(), keep them only if no commit invalidated the cache since the read began
+        if _cache['generation'] == generation:
+            _cache['values'] = values
+            _cache['loaded_at'] = time.monotonic()
+    return values
+
+def run_reconciler(interval):
+    """Reconcile the counters every `interval` seconds until interrupted"""
+    while True:
+        drift = reconcile()
+        print(f"📊 Stats reconciled{': corrected ' + str(drift) if drift else ''}")
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_reconciler(int(sys.argv[1]))
+    else:
+        print(f"📊 Stats reconciled, drift corrected: {reconcile() or 'none'}")
@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+# The app's modules are flat in library_web/ and read their settings at import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('JOB_EMBEDDED_WORKERS', '0')
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """A fresh SQLite library with the sample books and members"""
+    import cache
+    import db_config
+    import setup_database
+    import sqlite_backend
+    import stats
+    import versions
+    monkeypatch.setattr(sqlite_backend, 'SQLITE_PATH', str(tmp_path / 'library.db'))
+    db_config.use_backend('sqlite')
+    setup_database.create_database_tables()
+    cache.backend.clear()
+    stats.invalidate()
+    versions.invalidate()
+    yield
+    db_config.dispose()
@@ -0,0 +1,14 @@
+import availability
+import library_db
+
+def test_deleting_a_member_shelves_their_copies(library):
+    library_db.borrow_book(2, 2)
+    before = library_db.get_dashboard_stats()
+
+    library_db.delete_member(2)
+
+    assert availability.check() == {'missing': [], 'stale': [], 'copies': [], 'counters': []}
+    assert 2 in [book['id'] for book in library_db.get_available_books()]
+    after = library_db.get_dashboard_stats()
+    assert after['books_borrowed'] == before['books_borrowed'] - 1
+    assert after['available_books'] == before['available_books'] + 1
@@ -0,0 +1,24 @@
+import pytest
+import app as library_app
+import library_db
+from library_db import BorrowingError
+
+@pytest.mark.parametrize('days', [0, -1])
+def test_a_loan_must_last_at_least_a_day(library, days):
+    before = library_db.get_dashboard_stats()
+
+    with pytest.raises(BorrowingError):
+        library_db.borrow_book(2, 2, days)
+    with pytest.raises(BorrowingError):
+        library_db.borrow_books([(2, 2), (3, 2)], days)
+
+    assert library_db.get_dashboard_stats() == before
+
+def test_a_non_numeric_id_in_a_borrow_form_is_flashed(library):
+    client = library_app.app.test_client()
+
+    response = client.post('/borrow', data={'book_id': ['2', 'x'], 'member_id': '2', 'days': '14'},
+                           follow_redirects=True)
+
+    assert response.status_code == 200
+    assert b'Could not borrow books' in response.data
@@ -0,0 +1,19 @@
+import io
+import bulk_import
+import library_db
+
+def test_jsonl_lines_that_are_not_objects_are_rejected(library):
+    stream = io.StringIO('[1, 2]\n"x"\n3\n{"title": "Dune", "author": "Frank Herbert", "isbn": "IMPORT-1"}\n')
+
+    report = bulk_import.import_books(stream, 'jsonl')
+
+    assert report.inserted == 1
+    assert [reject['reason'] for reject in report.rejected] == ['not an object'] * 3
+
+def test_isbns_differing_only_in_case_are_duplicates(library):
+    stream = io.StringIO("title,author,isbn\nDune,Frank Herbert,isbn-1\nDune,Frank Herbert,ISBN-1\n")
+
+    report = bulk_import.import_books(stream, 'csv')
+
+    assert (report.inserted, report.duplicates) == (1, 1)
+    assert library_db.check_isbn_exists('ISBN-1')
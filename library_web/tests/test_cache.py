@@ -0,0 +1,27 @@
+import pytest
+import cache
+
+@pytest.fixture(params=['memory', 'shared'])
+def backend(request, monkeypatch):
+    if request.param == 'memory':
+        backend = cache.LRUCache(100)
+    else:
+        backend = cache.SharedCache(cache.FakeRedis(), 'test:')
+    monkeypatch.setattr(cache, 'backend', backend)
+    return backend
+
+def test_a_fill_that_races_an_invalidation_is_dropped(backend):
+    reads = []
+
+    @cache.cached(lambda: 'book:1', ttl=60)
+    def get_book():
+        reads.append(1)
+        if len(reads) == 1:
+            # A writer commits and invalidates while this read is in flight
+            cache.invalidate('book:1')
+        return len(reads)
+
+    assert get_book() == 1
+    assert get_book() == 2
+    assert get_book() == 2
+    assert backend.stats()['stale_fills'] == 1
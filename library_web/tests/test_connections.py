@@ -0,0 +1,12 @@
+import pytest
+import db_config
+import library_db
+
+def test_a_failed_write_outside_a_request_returns_its_connection(library):
+    isbn = library_db.get_book_by_id(1)['isbn']
+
+    for _ in range(db_config.get_pool().size + 1):
+        with pytest.raises(Exception):
+            library_db.add_book('Duplicate', 'Someone', 2000, isbn, 'Fiction', '')
+
+    assert db_config.get_pool().stats()['in_use'] == 0
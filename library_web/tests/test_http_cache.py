@@ -0,0 +1,15 @@
+import app as library_app
+
+def test_a_pending_flash_does_not_disable_api_validators(library):
+    client = library_app.app.test_client()
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Book added successfully!')]
+
+    first = client.get('/api/books')
+    again = client.get('/api/books', headers={'If-None-Match': first.headers['ETag']})
+    page = client.get('/books')
+
+    assert again.status_code == 304
+    # The HTML page still renders the message instead of answering from the validators
+    assert 'ETag' not in page.headers
+    assert b'Book added successfully!' in page.data
@@ -0,0 +1,32 @@
+import threading
+import mysql.connector
+import pytest
+import db_config
+import jobs
+
+def test_a_worker_survives_a_failing_claim(library, monkeypatch):
+    stop = threading.Event()
+    claims = []
+
+    def flaky_claim(worker_id):
+        claims.append(worker_id)
+        if len(claims) == 1:
+            raise mysql.connector.OperationalError("database is locked")
+        stop.set()
+        return None
+
+    monkeypatch.setattr(jobs, 'claim', flaky_claim)
+    jobs.work('test-worker', stop, poll=0)
+
+    assert len(claims) == 2
+
+def test_a_failed_queue_write_returns_its_connection(library):
+    conn = db_config.get_db()
+    conn.cursor().execute("DROP TABLE jobs")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(Exception, match='jobs'):
+        jobs.enqueue('overdue_scan')
+
+    assert db_config.get_pool().stats()['in_use'] == 0
@@ -0,0 +1,33 @@
+import logging
+import app as library_app
+from db_config import get_db
+import metrics
+
+def test_slow_queries_on_sqlite_log_the_query_plan(library, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, 'SLOW_QUERY_MS', 0)
+    conn = get_db()
+    statement = "SELECT id FROM books WHERE title = %s"
+
+    with caplog.at_level(logging.WARNING, logger=metrics.slow_query_log.name):
+        metrics.log_slow_query(statement, ('Dune',), 1.0, conn._raw)
+    conn.close()
+
+    message = caplog.records[-1].getMessage()
+    assert 'EXPLAIN unavailable' not in message
+    assert 'idx_books_title' in message
+
+def test_cache_totals_are_exported_as_counters(library):
+    lines = metrics.render_metrics().splitlines()
+
+    assert '# TYPE cache_hits_total counter' in lines
+    assert not any(line.startswith('cache_hits ') for line in lines)
+
+def test_response_sizes_are_recorded_after_compression(library, monkeypatch):
+    monkeypatch.setattr(metrics.http_response_bytes, '_series', {})
+    client = library_app.app.test_client()
+
+    response = client.get('/api/books', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    _, total, count = metrics.http_response_bytes._series[('api_books',)]
+    assert (total, count) == (len(response.data), 1)
@@ -0,0 +1,16 @@
+import pytest
+import app as library_app
+
+@pytest.mark.parametrize('after', ['garbage', '2020-01-01:x', '2020-13-01:5'])
+def test_a_malformed_overdue_cursor(library, after):
+    client = library_app.app.test_client()
+
+    assert client.get('/overdue', query_string={'after': after}).status_code == 200
+    assert client.get('/api/overdue', query_string={'after': after}).status_code == 400
+
+def test_a_valid_overdue_cursor(library):
+    client = library_app.app.test_client()
+
+    response = client.get('/api/overdue', query_string={'after': '2020-01-01:1'})
+
+    assert response.status_code == 200
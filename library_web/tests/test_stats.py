@@ -0,0 +1,30 @@
+from db_config import get_db
+import stats
+
+def test_counters_are_invalidated_once_the_bump_commits(library):
+    before = stats.get_counters()['total_books']
+    conn = get_db()
+    cursor = conn.cursor()
+    stats.bump(cursor, total_books=1)
+
+    # Until the commit, a reload would only see the old value again
+    assert stats.get_counters()['total_books'] == before
+
+    conn.commit()
+    conn.close()
+    assert stats.get_counters()['total_books'] == before + 1
+
+def test_a_read_that_races_a_commit_is_not_cached(library, monkeypatch):
+    check = stats.needs_reconcile
+
+    def commit_during_read(values):
+        # Runs after the read and before the store, like a writer committing in between
+        stats.invalidate()
+        return check(values)
+
+    stats.get_counters()
+    stats.invalidate()
+    monkeypatch.setattr(stats, 'needs_reconcile', commit_during_read)
+    stats.get_counters()
+
+    assert stats._cache['values'] is None
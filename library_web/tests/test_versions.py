@@ -0,0 +1,14 @@
+from db_config import get_db
+import versions
+
+def test_versions_are_invalidated_once_the_bump_commits(library):
+    before = versions.current()['books'][0]
+    conn = get_db()
+    cursor = conn.cursor()
+    versions.bump(cursor, 'books')
+
+    assert versions.current()['books'][0] == before
+
+    conn.commit()
+    conn.close()
+    assert versions.current()['books'][0] == before + 1
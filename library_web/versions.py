@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from db_config import add_commit_listener, get_db
+
+# Per-table change counters in table_versions, bumped inside every write
+# transaction. HTTP validators (http_cache.py) and version-keyed caches are
+# derived from them, so a poll only needs the counters to know nothing changed.
+TABLES = ('books', 'members', 'borrowings')
+# Seconds a worker may serve its in-process copy of the versions
+CACHE_TTL = float(os.getenv('TABLE_VERSION_TTL', '1'))
+
+_cache = {'values': None, 'loaded_at': 0.0, 'generation': 0}
+_cache_lock = threading.Lock()
+# Set by bump() until the transaction commits, so a concurrent poll cannot reload
+# and keep the old versions (and answer 304 for a page that has changed)
+_pending = threading.local()
+
+def bump(cursor, *tables):
+    """Record a change to `tables` inside the caller's transaction, e.g. bump(cursor, 'books')"""
+    placeholders = ', '.join(['%s'] * len(tables))
+    cursor.execute(f"""
+        UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE name IN ({placeholders})
+    """, tables)
+    _pending.bumped = True
+
+def invalidate():
+    with _cache_lock:
+        _cache['values'] = None
+        _cache['generation'] += 1
+
+def _after_commit():
+    if getattr(_pending, 'bumped', False):
+        _pending.bumped = False
+        invalidate()
+
+add_commit_listener(_after_commit)
+
+def current():
+    """{table: (version, last_modified)} with last_modified as an aware UTC datetime"""
+    with _cache_lock:
+        if _cache['values'] is not None and time.monotonic() - _cache['loaded_at'] < CACHE_TTL:
+            return _cache['values']
+        generation = _cache['generation']
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, version, UNIX_TIMESTAMP(updated_at) FROM table_versions")
+        values = {name: (version, datetime.fromtimestamp(int(updated_at), timezone.utc))
+                  for name, version, updated_at in cursor.fetchall()}
+    finally:
+        conn.close()
+    with _cache_lock:
+        # A bump that committed while this read ran may not be in it: store only if none did
+        if _cache['generation'] == generation:
+            _cache['values'] = values
+            _cache['loaded_at'] = time.monotonic()
+    return values
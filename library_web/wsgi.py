@@ -0,0 +1,8 @@
+# WSGI entry point for production servers:
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Importing it checks the schema version (see startup.py); warm-up runs per worker.
+from app import create_app
+
+app = create_app()